@@ -0,0 +1,134 @@
+# Per-property activity timeline for LeadFlow Pro
+#
+# Inquiries and tracking rows (emails sent, tours booked) for one property,
+# merged newest first. Each source is read with a LIMITed range scan on its
+# (property_id, created_at) index and the two sorted runs are merged here,
+# so a page costs O(page size) no matter how much history the agent has.
+import json
+import heapq
+import base64
+from typing import Optional, Tuple
+
+from app.pagination import InvalidCursor
+
+ACTIVITY_TYPES = ("inquiry", "email", "tour")
+
+# Tie-break between sources at the same timestamp: inquiries sort first
+_SOURCE_RANK = {"inquiry": 1, "tracking": 0}
+
+
+def encode_activity_cursor(created_at: str, source: str, row_id: int) -> str:
+    raw = json.dumps([created_at, _SOURCE_RANK[source], row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_activity_cursor(cursor: str) -> Tuple[str, int, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, rank, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(row_id, int) or rank not in _SOURCE_RANK.values():
+            raise ValueError
+        return created_at, rank, row_id
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def parse_activity_types(types: Optional[str]) -> Tuple[str, ...]:
+    """'inquiry,tour' -> ('inquiry', 'tour'); None means every type"""
+    if not types:
+        return ACTIVITY_TYPES
+    requested = tuple(t.strip() for t in types.split(",") if t.strip())
+    unknown = [t for t in requested if t not in ACTIVITY_TYPES]
+    if unknown or not requested:
+        raise ValueError(f"Unknown activity type(s): {', '.join(unknown)}; expected {', '.join(ACTIVITY_TYPES)}")
+    return requested
+
+
+def _after(source: str, cursor) -> Tuple[str, tuple]:
+    """Keyset predicate for one source, given the (created_at, rank, id) cursor"""
+    if cursor is None:
+        return "", ()
+    created_at, rank, row_id = cursor
+    own_rank = _SOURCE_RANK[source]
+    if own_rank < rank:
+        return " AND created_at <= ?", (created_at,)
+    if own_rank > rank:
+        return " AND created_at < ?", (created_at,)
+    return " AND (created_at, id) < (?, ?)", (created_at, row_id)
+
+
+def _inquiry_events(property_id, cursor, limit, conn):
+    after, params = _after("inquiry", cursor)
+    rows = conn.execute(f"""
+        SELECT id, prospect_name, prospect_email, prospect_phone, message, source, status, created_at
+        FROM agent_inquiries
+        WHERE property_id = ?{after}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, (property_id, *params, limit)).fetchall()
+    for row in rows:
+        yield ((row["created_at"] or "", _SOURCE_RANK["inquiry"], row["id"]), {
+            "type": "inquiry",
+            "id": row["id"],
+            "timestamp": row["created_at"],
+            "prospect_name": row["prospect_name"],
+            "prospect_email": row["prospect_email"],
+            "prospect_phone": row["prospect_phone"],
+            "message": row["message"],
+            "source": row["source"],
+            "status": row["status"],
+        })
+
+
+def _tracking_events(property_id, types, cursor, limit, conn):
+    after, params = _after("tracking", cursor)
+    if "email" not in types:
+        after += " AND tour_scheduled = TRUE"
+    elif "tour" not in types:
+        after += " AND (tour_scheduled = FALSE OR tour_scheduled IS NULL)"
+    rows = conn.execute(f"""
+        SELECT id, prospect_name, prospect_email, email_sent_date, acuity_appointment_id,
+               tour_scheduled, tour_date, created_at
+        FROM email_automation_tracking
+        WHERE property_id = ?{after}
+        ORDER BY created_at DESC, id DESC
+        LIMIT ?
+    """, (property_id, *params, limit)).fetchall()
+    for row in rows:
+        is_tour = bool(row["tour_scheduled"])
+        event = {
+            "type": "tour" if is_tour else "email",
+            "id": row["id"],
+            "timestamp": row["created_at"],
+            "prospect_name": row["prospect_name"],
+            "prospect_email": row["prospect_email"],
+        }
+        if is_tour:
+            event.update(tour_date=row["tour_date"], acuity_appointment_id=row["acuity_appointment_id"])
+        else:
+            event.update(email_sent_date=row["email_sent_date"])
+        yield ((row["created_at"] or "", _SOURCE_RANK["tracking"], row["id"]), event)
+
+
+def property_activity(property_id: int, types=ACTIVITY_TYPES, cursor: Optional[str] = None, size: int = 50, conn=None) -> dict:
+    """One page of the property's timeline, newest first"""
+    position = decode_activity_cursor(cursor) if cursor else None
+    runs = []
+    if "inquiry" in types:
+        runs.append(list(_inquiry_events(property_id, position, size + 1, conn)))
+    if "email" in types or "tour" in types:
+        runs.append(list(_tracking_events(property_id, types, position, size + 1, conn)))
+
+    merged = list(heapq.merge(*runs, key=lambda item: item[0], reverse=True))
+    page = merged[:size]
+    has_more = len(merged) > size
+    next_page = None
+    if has_more:
+        created_at, rank, row_id = page[-1][0]
+        source = "inquiry" if rank == _SOURCE_RANK["inquiry"] else "tracking"
+        next_page = encode_activity_cursor(created_at, source, row_id)
+    return {
+        "events": [event for _, event in page],
+        "next_cursor": next_page,
+        "has_more": has_more,
+    }
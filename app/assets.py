@@ -0,0 +1,187 @@
+# Prerendered, precompressed HTML pages and static assets for LeadFlow Pro
+#
+# The page templates take no per-request context, so each one is rendered
+# once (at startup) and kept in memory with its gzip and brotli variants,
+# compressed at the highest settings since that cost is paid only once.
+# Static files get the same treatment and a content-hash fingerprinted URL
+# (/static/app.3f9c2b1e.js) that can be cached forever; templates build
+# those URLs with {{ static_url('app.js') }}.
+#
+# With LEADFLOW_ASSET_RELOAD on (development), a file whose mtime changed
+# is rebuilt on its next request. Jinja2 is only imported when the first
+# page is built, which keeps it out of the cold-start import path.
+import os
+import hashlib
+import logging
+import mimetypes
+import threading
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+from app.etag import etag_matches
+from app.serialization import COMPRESS_MIN_BYTES, brotli, choose_encoding, compress
+
+logger = logging.getLogger(__name__)
+
+TEMPLATES_DIR = "app/templates"
+STATIC_DIR = "app/static"
+ASSET_RELOAD = os.environ.get("LEADFLOW_ASSET_RELOAD", "false").lower() in ("1", "true", "yes")
+
+# Fingerprinted URLs never change content; pages and plain static URLs revalidate
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+PAGE_CACHE_CONTROL = "public, max-age=0, must-revalidate"
+STATIC_CACHE_CONTROL = "public, max-age=3600, must-revalidate"
+
+COMPRESSIBLE_TYPES = ("text/", "application/javascript", "application/json", "application/xml", "image/svg+xml")
+
+
+class Asset:
+    """One page or file: its bytes in every useful content coding"""
+
+    def __init__(self, body: bytes, media_type: str, mtime: float):
+        self.media_type = media_type
+        self.mtime = mtime
+        self.digest = hashlib.sha256(body).hexdigest()[:16]
+        self.etag = f'"{self.digest}"'
+        self.variants = {None: body}
+        if len(body) >= COMPRESS_MIN_BYTES and media_type.startswith(COMPRESSIBLE_TYPES):
+            for encoding in ("gzip", "br") if brotli is not None else ("gzip",):
+                compressed = compress(body, encoding, best=True)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    def response(self, request: Request, cache_control: str) -> Response:
+        """The best variant the client accepts, or a 304 if it is current"""
+        encoding = choose_encoding(request.headers.get("accept-encoding"))
+        if encoding not in self.variants:
+            encoding = None
+        headers = {
+            "ETag": f'"{self.digest}-{encoding}"' if encoding else self.etag,
+            "Cache-Control": cache_control,
+            "Vary": "Accept-Encoding",
+        }
+        if etag_matches(request.headers.get("if-none-match"), self.etag):
+            return Response(status_code=304, headers=headers)
+        if encoding:
+            headers["Content-Encoding"] = encoding
+        return Response(content=self.variants[encoding], media_type=self.media_type, headers=headers)
+
+
+class AssetStore:
+    """Rendered templates and static files, keyed by name"""
+
+    def __init__(self, templates_dir: str = TEMPLATES_DIR, static_dir: str = STATIC_DIR, reload: bool = ASSET_RELOAD):
+        self.templates_dir = templates_dir
+        self.static_dir = static_dir
+        self.reload = reload
+        self._env = None
+        self._pages: Dict[str, Asset] = {}
+        self._static: Dict[str, Asset] = {}
+        self._lock = threading.Lock()
+        self.rebuilds = 0
+
+    @property
+    def env(self):
+        if self._env is None:
+            from jinja2 import Environment, FileSystemLoader, select_autoescape
+            env = Environment(loader=FileSystemLoader(self.templates_dir), autoescape=select_autoescape(["html"]), auto_reload=self.reload)
+            env.globals["static_url"] = self.static_url
+            self._env = env
+        return self._env
+
+    def load(self):
+        """Build every static file, then every page (pages embed static URLs)"""
+        for root, _, files in os.walk(self.static_dir):
+            for filename in files:
+                self._build_static(os.path.relpath(os.path.join(root, filename), self.static_dir))
+        for filename in os.listdir(self.templates_dir):
+            if filename.endswith(".html"):
+                self._build_page(filename)
+        logger.info(f"Prebuilt {len(self._pages)} pages and {len(self._static)} static files")
+
+    def _build_page(self, name: str) -> Asset:
+        path = os.path.join(self.templates_dir, name)
+        mtime = os.path.getmtime(path)
+        body = self.env.get_template(name).render().encode("utf-8")
+        asset = Asset(body, "text/html; charset=utf-8", mtime)
+        with self._lock:
+            self._pages[name] = asset
+            self.rebuilds += 1
+        return asset
+
+    def _build_static(self, name: str) -> Asset:
+        path = os.path.join(self.static_dir, name)
+        mtime = os.path.getmtime(path)
+        with open(path, "rb") as f:
+            body = f.read()
+        media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+        if media_type.startswith("text/") or media_type == "application/javascript":
+            media_type += "; charset=utf-8"
+        asset = Asset(body, media_type, mtime)
+        with self._lock:
+            self._static[name] = asset
+            self.rebuilds += 1
+        return asset
+
+    def _current(self, assets: Dict[str, Asset], name: str, base_dir: str, build) -> Optional[Asset]:
+        asset = assets.get(name)
+        if asset is None or self.reload:
+            path = os.path.join(base_dir, name)
+            if not os.path.isfile(path):
+                return None
+            if asset is None or os.path.getmtime(path) != asset.mtime:
+                asset = build(name)
+        return asset
+
+    def page(self, name: str) -> Optional[Asset]:
+        return self._current(self._pages, name, self.templates_dir, self._build_page)
+
+    def static(self, name: str) -> Optional[Asset]:
+        # Only files that are in the static directory, never ../ escapes
+        name = os.path.normpath(name)
+        if name.startswith("..") or os.path.isabs(name):
+            return None
+        return self._current(self._static, name, self.static_dir, self._build_static)
+
+    def static_url(self, name: str) -> str:
+        """Fingerprinted URL for a static file (the plain URL if it is missing)"""
+        asset = self.static(name)
+        if asset is None:
+            return f"/static/{name}"
+        stem, ext = os.path.splitext(name)
+        return f"/static/{stem}.{asset.digest[:8]}{ext}"
+
+    def static_response(self, request: Request, path: str) -> Optional[Response]:
+        """Serve /static/<path>, with or without its fingerprint"""
+        stem, ext = os.path.splitext(path)
+        base, _, fingerprint = stem.rpartition(".")
+        if base:
+            asset = self.static(base + ext)
+            if asset is not None and asset.digest.startswith(fingerprint) and len(fingerprint) == 8:
+                return asset.response(request, IMMUTABLE_CACHE_CONTROL)
+        asset = self.static(path)
+        if asset is None:
+            return None
+        return asset.response(request, STATIC_CACHE_CONTROL)
+
+    def page_response(self, request: Request, name: str) -> Response:
+        asset = self.page(name)
+        if asset is None:
+            return Response(status_code=404)
+        return asset.response(request, PAGE_CACHE_CONTROL)
+
+    def stats(self) -> dict:
+        with self._lock:
+            pages = list(self._pages.items())
+            static = list(self._static.items())
+        return {
+            "reload": self.reload,
+            "rebuilds": self.rebuilds,
+            "pages": {name: {encoding or "identity": len(body) for encoding, body in asset.variants.items()} for name, asset in pages},
+            "static_files": len(static),
+            "static_bytes": sum(len(asset.variants[None]) for _, asset in static),
+        }
+
+
+page_assets = AssetStore()
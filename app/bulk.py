@@ -0,0 +1,187 @@
+# Bulk write paths for LeadFlow Pro: property import, status updates, email logging
+import io
+import os
+import csv
+import json
+import math
+from datetime import date
+from typing import List, Optional, Tuple
+
+MAX_BULK_ROWS = int(os.environ.get("LEADFLOW_MAX_BULK_ROWS", "5000"))
+
+PROPERTY_IMPORT_COLUMNS = (
+    "address", "unit", "rent", "bedrooms", "bathrooms", "square_feet",
+    "description", "amenities", "availability_date", "acuity_id"
+)
+
+# Numeric columns and the type each is stored as
+_NUMERIC_COLUMNS = {"rent": float, "bedrooms": int, "bathrooms": float, "square_feet": int}
+
+
+class BulkRequestError(ValueError):
+    """The request as a whole is unusable (bad body, too many rows, ...)"""
+
+
+def parse_property_rows(body: bytes, content_type: str) -> List[dict]:
+    """Rows from a JSON array ({"properties": [...]} also works) or a CSV body with a header"""
+    try:
+        text = body.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise BulkRequestError("Body must be UTF-8")
+
+    if "csv" in (content_type or ""):
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        try:
+            rows = json.loads(text)
+        except ValueError:
+            raise BulkRequestError("Body must be a JSON array or CSV with a header row")
+        if isinstance(rows, dict):
+            rows = rows.get("properties")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise BulkRequestError("Expected a JSON array of property objects")
+
+    if not rows:
+        raise BulkRequestError("No properties in request")
+    if len(rows) > MAX_BULK_ROWS:
+        raise BulkRequestError(f"At most {MAX_BULK_ROWS} properties per request")
+    return rows
+
+
+def validate_property_row(row: dict) -> Tuple[Optional[tuple], List[str]]:
+    """Insert values in PROPERTY_IMPORT_COLUMNS order, or the reasons the row is invalid"""
+    errors = []
+    values = {}
+    for column in PROPERTY_IMPORT_COLUMNS:
+        value = row.get(column)
+        if isinstance(value, str):
+            value = value.strip() or None
+        if value is not None and column in _NUMERIC_COLUMNS:
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                value = None
+            if value is None or not math.isfinite(value):
+                errors.append(f"{column} must be a number")
+                continue
+            if _NUMERIC_COLUMNS[column] is int:
+                if not value.is_integer():
+                    errors.append(f"{column} must be a whole number")
+                value = int(value)
+            if value < 0:
+                errors.append(f"{column} must not be negative")
+        if value is not None and column == "availability_date":
+            try:
+                date.fromisoformat(str(value))
+            except ValueError:
+                errors.append("availability_date must be YYYY-MM-DD")
+        values[column] = value
+
+    if not values.get("address"):
+        errors.append("address is required")
+    # csv.DictReader files the values past the header under the key None
+    if None in row:
+        errors.append("row has more fields than the header")
+    unknown = sorted(key for key in row if key is not None and key not in PROPERTY_IMPORT_COLUMNS)
+    if unknown:
+        errors.append(f"unknown fields: {', '.join(unknown)}")
+    if errors:
+        return None, errors
+    return tuple(values[column] for column in PROPERTY_IMPORT_COLUMNS), []
+
+
+def insert_properties(agent_id: int, rows: List[tuple], conn=None) -> List[int]:
+    """Insert validated rows in one transaction; returns the new property ids in order"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        # Under the write lock every id above the current maximum is one of ours
+        before = conn.execute("SELECT COALESCE(MAX(id), 0) FROM agent_properties").fetchone()[0]
+        conn.executemany(f"""
+            INSERT INTO agent_properties (agent_id, {', '.join(PROPERTY_IMPORT_COLUMNS)})
+            VALUES (?, {', '.join('?' for _ in PROPERTY_IMPORT_COLUMNS)})
+        """, [(agent_id,) + row for row in rows])
+        ids = [row[0] for row in conn.execute(
+            "SELECT id FROM agent_properties WHERE id > ? AND agent_id = ? ORDER BY id", (before, agent_id)
+        ).fetchall()]
+        conn.commit()
+        return ids
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def update_property_statuses(agent_id: int, property_ids: List[int], status: str, is_active: bool, conn=None) -> List[int]:
+    """Set status on every listed property the agent owns; returns the ids updated"""
+    ids_json = json.dumps(property_ids)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        owned = sorted(row[0] for row in conn.execute("""
+            SELECT id FROM agent_properties
+            WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (agent_id, ids_json)).fetchall())
+        conn.execute("""
+            UPDATE agent_properties
+            SET status = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP
+            WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (status, is_active, agent_id, ids_json))
+        conn.commit()
+        return owned
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def validate_email_log(item) -> Optional[str]:
+    """Why a log-email batch item is unusable, or None if it is fine"""
+    if not isinstance(item, dict):
+        return "item must be an object"
+    if not isinstance(item.get('property_id'), int) or isinstance(item.get('property_id'), bool):
+        return "property_id must be an integer"
+    if not item.get('prospect_email'):
+        return "prospect_email is required"
+    return None
+
+
+def log_email_batch(agent_id: int, items: list, conn=None) -> List[dict]:
+    """Record many sent emails in one transaction; returns one result per item
+
+    Ownership of every property_id is checked with a single query. Items
+    that fail validation or name another agent's property are reported and
+    skipped; the rest are inserted together.
+    """
+    results = []
+    accepted = []
+    for index, item in enumerate(items):
+        error = validate_email_log(item)
+        results.append({"index": index, "status": "rejected", "error": error} if error else None)
+        if not error:
+            accepted.append(index)
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        property_ids = sorted({items[index]['property_id'] for index in accepted})
+        owned = {row[0] for row in conn.execute("""
+            SELECT id FROM agent_properties
+            WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (agent_id, json.dumps(property_ids))).fetchall()}
+
+        rows = []
+        for index in accepted:
+            item = items[index]
+            if item['property_id'] not in owned:
+                results[index] = {"index": index, "status": "rejected", "error": "Property not found"}
+                continue
+            rows.append((item['property_id'], item['prospect_email'], item.get('prospect_name', '')))
+            results[index] = {"index": index, "status": "logged"}
+
+        # automation_stats is kept current by the tracking insert trigger
+        conn.executemany("""
+            INSERT INTO email_automation_tracking
+            (property_id, prospect_email, prospect_name, email_sent_date)
+            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+        """, rows)
+        conn.commit()
+        return results
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,330 @@
+# SQLite connection management for LeadFlow Pro
+import os
+import queue
+import sqlite3
+import asyncio
+import functools
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager, asynccontextmanager
+
+logger = logging.getLogger(__name__)
+
+# Database configuration
+DATABASE_PATH = os.environ.get("LEADFLOW_DATABASE_PATH", "app/leadflow.db")
+POOL_SIZE = int(os.environ.get("LEADFLOW_DB_POOL_SIZE", "8"))
+POOL_TIMEOUT = float(os.environ.get("LEADFLOW_DB_POOL_TIMEOUT", "30"))
+STATEMENT_CACHE_SIZE = 256
+DB_QUEUE_SIZE = int(os.environ.get("LEADFLOW_DB_QUEUE_SIZE", "64"))
+
+# Applied once per connection when it is opened
+CONNECTION_PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA cache_size = -16000",       # 16 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256 MB memory-mapped I/O
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+)
+
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time"""
+
+
+class DatabaseBusy(Exception):
+    """Raised when too many requests are already queued for a connection"""
+
+
+class ConnectionPool:
+    """Bounded pool of long-lived, pre-tuned SQLite connections"""
+
+    def __init__(self, database_path: str = DATABASE_PATH, size: int = POOL_SIZE, timeout: float = POOL_TIMEOUT):
+        self.database_path = database_path
+        self.size = size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._in_use = 0
+        self._acquired = 0
+        self._waits = 0
+        self._wait_time = 0.0
+        self._max_wait_time = 0.0
+        self._closed = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection with the standard pragmas and statement cache"""
+        conn = sqlite3.connect(
+            self.database_path,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def dedicated_connection(self) -> sqlite3.Connection:
+        """Open a tuned connection outside the pool, for long-lived readers; the caller closes it"""
+        return self._connect()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Check a connection out of the pool, opening one if the pool is not full"""
+        if self._closed:
+            raise RuntimeError("Connection pool is closed")
+
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                started = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                finally:
+                    waited = time.perf_counter() - started
+                    with self._lock:
+                        self._waits += 1
+                        self._wait_time += waited
+                        self._max_wait_time = max(self._max_wait_time, waited)
+
+        with self._lock:
+            self._in_use += 1
+            self._acquired += 1
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection to the pool, rolling back anything left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = sqlite3.Row
+        except sqlite3.Error as e:
+            # A broken connection is dropped and replaced on the next acquire
+            logger.warning(f"Discarding broken database connection: {str(e)}")
+            with self._lock:
+                self._in_use -= 1
+                self._created -= 1
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+            return
+
+        with self._lock:
+            self._in_use -= 1
+            if self._closed:
+                self._created -= 1
+        if self._closed:
+            conn.close()
+        else:
+            self._idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Context manager that always returns the connection to the pool"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self) -> dict:
+        """Snapshot of pool usage"""
+        with self._lock:
+            return {
+                "size": self.size,
+                "open": self._created,
+                "in_use": self._in_use,
+                "idle": self._created - self._in_use,
+                "acquired": self._acquired,
+                "waits": self._waits,
+                "wait_time_ms": round(self._wait_time * 1000, 3),
+                "max_wait_time_ms": round(self._max_wait_time * 1000, 3),
+            }
+
+    def close(self):
+        """Close every idle connection; checked-out ones are closed on release"""
+        self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class AsyncConnection:
+    """Pooled connection whose every call runs on the database executor"""
+
+    def __init__(self, conn: sqlite3.Connection, executor: "DatabaseExecutor"):
+        self.conn = conn
+        self._executor = executor
+
+    async def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        """Run a write statement; use fetchone/fetchall for reads"""
+        return await self._executor.run(self.conn.execute, sql, params)
+
+    async def executemany(self, sql: str, seq_of_params) -> sqlite3.Cursor:
+        return await self._executor.run(self.conn.executemany, sql, seq_of_params)
+
+    async def fetchone(self, sql: str, params=()):
+        return await self._executor.run(_fetchone, self.conn, sql, params)
+
+    async def fetchall(self, sql: str, params=()) -> list:
+        return await self._executor.run(_fetchall, self.conn, sql, params)
+
+    async def commit(self):
+        await self._executor.run(self.conn.commit)
+
+    async def rollback(self):
+        await self._executor.run(self.conn.rollback)
+
+    async def run(self, fn, *args, **kwargs):
+        """Run fn(*args, conn=<connection>, **kwargs) on the executor"""
+        return await self._executor.run(fn, *args, conn=self.conn, **kwargs)
+
+
+def _fetchone(conn, sql, params):
+    return conn.execute(sql, params).fetchone()
+
+
+def _fetchall(conn, sql, params):
+    return conn.execute(sql, params).fetchall()
+
+
+class DatabaseExecutor:
+    """Dedicated thread pool that keeps SQLite work off the event loop
+
+    Each request leases one pooled connection for its lifetime. Leases are
+    handed out by an asyncio semaphore sized to the pool, so waiting for a
+    connection never ties up an executor thread, and at most
+    ``max_queue`` requests may wait before new ones are turned away.
+    """
+
+    def __init__(self, pool: ConnectionPool, max_queue: int = DB_QUEUE_SIZE):
+        self.pool = pool
+        self.max_queue = max_queue
+        self._executor = ThreadPoolExecutor(max_workers=pool.size, thread_name_prefix="leadflow-db")
+        self._leases = None
+        self._leases_loop = None
+        self._waiting = 0
+        self._rejected = 0
+
+    def _lease_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._leases_loop is not loop:
+            self._leases = asyncio.Semaphore(self.pool.size)
+            self._leases_loop = loop
+        return self._leases
+
+    async def run(self, fn, *args, **kwargs):
+        """Run a blocking callable on the database threads"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+
+    @asynccontextmanager
+    async def connection(self):
+        """Lease a pooled connection wrapped as an AsyncConnection"""
+        leases = self._lease_semaphore()
+        if leases.locked():
+            if self._waiting >= self.max_queue:
+                self._rejected += 1
+                raise DatabaseBusy("Database queue is full")
+            self._waiting += 1
+            try:
+                await leases.acquire()
+            finally:
+                self._waiting -= 1
+        else:
+            await leases.acquire()
+
+        try:
+            conn = await self.run(self.pool.acquire)
+            try:
+                yield AsyncConnection(conn, self)
+            finally:
+                await self.run(self.pool.release, conn)
+        finally:
+            leases.release()
+
+    async def run_with_connection(self, fn, *args, **kwargs):
+        """Lease a connection and run fn(*args, conn=<connection>) on it"""
+        async with self.connection() as db:
+            return await db.run(fn, *args, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.pool.size,
+            "waiting": self._waiting,
+            "max_queue": self.max_queue,
+            "rejected": self._rejected,
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+_pool = None
+_executor = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """Return the process-wide connection pool, creating it on first use"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DATABASE_PATH)
+                logger.info(f"Database pool opened: {DATABASE_PATH} (size={_pool.size})")
+    return _pool
+
+
+def get_executor() -> DatabaseExecutor:
+    """Return the process-wide database executor, creating it on first use"""
+    global _executor
+    if _executor is None:
+        pool = get_pool()
+        with _pool_lock:
+            if _executor is None:
+                _executor = DatabaseExecutor(pool)
+    return _executor
+
+
+def close_pool():
+    """Stop the database executor and close the process-wide connection pool"""
+    global _pool, _executor
+    with _pool_lock:
+        if _executor is not None:
+            _executor.shutdown()
+            _executor = None
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+async def get_db():
+    """FastAPI dependency yielding an AsyncConnection for the request"""
+    async with get_executor().connection() as db:
+        yield db
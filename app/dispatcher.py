@@ -0,0 +1,484 @@
+# Outbound mail dispatcher for LeadFlow Pro
+#
+# /api/automation/send only appends replies to outbound_emails and returns.
+# MailDispatcher claims due rows in batches and hands them to a small pool
+# of asyncio workers. Each worker owns one SMTP connection, reused until it
+# idles out, and pipelines MAIL/RCPT/DATA when the server offers PIPELINING.
+# Concurrent sends to one recipient domain are capped. Transient failures
+# are retried with exponential backoff; permanent ones (5xx) and exhausted
+# retries are dead-lettered. A successful send is recorded in
+# email_automation_tracking in the same transaction that marks it sent.
+# Delivery is at-least-once: a worker that dies after sending, before its
+# batch is recorded, leaves the rows claimed and they are sent again once
+# the claim expires.
+import os
+import re
+import ssl
+import json
+import base64
+import time
+import random
+import asyncio
+import logging
+import smtplib
+from collections import deque
+from email.header import Header
+from email.utils import formataddr, formatdate, make_msgid
+from typing import List, Optional
+
+from app.db import get_executor
+from app.prospects import DUPLICATE_INQUIRY_STATUS
+
+logger = logging.getLogger(__name__)
+
+# Unset SMTP host: replies cannot be queued and the dispatcher does not run
+SMTP_HOST = os.environ.get("LEADFLOW_SMTP_HOST")
+SMTP_PORT = int(os.environ.get("LEADFLOW_SMTP_PORT", "587"))
+SMTP_USERNAME = os.environ.get("LEADFLOW_SMTP_USERNAME")
+SMTP_PASSWORD = os.environ.get("LEADFLOW_SMTP_PASSWORD")
+SMTP_SECURITY = os.environ.get("LEADFLOW_SMTP_SECURITY", "starttls")    # starttls | ssl | none
+SMTP_TIMEOUT = float(os.environ.get("LEADFLOW_SMTP_TIMEOUT", "30"))
+# Connections idle this long are closed rather than kept for the next batch
+SMTP_IDLE_SECONDS = float(os.environ.get("LEADFLOW_SMTP_IDLE_SECONDS", "60"))
+MAIL_FROM = os.environ.get("LEADFLOW_MAIL_FROM", "")
+
+MAIL_WORKERS = int(os.environ.get("LEADFLOW_MAIL_WORKERS", "4"))
+MAIL_DOMAIN_CONCURRENCY = int(os.environ.get("LEADFLOW_MAIL_DOMAIN_CONCURRENCY", "2"))
+MAIL_BATCH_SIZE = int(os.environ.get("LEADFLOW_MAIL_BATCH_SIZE", "100"))
+MAIL_POLL_SECONDS = float(os.environ.get("LEADFLOW_MAIL_POLL_SECONDS", "5"))
+MAIL_MAX_ATTEMPTS = int(os.environ.get("LEADFLOW_MAIL_MAX_ATTEMPTS", "6"))
+MAIL_RETRY_BASE_SECONDS = float(os.environ.get("LEADFLOW_MAIL_RETRY_BASE_SECONDS", "30"))
+MAIL_RETRY_MAX_SECONDS = float(os.environ.get("LEADFLOW_MAIL_RETRY_MAX_SECONDS", "3600"))
+# A claim older than this belongs to a worker that died; its rows are due again
+MAIL_CLAIM_SECONDS = float(os.environ.get("LEADFLOW_MAIL_CLAIM_SECONDS", "300"))
+
+DEFAULT_SUBJECT = "Your rental inquiry"
+_ADDRESS = re.compile(r"^[^@\s<>\"]+@([A-Za-z0-9.-]+\.[A-Za-z]{2,})$")
+_LINE_BREAKS = re.compile(r"[\r\n]+")
+
+
+class PermanentFailure(Exception):
+    """The server refused the message for good; retrying cannot help"""
+
+
+def mail_configured() -> bool:
+    return bool(SMTP_HOST and MAIL_FROM)
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before attempt number attempts + 1, with jitter"""
+    delay = min(MAIL_RETRY_MAX_SECONDS, MAIL_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0))
+    return delay * random.uniform(0.75, 1.25)
+
+
+def reply_subject(subject) -> str:
+    subject = _LINE_BREAKS.sub(" ", str(subject or "")).strip() or DEFAULT_SUBJECT
+    return subject if subject.lower().startswith("re:") else f"Re: {subject}"
+
+
+def enqueue_replies(agent_id: int, items: list, conn=None) -> List[dict]:
+    """Queue replies to the agent's inquiries; returns one result per item
+
+    Items are {"id": <inquiry id>, "subject", "finalContent"} as sent by
+    automation.html ("inquiry_id" and "body" are accepted too). Recipients
+    always come from the inquiry, never from the request. Duplicates of
+    another inquiry (app.prospects) are rejected: only the primary gets a reply.
+    """
+    results = []
+    wanted = {}
+    for index, item in enumerate(items):
+        inquiry_id = item.get("inquiry_id", item.get("id")) if isinstance(item, dict) else None
+        body = (item.get("finalContent") or item.get("body") or "") if isinstance(item, dict) else ""
+        if not isinstance(inquiry_id, int) or isinstance(inquiry_id, bool):
+            results.append({"index": index, "status": "rejected", "error": "id must be an inquiry id"})
+        elif not isinstance(body, str) or not body.strip():
+            results.append({"index": index, "status": "rejected", "error": "finalContent is required"})
+        else:
+            results.append(None)
+            wanted[index] = inquiry_id
+
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        agent = conn.execute("SELECT first_name, last_name, email FROM agents WHERE id = ?", (agent_id,)).fetchone()
+        inquiries = {row["id"]: row for row in conn.execute("""
+            SELECT id, property_id, prospect_name, prospect_email, status, duplicate_of FROM agent_inquiries
+            WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+        """, (agent_id, json.dumps(sorted(set(wanted.values()))))).fetchall()}
+
+        rows = []
+        for index, inquiry_id in wanted.items():
+            inquiry = inquiries.get(inquiry_id)
+            email = (inquiry["prospect_email"] or "").strip() if inquiry else ""
+            address = _ADDRESS.match(email) if email.isascii() else None
+            if inquiry is None:
+                results[index] = {"index": index, "status": "rejected", "error": "Inquiry not found"}
+                continue
+            if inquiry["status"] == DUPLICATE_INQUIRY_STATUS:
+                results[index] = {"index": index, "status": "rejected",
+                                  "error": f"Inquiry is a duplicate of inquiry {inquiry['duplicate_of']}"}
+                continue
+            if address is None:
+                results[index] = {"index": index, "status": "rejected", "error": "Inquiry has no valid email address"}
+                continue
+            item = items[index]
+            rows.append((
+                agent_id, inquiry_id, inquiry["property_id"], address.group(0), address.group(1).lower(),
+                inquiry["prospect_name"], f"{agent['first_name']} {agent['last_name']}", agent["email"],
+                reply_subject(item.get("subject")), item.get("finalContent") or item.get("body"), now, now
+            ))
+            results[index] = {"index": index, "status": "queued"}
+
+        conn.executemany("""
+            INSERT INTO outbound_emails
+            (agent_id, inquiry_id, property_id, recipient, recipient_domain, prospect_name,
+             sender_name, reply_to, subject, body, enqueued_at, next_attempt_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.commit()
+        return results
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def claim_due(limit: int, now: float, conn=None) -> list:
+    """Mark up to limit due rows as sending and return them"""
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        rows = conn.execute("""
+            UPDATE outbound_emails SET status = 'sending', claimed_at = ?
+            WHERE id IN (
+                SELECT id FROM outbound_emails WHERE status = 'pending' AND next_attempt_at <= ?
+                UNION ALL
+                SELECT id FROM outbound_emails WHERE status = 'sending' AND claimed_at < ?
+                LIMIT ?
+            )
+            RETURNING id, agent_id, inquiry_id, property_id, recipient, recipient_domain, prospect_name,
+                      sender_name, reply_to, subject, body, attempts, enqueued_at
+        """, (now, now, now - MAIL_CLAIM_SECONDS, limit)).fetchall()
+        conn.commit()
+        return [dict(row) for row in rows]
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def record_outcomes(outcomes: List[dict], conn=None) -> set:
+    """Apply one batch's delivery results; returns the agents with sent mail
+
+    Each outcome is the claimed row plus "result": "sent" | "retry" | "dead"
+    and "error".
+    """
+    now = time.time()
+    agents = set()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        for outcome in outcomes:
+            if outcome["result"] == "sent":
+                conn.execute("""
+                    UPDATE outbound_emails SET status = 'sent', attempts = attempts + 1, sent_at = ?, last_error = NULL
+                    WHERE id = ?
+                """, (outcome["sent_at"], outcome["id"]))
+                # automation_stats is kept current by the tracking insert trigger
+                conn.execute("""
+                    INSERT INTO email_automation_tracking
+                    (property_id, prospect_email, prospect_name, email_sent_date)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                """, (outcome["property_id"], outcome["recipient"], outcome["prospect_name"] or ""))
+                conn.execute(
+                    "UPDATE agent_inquiries SET status = 'contacted', updated_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'new'",
+                    (outcome["inquiry_id"],)
+                )
+                agents.add(outcome["agent_id"])
+            elif outcome["result"] == "retry":
+                conn.execute("""
+                    UPDATE outbound_emails SET status = 'pending', attempts = attempts + 1, next_attempt_at = ?, last_error = ?
+                    WHERE id = ?
+                """, (now + retry_delay(outcome["attempts"] + 1), outcome["error"], outcome["id"]))
+            else:
+                conn.execute(
+                    "UPDATE outbound_emails SET status = 'dead', attempts = attempts + 1, last_error = ? WHERE id = ?",
+                    (outcome["error"], outcome["id"])
+                )
+        conn.commit()
+        return agents
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def outbound_depth(conn=None) -> dict:
+    """Row counts per status and the age of the oldest due reply"""
+    counts = {row[0]: row[1] for row in conn.execute(
+        "SELECT status, COUNT(*) FROM outbound_emails GROUP BY status"
+    ).fetchall()}
+    oldest = conn.execute(
+        "SELECT MIN(enqueued_at) FROM outbound_emails WHERE status IN ('pending', 'sending')"
+    ).fetchone()[0]
+    return {
+        "pending": counts.get("pending", 0),
+        "sending": counts.get("sending", 0),
+        "sent": counts.get("sent", 0),
+        "dead": counts.get("dead", 0),
+        "oldest_seconds": round(time.time() - oldest, 3) if oldest is not None else 0.0,
+    }
+
+
+def _header(name: str, value: str) -> str:
+    value = _LINE_BREAKS.sub(" ", value)
+    return f"{name}: {value if value.isascii() else Header(value, 'utf-8').encode()}"
+
+
+def build_message(row: dict) -> bytes:
+    """The reply as CRLF-terminated RFC 5322 bytes
+
+    Written out directly: EmailMessage and its policy machinery cost more
+    per message than the SMTP exchange with a nearby relay.
+    """
+    lines = [
+        _header("From", formataddr((row["sender_name"] or "", MAIL_FROM), charset="utf-8")),
+        _header("To", formataddr((row["prospect_name"] or "", row["recipient"]), charset="utf-8")),
+    ]
+    if row["reply_to"]:
+        lines.append(_header("Reply-To", formataddr((row["sender_name"] or "", row["reply_to"]), charset="utf-8")))
+    lines += [
+        _header("Subject", row["subject"]),
+        f"Date: {formatdate(localtime=False)}",
+        f"Message-ID: {make_msgid(domain=MAIL_FROM.rpartition('@')[2] or None)}",
+        "MIME-Version: 1.0",
+    ]
+    body = "\r\n".join(row["body"].splitlines())
+    if body.isascii() and all(len(line) <= 998 for line in body.split("\r\n")):
+        lines += ["Content-Type: text/plain; charset=us-ascii", "Content-Transfer-Encoding: 7bit"]
+        content = body.encode("ascii")
+    else:
+        lines += ["Content-Type: text/plain; charset=utf-8", "Content-Transfer-Encoding: base64"]
+        content = base64.encodebytes(body.encode("utf-8")).replace(b"\n", b"\r\n")
+    return "\r\n".join(lines).encode("ascii") + b"\r\n\r\n" + content + b"\r\n"
+
+
+class SmtpSession:
+    """One SMTP connection, reused across messages by a single worker"""
+
+    def __init__(self):
+        self._smtp = None
+        self.pipelining = False
+        self.last_used = 0.0
+        self.connections = 0
+
+    def _connect(self):
+        context = ssl.create_default_context()
+        if SMTP_SECURITY == "ssl":
+            smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT, context=context)
+        else:
+            smtp = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)
+        smtp.ehlo()
+        if SMTP_SECURITY == "starttls":
+            smtp.starttls(context=context)
+            smtp.ehlo()
+        if SMTP_USERNAME:
+            smtp.login(SMTP_USERNAME, SMTP_PASSWORD or "")
+        self.pipelining = smtp.has_extn("pipelining")
+        self._smtp = smtp
+        self.connections += 1
+
+    def close(self):
+        if self._smtp is not None:
+            try:
+                self._smtp.quit()
+            except Exception:
+                pass
+            self._smtp = None
+
+    def send(self, recipient: str, data: bytes):
+        """Deliver one message; raises PermanentFailure for 5xx refusals"""
+        reused = self._smtp is not None
+        if not reused:
+            self._connect()
+        try:
+            self._transaction(recipient, data)
+        except (smtplib.SMTPServerDisconnected, ConnectionError):
+            self._smtp = None
+            if not reused:
+                raise
+            # The server dropped the idle connection; one retry on a fresh one
+            self._connect()
+            self._transaction(recipient, data)
+        self.last_used = time.monotonic()
+
+    def _transaction(self, recipient: str, data: bytes):
+        smtp = self._smtp
+        if not self.pipelining:
+            try:
+                smtp.sendmail(MAIL_FROM, [recipient], data)
+            except smtplib.SMTPRecipientsRefused as e:
+                code, message = e.recipients[recipient]
+                self._refused(code, message)
+            except (smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:
+                self._refused(e.smtp_code, e.smtp_error)
+            return
+
+        # RFC 2920: one round trip for the envelope, one for the content
+        smtp.send(f"MAIL FROM:<{MAIL_FROM}>\r\nRCPT TO:<{recipient}>\r\nDATA\r\n".encode("ascii"))
+        mail, rcpt, ready = smtp.getreply(), smtp.getreply(), smtp.getreply()
+        if ready[0] == 354 and (mail[0] != 250 or rcpt[0] not in (250, 251)):
+            # Should not happen, but never let a refused envelope send content
+            smtp.send(b".\r\n")
+            smtp.getreply()
+        for code, message in (mail, rcpt, ready):
+            if code not in (250, 251, 354):
+                smtp.rset()
+                self._refused(code, message)
+        content = re.sub(rb"(?m)^\.", b"..", data)
+        if not content.endswith(b"\r\n"):
+            content += b"\r\n"
+        smtp.send(content + b".\r\n")
+        code, message = smtp.getreply()
+        if code != 250:
+            self._refused(code, message)
+
+    @staticmethod
+    def _refused(code: int, message):
+        text = message.decode("utf-8", errors="replace") if isinstance(message, bytes) else str(message)
+        if code >= 500:
+            raise PermanentFailure(f"{code} {text}")
+        raise smtplib.SMTPResponseException(code, text)
+
+
+class MailDispatcher:
+    """Background send loop; notify() wakes it as soon as replies are queued"""
+
+    def __init__(self, workers: int = MAIL_WORKERS, batch_size: int = MAIL_BATCH_SIZE,
+                 domain_concurrency: int = MAIL_DOMAIN_CONCURRENCY, poll_seconds: float = MAIL_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.domain_concurrency = domain_concurrency
+        self.poll_seconds = poll_seconds
+        self.on_sent = None
+        self._sessions = [SmtpSession() for _ in range(workers)]
+        self._domain_slots = {}
+        self._wakeup = None
+        self.batches = 0
+        self.sent = 0
+        self.retried = 0
+        self.dead = 0
+        self.last_batch_ms = 0.0
+        self.last_rate = 0.0
+        # Enqueue -> sent, for the most recent sends
+        self._latencies_ms = deque(maxlen=1000)
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def _domain_slot(self, domain: str) -> asyncio.Semaphore:
+        slot = self._domain_slots.get(domain)
+        if slot is None:
+            slot = self._domain_slots[domain] = asyncio.Semaphore(self.domain_concurrency)
+        return slot
+
+    def _send_one(self, session: SmtpSession, row: dict) -> dict:
+        try:
+            session.send(row["recipient"], build_message(row))
+            return dict(row, result="sent", sent_at=time.time(), error=None)
+        except PermanentFailure as e:
+            return dict(row, result="dead", error=str(e))
+        except Exception as e:
+            if not isinstance(e, smtplib.SMTPResponseException):
+                # A refusal leaves the connection usable; anything else may not
+                session.close()
+            result = "dead" if row["attempts"] + 1 >= MAIL_MAX_ATTEMPTS else "retry"
+            return dict(row, result=result, error=f"{type(e).__name__}: {e}")
+
+    async def _deliver(self, rows: List[dict]) -> List[dict]:
+        queue = deque(rows)
+        outcomes = []
+
+        async def worker(session):
+            while queue:
+                row = queue.popleft()
+                async with self._domain_slot(row["recipient_domain"]):
+                    outcomes.append(await asyncio.to_thread(self._send_one, session, row))
+
+        await asyncio.gather(*(worker(session) for session in self._sessions))
+        return outcomes
+
+    async def drain(self) -> int:
+        """Send batches until nothing is due; returns messages sent"""
+        executor = get_executor()
+        total = 0
+        while True:
+            rows = await executor.run_with_connection(claim_due, self.batch_size, time.time())
+            if not rows:
+                return total
+            started = time.perf_counter()
+            outcomes = await self._deliver(rows)
+            agents = await executor.run_with_connection(record_outcomes, outcomes)
+            elapsed = time.perf_counter() - started
+
+            sent = [outcome for outcome in outcomes if outcome["result"] == "sent"]
+            self.batches += 1
+            self.sent += len(sent)
+            self.retried += sum(1 for outcome in outcomes if outcome["result"] == "retry")
+            self.dead += sum(1 for outcome in outcomes if outcome["result"] == "dead")
+            self.last_batch_ms = round(elapsed * 1000, 2)
+            self.last_rate = round(len(sent) / elapsed, 1) if elapsed else 0.0
+            self._latencies_ms.extend((outcome["sent_at"] - outcome["enqueued_at"]) * 1000 for outcome in sent)
+            for outcome in outcomes:
+                if outcome["result"] == "dead":
+                    logger.warning(f"Outbound email {outcome['id']} dead-lettered: {outcome['error']}")
+            if self.on_sent is not None:
+                for agent_id in agents:
+                    self.on_sent(agent_id)
+            total += len(sent)
+            if len(rows) < self.batch_size:
+                return total
+
+    def close_idle(self, idle_seconds: float = SMTP_IDLE_SECONDS):
+        now = time.monotonic()
+        for session in self._sessions:
+            if session.last_used and now - session.last_used > idle_seconds:
+                session.close()
+                session.last_used = 0.0
+
+    def close(self):
+        for session in self._sessions:
+            session.close()
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        try:
+            while True:
+                try:
+                    await self.drain()
+                    await asyncio.to_thread(self.close_idle)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Mail dispatcher failed: {str(e)}")
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+        finally:
+            self.close()
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies_ms)
+
+        def percentile(p: float) -> Optional[float]:
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))], 1) if latencies else None
+
+        return {
+            "batches": self.batches,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead": self.dead,
+            "last_batch_ms": self.last_batch_ms,
+            "last_batch_per_second": self.last_rate,
+            "queue_latency_ms": {"p50": percentile(0.5), "p95": percentile(0.95), "max": latencies[-1] if latencies else None},
+            "workers": len(self._sessions),
+            "smtp_connections_opened": sum(session.connections for session in self._sessions),
+            "domain_concurrency": self.domain_concurrency,
+        }
@@ -0,0 +1,70 @@
+# Conditional GET support for LeadFlow Pro read endpoints
+#
+# agent_data_versions (migration 11) holds one counter per agent that the
+# triggers bump on every insert, update or delete of that agent's properties
+# and inquiries, whichever code path or process made it. The ETag of a read
+# is derived from that counter, so checking If-None-Match is a primary key
+# lookup and never touches the big tables.
+#
+# Read the version *before* running the query: a write racing the read can
+# then only make the body newer than its ETag, which costs the client one
+# extra 200 later but can never pin it to stale data.
+import hashlib
+from typing import Optional, Tuple
+
+from fastapi import Request, Response
+
+# Browsers revalidate on every view instead of serving from cache blindly
+ETAG_CACHE_CONTROL = "private, no-cache"
+
+# Compressed representations carry the coding in their ETag (app.serialization)
+ENCODED_ETAG_SUFFIXES = ('-br"', '-gzip"')
+
+
+def agent_data_version(agent_id: int, conn=None) -> int:
+    row = conn.execute("SELECT version FROM agent_data_versions WHERE agent_id = ?", (agent_id,)).fetchone()
+    return row[0] if row else 0
+
+
+def make_etag(agent_id: int, version: int, request: Request) -> str:
+    """Strong ETag for this agent's view of request.url at a data version
+
+    The agent and the full path + query string are part of the tag, so
+    another agent logged in on the same browser, or another page of the
+    list, never matches.
+    """
+    variant = hashlib.blake2b(
+        f"{int(agent_id)}:{request.url.path}?{request.url.query}".encode("utf-8"), digest_size=8
+    ).hexdigest()
+    return f'"{variant}-{version}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison, as RFC 9110 prescribes for If-None-Match, and any
+    # content-coding suffix added by FastJSONResponse is ignored
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        for suffix in ENCODED_ETAG_SUFFIXES:
+            if tag.endswith(suffix):
+                tag = tag[:-len(suffix)] + '"'
+                break
+        if tag == etag:
+            return True
+    return False
+
+
+async def conditional_etag(request: Request, response: Response, agent_id: int, db) -> Tuple[int, Optional[Response]]:
+    """ETag the response; returns the data version and, if the client is current, the 304 to send"""
+    version = await db.run(agent_data_version, int(agent_id))
+    etag = make_etag(agent_id, version, request)
+    headers = {"ETag": etag, "Cache-Control": ETAG_CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return version, Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return version, None
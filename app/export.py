@@ -0,0 +1,155 @@
+# Streaming NDJSON / CSV exports for LeadFlow Pro
+#
+# An export is paced by the client, so it never holds a pooled connection:
+# each one reads from a dedicated connection, at most EXPORT_MAX_CONCURRENT
+# run at once (more get a 503), and a client that takes longer than
+# EXPORT_SEND_TIMEOUT to accept a chunk has its stream ended, releasing
+# the read snapshot so WAL checkpoints can proceed.
+import io
+import os
+import csv
+import json
+import asyncio
+import logging
+import threading
+from datetime import datetime
+from typing import Optional
+
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from app.db import get_executor, get_pool
+
+logger = logging.getLogger(__name__)
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_MAX_CONCURRENT = int(os.environ.get("LEADFLOW_EXPORT_MAX_CONCURRENT", "2"))
+EXPORT_SEND_TIMEOUT = float(os.environ.get("LEADFLOW_EXPORT_SEND_TIMEOUT", "60"))
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+INQUIRY_EXPORT_COLUMNS = (
+    "id", "property_id", "prospect_name", "prospect_email", "prospect_phone",
+    "message", "source", "status", "created_at", "updated_at"
+)
+
+TRACKING_EXPORT_COLUMNS = (
+    "id", "property_id", "prospect_email", "prospect_name", "email_sent_date",
+    "acuity_appointment_id", "tour_scheduled", "tour_date", "appointment_type_id", "created_at"
+)
+
+
+def parse_export_date(value: Optional[str]) -> Optional[str]:
+    """Normalize an ISO date/datetime to SQLite's CURRENT_TIMESTAMP format"""
+    if value is None:
+        return None
+    return datetime.fromisoformat(value).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def inquiries_export_query(agent_id: int, since: Optional[str], until: Optional[str]):
+    sql = f"SELECT {', '.join(INQUIRY_EXPORT_COLUMNS)} FROM agent_inquiries WHERE agent_id = ?"
+    params = [agent_id]
+    if since:
+        sql += " AND created_at >= ?"
+        params.append(since)
+    if until:
+        sql += " AND created_at < ?"
+        params.append(until)
+    return sql + " ORDER BY created_at, id", params
+
+
+def tracking_export_query(agent_id: int, since: Optional[str], until: Optional[str]):
+    columns = ', '.join(f"t.{column}" for column in TRACKING_EXPORT_COLUMNS)
+    sql = f"""
+        SELECT {columns}
+        FROM agent_properties p
+        JOIN email_automation_tracking t ON t.property_id = p.id
+        WHERE p.agent_id = ?
+    """
+    params = [agent_id]
+    if since:
+        sql += " AND t.created_at >= ?"
+        params.append(since)
+    if until:
+        sql += " AND t.created_at < ?"
+        params.append(until)
+    return sql, params
+
+
+def _open_cursor(sql, params, conn=None):
+    # One read transaction for the whole export gives a consistent snapshot
+    conn.execute("BEGIN")
+    return conn.execute(sql, params)
+
+
+def _format_batch(rows, columns, fmt, include_header):
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        if include_header:
+            writer.writerow(columns)
+        writer.writerows(rows)
+        return buffer.getvalue()
+    return "".join(json.dumps(dict(zip(columns, row)), default=str) + "\n" for row in rows)
+
+
+def _next_chunk(cursor, columns, fmt, batch_size, include_header):
+    """Fetch and format the next batch; None once the cursor is exhausted"""
+    rows = cursor.fetchmany(batch_size)
+    if not rows:
+        return None
+    return _format_batch([tuple(row) for row in rows], columns, fmt, include_header)
+
+
+async def stream_export(sql: str, params, columns, fmt: str, batch_size: int = EXPORT_BATCH_SIZE):
+    """Yield formatted chunks of at most batch_size rows
+
+    The stream reads from a dedicated connection, closed when it ends, and
+    each batch is fetched and formatted on the database executor, so memory
+    stays bounded by one batch regardless of how many rows match.
+    """
+    executor = get_executor()
+    conn = await executor.run(get_pool().dedicated_connection)
+    try:
+        cursor = await executor.run(_open_cursor, sql, params, conn=conn)
+        include_header = True
+        while True:
+            chunk = await executor.run(_next_chunk, cursor, columns, fmt, batch_size, include_header)
+            if chunk is None:
+                break
+            yield chunk
+            include_header = False
+        if include_header and fmt == "csv":
+            yield _format_batch([], columns, fmt, True)
+    finally:
+        await executor.run(conn.close)
+
+
+_export_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+
+class ExportResponse(StreamingResponse):
+    """StreamingResponse for stream_export, with the concurrency cap and send timeout"""
+
+    async def __call__(self, scope, receive, send):
+        if not _export_slots.acquire(blocking=False):
+            await self.body_iterator.aclose()
+            busy = JSONResponse(status_code=503, content={"detail": "Too many exports running, please retry"},
+                                headers={"Retry-After": "5"})
+            await busy(scope, receive, send)
+            return
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.body_iterator.aclose()
+            _export_slots.release()
+
+    async def stream_response(self, send):
+        async def send_with_timeout(message):
+            await asyncio.wait_for(send(message), EXPORT_SEND_TIMEOUT)
+
+        try:
+            await super().stream_response(send_with_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Export stalled for {EXPORT_SEND_TIMEOUT:g}s, ending the stream")
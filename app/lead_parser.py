@@ -0,0 +1,447 @@
+# Lead-email parsing engine for LeadFlow Pro
+#
+# Turns raw RFC 822 messages from listing sites into structured inquiries.
+# Every source has a rule table compiled once at import. A message is
+# fingerprinted to one source first (sender domain is a dict lookup; failing
+# that, one combined alternation over the subject and the top of the body),
+# so it runs that source's rules plus the shared extractors for whatever is
+# still missing, never every pattern we know.
+#
+# Nothing here touches the database, so batches can be spread over worker
+# processes: regex matching holds the GIL, threads would not help.
+import os
+import re
+import html
+import email
+import base64
+import quopri
+import asyncio
+import logging
+from email import policy
+from email.header import decode_header, make_header
+from email.utils import parseaddr
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+PARSE_WORKERS = int(os.environ.get("LEADFLOW_PARSE_WORKERS", str(min(4, os.cpu_count() or 1))))
+MAX_PARSE_BATCH = int(os.environ.get("LEADFLOW_MAX_PARSE_BATCH", "5000"))
+# Smaller batches are parsed inline: shipping them to a worker costs more
+PARSE_INLINE_BELOW = 64
+PARSE_CHUNK_SIZE = 128
+# Lead emails are short; anything past this is quoted history or footers
+MAX_BODY_CHARS = 20000
+
+DEFAULT_PROSPECT_NAME = "Prospective Tenant"
+DIRECT_SOURCE = "email"
+
+_executor = None
+
+
+class LeadParseError(ValueError):
+    """The message has nothing a lead can be built from"""
+
+
+class SourceRules:
+    """How to recognize one listing site and pull fields out of its emails
+
+    fingerprint is a lowercase pattern found in the subject or body of
+    messages forwarded from the site. rules is a list of (field, "subject" |
+    "body", pattern); the first capture group of the first matching pattern
+    wins for each field.
+    """
+
+    def __init__(self, name: str, label: str, domains: Tuple[str, ...], fingerprint: str, rules: List[tuple]):
+        self.name = name
+        self.label = label
+        self.domains = domains
+        self.fingerprint = fingerprint
+        self.rules = [(field, where, re.compile(pattern, re.IGNORECASE | re.MULTILINE)) for field, where, pattern in rules]
+
+
+# Labelled "Field: value" lines, as the notification emails lay them out
+def _line(label: str) -> str:
+    return rf"^[ \t>]*(?:{label})[ \t]*:[ \t]*(.+?)[ \t]*$"
+
+
+SOURCES = (
+    SourceRules("streeteasy", "StreetEasy", ("streeteasy.com",), r"street\s?easy", [
+        ("property_address", "subject", r"streeteasy inquiry:\s*(.+?)(?:\s+-\s+\$|$)"),
+        ("prospect_name", "body", r"^From:\s*([^<\n]+?)\s*<"),
+        ("prospect_email", "body", r"^From:[^<\n]*<([^>\s]+@[^>\s]+)>"),
+        ("property_address", "body", _line("Property|Listing")),
+        ("budget", "body", _line("Budget")),
+    ]),
+    SourceRules("zillow", "Zillow", ("zillow.com", "zillowrentals.com", "trulia.com", "hotpads.com"), r"zillow|trulia|hotpads", [
+        ("prospect_name", "subject", r"^(.+?) is (?:requesting information|interested) (?:about|in)\b"),
+        ("property_address", "subject", r"(?:requesting information|interested) (?:about|in)\s+(.+)$"),
+        ("prospect_name", "body", _line("Name|New Contact|Renter")),
+        ("prospect_email", "body", _line("Email|E-mail")),
+        ("prospect_phone", "body", _line("Phone|Phone Number")),
+        ("move_in", "body", _line("Move[- ]in(?: date)?|Desired move[- ]in")),
+        ("property_address", "body", _line("Property|Listing|Address")),
+        ("message", "body", r"^[ \t]*Message:[ \t]*\n?(.+?)(?:\n\s*\n|\Z)"),
+    ]),
+    SourceRules("apartments_com", "Apartments.com", ("apartments.com", "apartmentlist.com", "rent.com", "costar.com"), r"apartments\.com|apartmentlist\.com|\brent\.com", [
+        ("prospect_name", "body", _line("Name|Lead Name")),
+        ("prospect_email", "body", _line("Email|Email Address")),
+        ("prospect_phone", "body", _line("Phone|Phone Number")),
+        ("move_in", "body", _line("Move[- ]in Date|Move Date")),
+        ("property_address", "body", _line("Property|Listing|Address")),
+        ("message", "body", r"^[ \t]*(?:Message|Comments):[ \t]*\n?(.+?)(?:\n\s*\n|\Z)"),
+    ]),
+    SourceRules("realtor_com", "Realtor.com", ("realtor.com", "move.com"), r"realtor\.com", [
+        ("prospect_name", "body", _line("Name|Consumer Name")),
+        ("prospect_email", "body", _line("Email")),
+        ("prospect_phone", "body", _line("Phone")),
+        ("property_address", "body", _line("Property Address|Property|Listing")),
+        ("message", "body", r"^[ \t]*(?:Message|Comments):[ \t]*\n?(.+?)(?:\n\s*\n|\Z)"),
+    ]),
+    SourceRules("craigslist", "Craigslist", ("craigslist.org",), r"craigslist", [
+        ("property_address", "subject", r"^(?:re:\s*)?(.+?)(?:\s+\(.*\))?$"),
+    ]),
+    SourceRules("facebook", "Facebook Marketplace", ("facebookmail.com", "facebook.com"), r"facebook|marketplace", [
+        ("prospect_name", "subject", r"^(.+?) (?:sent you a message|is interested)"),
+    ]),
+)
+
+_SOURCES_BY_NAME = {rules.name: rules for rules in SOURCES}
+_SOURCES_BY_DOMAIN = {domain: rules for rules in SOURCES for domain in rules.domains}
+_FINGERPRINT = re.compile("|".join(f"(?P<{rules.name}>{rules.fingerprint})" for rules in SOURCES))
+# How much of the body the fingerprint looks at ("I saw it on Zillow" is near the top)
+FINGERPRINT_BODY_CHARS = 1500
+
+# Shared extractors, run for fields the source rules did not fill.
+# Keyword patterns (the fingerprint above, urgency and timeline words) are
+# lowercase-only and run on a lowercased copy of the text: re.IGNORECASE
+# alternations cost several times more per character.
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+_PHONE = re.compile(r"(?<![\d-])(?:\+?1[\s.-]?)?\(?([2-9]\d{2})\)?[\s.-]?(\d{3})[\s.-]?(\d{4})(?![\d-])")
+_NAME_INTRO = re.compile(r"\b(?i:i'?m|i am|this is|my name is|name's)\s+([A-Z][a-z'-]+(?:\s+[A-Z][a-z'-]+){0,2})\b")
+_SIGNOFF = re.compile(
+    r"^[ \t]*(?:best(?: regards)?|regards|thanks(?: so much)?|thank you|sincerely|cheers|warmly|best wishes)[ \t]*[,.!]*[ \t]*\n+[ \t]*([A-Z][a-z'-]+(?:[ \t]+[A-Z][a-z'-]+){0,2})[ \t]*$",
+    re.IGNORECASE | re.MULTILINE
+)
+_STREET_SUFFIXES = (
+    "street|st|avenue|ave|road|rd|boulevard|blvd|drive|dr|lane|ln|place|pl|court|ct|terrace|ter|"
+    "parkway|pkwy|way|square|sq|highway|hwy|circle|cir|broadway|bowery"
+)
+_ADDRESS = re.compile(
+    rf"\b(\d{{1,6}}(?:-\d{{1,4}})?\s+(?:[NSEW]\.?\s+)?(?:[A-Z0-9][\w.'-]*\s+){{0,3}}?(?:{_STREET_SUFFIXES})\b\.?)"
+    r"(?:,?\s*(?:#|(?:unit|apt\.?|apartment|suite|ste\.?)\s*#?)\s*([A-Z0-9-]{1,6})\b)?",
+    re.IGNORECASE
+)
+_UNIT = re.compile(r"(?:#|\b(?:unit|apt\.?|apartment|suite)\s*#?)\s*([A-Z0-9][A-Z0-9-]{0,5})\b", re.IGNORECASE)
+_MONEY = r"\$\s?\d[\d,]*(?:\.\d{2})?k?"
+_MONEY_UPPER = r"\$?\s?\d[\d,]*(?:\.\d{2})?k?"
+_BUDGET = re.compile(
+    rf"\b(?:budget|afford|pay|spend|looking (?:to spend|in the range))\b[^$\n]{{0,60}}?({_MONEY}(?:\s*(?:-|–|to)\s*{_MONEY_UPPER})?)",
+    re.IGNORECASE
+)
+_ASAP = re.compile(r"\b(?:asap|a\.s\.a\.p|as soon as possible|immediately|right away|urgent(?:ly)?|this friday|emergency)\b")
+_MONTHS = "january|february|march|april|may|june|july|august|september|october|november|december|jan|feb|mar|apr|jun|jul|aug|sep|sept|oct|nov|dec"
+_MOVE_DATE = re.compile(
+    rf"\b(?:starting|from|by|on|around|move(?:-|\s)?in(?: date)?:?|moving|beginning|start(?:ing)? date:?)\s+(?:on\s+|around\s+|the\s+)?"
+    rf"((?:{_MONTHS})\.?(?:\s+\d{{1,2}}(?:st|nd|rd|th)?)?|\d{{1,2}}/\d{{1,2}}(?:/\d{{2,4}})?)\b",
+    re.IGNORECASE
+)
+_WITHIN = re.compile(r"\b(within (?:the next )?(?:\d+|a|one|two|three|four|few) (?:days?|weeks?|months?))\b")
+_SOON_WORDS = re.compile(r"\b(?:today|tomorrow|tonight|this week(?:end)?|24/7)\b")
+_TOUR_WORDS = re.compile(r"\b(?:tour|viewing|showing|see (?:it|the (?:apartment|unit|place))|schedule|visit)\b")
+_QUOTED_REPLY = re.compile(r"^(?:On .{0,200} wrote:|-{2,}\s*Original Message\s*-{2,}|_{5,})\s*$", re.MULTILINE)
+_HTML_BREAKS = re.compile(r"<\s*(?:br|/p|/div|/tr|/li|/h\d)\s*/?>", re.IGNORECASE)
+_HTML_TAGS = re.compile(r"<(?:script|style)\b.*?</(?:script|style)\s*>|<[^>]+>", re.IGNORECASE | re.DOTALL)
+_BLANK_LINES = re.compile(r"\n{3,}")
+_HEADER_FOLD = re.compile(r"\n[ \t]+")
+_CHARSET = re.compile(r"charset=\"?([\w.-]+)")
+
+
+def _domain(address: str) -> str:
+    return address.rpartition("@")[2].lower().strip(">. ")
+
+
+def _listing_domain(domain: str) -> bool:
+    return any(domain == d or domain.endswith("." + d) for d in _SOURCES_BY_DOMAIN)
+
+
+def detect_source(sender: str, subject: str, body: str) -> Optional[SourceRules]:
+    """The listing site this message came from, or None for a direct email
+
+    subject and body must already be lowercased.
+    """
+    domain = _domain(sender)
+    while domain:
+        rules = _SOURCES_BY_DOMAIN.get(domain)
+        if rules is not None:
+            return rules
+        domain = domain.partition(".")[2] if domain.count(".") > 1 else ""
+    match = _FINGERPRINT.search(subject) or _FINGERPRINT.search(body, 0, FINGERPRINT_BODY_CHARS)
+    return _SOURCES_BY_NAME[match.lastgroup] if match else None
+
+
+def normalize_phone(phone: Optional[str]) -> Optional[str]:
+    """(XXX) XXX-XXXX for US numbers, the input stripped otherwise"""
+    if not phone:
+        return None
+    match = _PHONE.search(phone)
+    if not match:
+        return phone.strip() or None
+    return f"({match.group(1)}) {match.group(2)}-{match.group(3)}"
+
+
+def _timeline(text: str, lower: str, move_in: Optional[str]) -> Optional[str]:
+    if _ASAP.search(lower) or (move_in and _ASAP.search(move_in.lower())):
+        return "ASAP"
+    match = _WITHIN.search(lower)
+    if match:
+        return match.group(1)
+    match = _MOVE_DATE.search(move_in or "") or _MOVE_DATE.search(text)
+    if match:
+        return f"by {match.group(1)}"
+    if move_in:
+        return f"by {move_in}"
+    return None
+
+
+def _urgency(lower: str, timeline: Optional[str], phone: Optional[str]) -> int:
+    score = 5
+    if timeline == "ASAP":
+        score += 3
+    elif timeline and timeline.startswith("within"):
+        score += 1
+    if _SOON_WORDS.search(lower):
+        score += 1
+    if _TOUR_WORDS.search(lower):
+        score += 1
+    if phone:
+        score += 1
+    return min(score, 10)
+
+
+def _clean_message(body: str) -> str:
+    quoted = _QUOTED_REPLY.search(body)
+    if quoted:
+        body = body[:quoted.start()]
+    return _BLANK_LINES.sub("\n\n", body).strip()
+
+
+def parse_lead(sender: str, subject: str, body: str) -> Dict:
+    """Structured inquiry from an email's sender, subject and plain-text body"""
+    subject = (subject or "").strip()
+    body = (body or "").replace("\r\n", "\n")[:MAX_BODY_CHARS]
+    sender_name, sender_email = parseaddr(sender or "")
+    if not body.strip() and not subject:
+        raise LeadParseError("Message has no subject or body")
+
+    lower = body.lower()
+    rules = detect_source(sender_email, subject.lower(), lower)
+    fields = {}
+    if rules is not None:
+        for field, where, pattern in rules.rules:
+            if field in fields:
+                continue
+            match = pattern.search(subject if where == "subject" else body)
+            if match and match.group(1).strip():
+                fields[field] = match.group(1).strip()
+
+    # The prospect's own address, unless the listing site sent it for them
+    email_address = fields.get("prospect_email")
+    if email_address:
+        match = _EMAIL.search(email_address)
+        email_address = match.group(0) if match else None
+    if not email_address and sender_email and not _listing_domain(_domain(sender_email)):
+        email_address = sender_email
+    if not email_address:
+        email_address = next((m for m in _EMAIL.findall(body) if not _listing_domain(_domain(m))), None)
+
+    name = fields.get("prospect_name")
+    if not name and sender_name and "@" not in sender_name and not _listing_domain(_domain(sender_email)):
+        name = sender_name
+    if not name:
+        match = _NAME_INTRO.search(body) or _SIGNOFF.search(body)
+        name = match.group(1) if match else None
+
+    phone = normalize_phone(fields.get("prospect_phone"))
+    if not phone:
+        match = _PHONE.search(body)
+        phone = f"({match.group(1)}) {match.group(2)}-{match.group(3)}" if match else None
+
+    # The first address mentioned wins; its unit may only appear elsewhere
+    address = unit = None
+    for text in (fields.get("property_address"), subject, body):
+        match = _ADDRESS.search(text) if text else None
+        if not match:
+            continue
+        address = address or match.group(1)
+        if match.group(2) and match.group(1).lower() == address.lower():
+            unit = match.group(2)
+            break
+    address = address or fields.get("property_address")
+    if address and not unit:
+        match = _UNIT.search(fields.get("property_address") or subject)
+        unit = match.group(1) if match else None
+
+    budget = fields.get("budget")
+    if not budget:
+        match = _BUDGET.search(body)
+        budget = match.group(1) if match else None
+    if budget:
+        budget = re.sub(r"\s+", " ", budget)
+
+    timeline = _timeline(body, lower, fields.get("move_in"))
+    message = fields.get("message") or _clean_message(body)
+
+    if address:
+        property_info = f"{address} #{unit}" if unit else address
+    else:
+        property_info = "your listing"
+
+    return {
+        "prospect_name": name or DEFAULT_PROSPECT_NAME,
+        "prospect_email": email_address,
+        "prospect_phone": phone,
+        "message": message,
+        "source": rules.name if rules else DIRECT_SOURCE,
+        "source_label": rules.label if rules else "Direct email",
+        "property_address": address,
+        "property_unit": unit,
+        "property_info": property_info,
+        "budget": budget,
+        "timeline": timeline,
+        "urgency_score": _urgency(lower, timeline, phone),
+    }
+
+
+def _header(message, name: str) -> str:
+    value = message.get(name)
+    return _decode_header_value(str(value)).strip() if value is not None else ""
+
+
+def _text_body(message) -> str:
+    """Plain-text body, falling back to tag-stripped HTML"""
+    html_part = None
+    for part in message.walk() if message.is_multipart() else (message,):
+        if part.get_content_maintype() == "multipart" or part.get_filename():
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain":
+            return _decode_part(part)
+        if content_type == "text/html" and html_part is None:
+            html_part = part
+    if html_part is None:
+        return ""
+    text = _HTML_BREAKS.sub("\n", _decode_part(html_part))
+    return html.unescape(_HTML_TAGS.sub("", text))
+
+
+def _decode_part(part) -> str:
+    payload = part.get_payload(decode=True) or b""
+    charset = part.get_content_charset() or "utf-8"
+    try:
+        return payload.decode(charset, errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def _decode_header_value(value: str) -> str:
+    if "=?" in value:
+        try:
+            return str(make_header(decode_header(value)))
+        except Exception:
+            pass
+    return value
+
+
+def _simple_message(raw: bytes) -> Optional[Tuple[Dict[str, str], str]]:
+    """Headers and text of a single-part text message, without the email package
+
+    Most lead notifications are one text/plain part, and the feedparser
+    costs more than the rest of the parse. Anything else (multipart, odd
+    encodings) returns None and goes through email.message_from_bytes.
+    """
+    raw = raw.replace(b"\r\n", b"\n")
+    head, separator, body = raw.partition(b"\n\n")
+    if not separator:
+        return None
+    headers = {}
+    for line in _HEADER_FOLD.sub(" ", head.decode("utf-8", errors="replace")).split("\n"):
+        name, colon, value = line.partition(":")
+        if colon:
+            headers.setdefault(name.strip().lower(), value.strip())
+    content_type = headers.get("content-type", "text/plain").lower()
+    if not content_type.startswith(("text/plain", "text/html")):
+        return None
+    encoding = headers.get("content-transfer-encoding", "").lower()
+    if encoding == "base64":
+        body = base64.b64decode(body)
+    elif encoding == "quoted-printable":
+        body = quopri.decodestring(body)
+    elif encoding not in ("", "7bit", "8bit", "binary"):
+        return None
+    charset = _CHARSET.search(content_type)
+    try:
+        text = body.decode(charset.group(1) if charset else "utf-8", errors="replace")
+    except LookupError:
+        text = body.decode("utf-8", errors="replace")
+    if content_type.startswith("text/html"):
+        text = html.unescape(_HTML_TAGS.sub("", _HTML_BREAKS.sub("\n", text)))
+    return {name: _decode_header_value(value) for name, value in headers.items()}, text
+
+
+def parse_message(raw: Union[bytes, str]) -> Dict:
+    """parse_lead for a raw RFC 822 message, plus its Subject, Message-ID and Date"""
+    if isinstance(raw, str):
+        raw = raw.encode("utf-8", errors="surrogateescape")
+    simple = _simple_message(raw)
+    if simple is not None:
+        headers, body = simple
+    else:
+        # compat32 leaves headers as strings; the default policy's header
+        # objects cost more than the whole lead extraction
+        message = email.message_from_bytes(raw, policy=policy.compat32)
+        headers = {name: _header(message, name) for name in ("reply-to", "from", "subject", "message-id", "date")}
+        body = _text_body(message)
+    sender = headers.get("reply-to") or headers.get("from", "")
+    lead = parse_lead(sender, headers.get("subject", ""), body)
+    lead["subject"] = headers.get("subject") or None
+    lead["message_id"] = headers.get("message-id") or None
+    lead["received_at"] = headers.get("date") or None
+    return lead
+
+
+def parse_messages(raws: List[Union[bytes, str]]) -> List[Dict]:
+    """Parse each message; failures become {"error": ...} instead of raising"""
+    results = []
+    for raw in raws:
+        try:
+            results.append(parse_message(raw))
+        except Exception as e:
+            results.append({"error": str(e) or e.__class__.__name__})
+    return results
+
+
+def get_parse_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PARSE_WORKERS)
+        logger.info(f"Lead parsing pool started ({PARSE_WORKERS} processes)")
+    return _executor
+
+
+def shutdown_parse_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def parse_messages_async(raws: List[Union[bytes, str]]) -> List[Dict]:
+    """parse_messages off the event loop, in chunks across the process pool"""
+    loop = asyncio.get_running_loop()
+    if len(raws) < PARSE_INLINE_BELOW or PARSE_WORKERS <= 1:
+        return await asyncio.to_thread(parse_messages, raws)
+    executor = get_parse_executor()
+    chunks = [raws[i:i + PARSE_CHUNK_SIZE] for i in range(0, len(raws), PARSE_CHUNK_SIZE)]
+    parsed = await asyncio.gather(*(loop.run_in_executor(executor, parse_messages, chunk) for chunk in chunks))
+    return [lead for chunk in parsed for lead in chunk]
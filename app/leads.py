@@ -0,0 +1,121 @@
+# Parsed lead emails -> agent_inquiries for LeadFlow Pro
+#
+# Leads come from app.lead_parser. Each is matched to one of the agent's
+# properties by normalized address (and unit when the lead names one), then
+# all of them are inserted in a single transaction. Repeat inquiries from
+# a known prospect are linked to it by app.prospects.
+import re
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.prospects import DUPLICATE_INQUIRY_STATUS, match_prospect, set_primary
+
+_ADDRESS_WORDS = {
+    "street": "st", "avenue": "ave", "av": "ave", "road": "rd", "boulevard": "blvd",
+    "drive": "dr", "lane": "ln", "place": "pl", "court": "ct", "terrace": "ter",
+    "parkway": "pkwy", "square": "sq", "highway": "hwy", "circle": "cir",
+    "north": "n", "south": "s", "east": "e", "west": "w",
+}
+_NON_WORD = re.compile(r"[^\w\s]")
+_ORDINAL = re.compile(r"\b(\d+)(?:st|nd|rd|th)\b")
+_UNIT_PREFIX = re.compile(r"^(?:unit|apt|apartment|suite|ste|no)\b|#", re.IGNORECASE)
+
+
+def address_key(address: Optional[str]) -> str:
+    """'789 Columbus Avenue,' and '789 columbus ave' -> '789 columbus ave'"""
+    if not address:
+        return ""
+    words = _ORDINAL.sub(r"\1", _NON_WORD.sub(" ", address.lower())).split()
+    return " ".join(_ADDRESS_WORDS.get(word, word) for word in words)
+
+
+def unit_key(unit: Optional[str]) -> str:
+    """'Unit #2B', 'apt 2b' and '2B' -> '2B'"""
+    if not unit:
+        return ""
+    return _NON_WORD.sub("", _UNIT_PREFIX.sub("", unit.strip())).replace(" ", "").upper()
+
+
+class PropertyMatcher:
+    """One agent's properties, indexed by normalized address and unit"""
+
+    def __init__(self, rows):
+        self._by_address_unit: Dict[Tuple[str, str], int] = {}
+        self._by_address: Dict[str, List[int]] = {}
+        for row in rows:
+            key = address_key(row["address"])
+            if not key:
+                continue
+            self._by_address_unit.setdefault((key, unit_key(row["unit"])), row["id"])
+            self._by_address.setdefault(key, []).append(row["id"])
+
+    def match(self, address: Optional[str], unit: Optional[str]) -> Optional[int]:
+        """Exact address + unit; else the address alone if it has one property"""
+        key = address_key(address)
+        if not key:
+            return None
+        property_id = self._by_address_unit.get((key, unit_key(unit)))
+        if property_id is not None:
+            return property_id
+        candidates = self._by_address.get(key, ())
+        return candidates[0] if len(candidates) == 1 else None
+
+
+def load_property_matcher(agent_id: int, conn=None) -> PropertyMatcher:
+    rows = conn.execute(
+        "SELECT id, address, unit FROM agent_properties WHERE agent_id = ? AND is_active = TRUE",
+        (agent_id,)
+    ).fetchall()
+    return PropertyMatcher(rows)
+
+
+def insert_lead(agent_id: int, lead: dict, matcher: PropertyMatcher, conn=None) -> dict:
+    """Insert one parsed lead inside the caller's transaction
+
+    A repeat from a prospect within the de-dup window is stored as a
+    'duplicate' of the prospect's primary inquiry and reported as "linked".
+    """
+    if "error" in lead:
+        return {"status": "skipped", "error": lead["error"]}
+    if not lead.get("prospect_email") and not lead.get("prospect_phone"):
+        return {"status": "skipped", "error": "No email address or phone number for the prospect"}
+    property_id = matcher.match(lead.get("property_address"), lead.get("property_unit"))
+    now = time.time()
+    match = match_prospect(
+        agent_id, lead.get("prospect_name"), lead.get("prospect_email"), lead.get("prospect_phone"), now, conn=conn
+    )
+    prospect_id = match.prospect_id if match else None
+    duplicate_of = match.duplicate_of(now) if match else None
+    cursor = conn.execute("""
+        INSERT INTO agent_inquiries
+        (agent_id, property_id, prospect_name, prospect_email, prospect_phone, message, source, status, prospect_id, duplicate_of)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        agent_id, property_id, lead.get("prospect_name"), lead.get("prospect_email"),
+        lead.get("prospect_phone"), lead.get("message"), lead.get("source"),
+        DUPLICATE_INQUIRY_STATUS if duplicate_of else "new", prospect_id, duplicate_of
+    ))
+    result = {"inquiry_id": cursor.lastrowid, "property_id": property_id, "prospect_id": prospect_id}
+    if duplicate_of:
+        return {"status": "linked", **result, "duplicate_of": duplicate_of}
+    if match:
+        set_primary(prospect_id, cursor.lastrowid, now, conn=conn)
+    return {"status": "created", **result}
+
+
+def ingest_leads(agent_id: int, leads: List[dict], conn=None) -> List[dict]:
+    """Insert parsed leads as new inquiries in one transaction
+
+    Returns, per lead, {"status", "inquiry_id", "property_id", "prospect_id"};
+    leads that carry an "error" (failed to parse) or no way to contact the
+    prospect are skipped and reported as such.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        matcher = load_property_matcher(agent_id, conn=conn)
+        results = [insert_lead(agent_id, lead, matcher, conn=conn) for lead in leads]
+        conn.commit()
+        return results
+    except Exception:
+        conn.rollback()
+        raise
@@ -0,0 +1,437 @@
+# Incremental lead mailbox scanning for LeadFlow Pro
+#
+# Each agent has one lead mailbox: IMAP, or a local Maildir / mbox (the
+# stand-in for tests and benchmarks). A scan only reads what arrived after
+# the stored checkpoint (IMAP UID, mbox byte offset, Maildir mtime) and
+# streams it in batches of SCAN_BATCH_SIZE raw messages. Each batch is
+# parsed by app.lead_parser, de-duplicated against mailbox_messages and
+# stored in one transaction that also advances the checkpoint, so memory
+# stays bounded by the batch size and an interrupted scan resumes where it
+# stopped. A scan only holds a pooled connection while it reads the
+# mailbox row and while it stores each batch, never across the IMAP fetch
+# or the parsing.
+#
+# IMAP passwords are stored sealed with LEADFLOW_MAILBOX_KEY (see
+# seal_secret) and never returned by the API.
+import os
+import glob
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import imaplib
+import secrets
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.db import get_executor
+from app.lead_parser import parse_messages_async
+from app.leads import insert_lead, load_property_matcher
+
+SCAN_BATCH_SIZE = int(os.environ.get("LEADFLOW_SCAN_BATCH_SIZE", "500"))
+# A first scan of a large mailbox is spread over several calls
+SCAN_MAX_MESSAGES = int(os.environ.get("LEADFLOW_SCAN_MAX_MESSAGES", "20000"))
+# Local Maildir / mbox paths are relative to this directory; unset disables them
+MAILBOX_ROOT = os.environ.get("LEADFLOW_MAILBOX_ROOT")
+IMAP_TIMEOUT = float(os.environ.get("LEADFLOW_IMAP_TIMEOUT", "30"))
+# Secret for sealing stored IMAP passwords; IMAP mailboxes need it
+MAILBOX_KEY = os.environ.get("LEADFLOW_MAILBOX_KEY")
+
+MAILBOX_KINDS = ("imap", "maildir", "mbox")
+
+# (raw messages, checkpoint once they are stored)
+Batch = Tuple[List[bytes], Dict]
+
+# Agents with a scan in flight in this process; store_scan_batch keeps
+# scans from different workers from creating duplicates
+_scanning = set()
+
+
+class MailboxError(ValueError):
+    """The mailbox is not configured, misconfigured, or cannot be read"""
+
+
+class ScanInProgress(MailboxError):
+    """Another scan of the same agent's mailbox has not finished yet"""
+
+
+class ImapSource:
+    """Messages with a UID above the checkpoint, fetched without marking them read"""
+
+    def __init__(self, location: str, username: str, password: str, folder: str = "INBOX"):
+        host, _, port = location.partition(":")
+        self.host = host
+        self.port = int(port or 993)
+        self.username = username
+        self.password = password
+        self.folder = folder or "INBOX"
+
+    def batches(self, checkpoint: Dict, batch_size: int) -> Iterator[Batch]:
+        try:
+            imap = imaplib.IMAP4_SSL(self.host, self.port, timeout=IMAP_TIMEOUT)
+        except OSError as e:
+            raise MailboxError(f"Cannot connect to {self.host}:{self.port}: {e}")
+        try:
+            imap.login(self.username, self.password)
+            status, _ = imap.select(self.folder, readonly=True)
+            if status != "OK":
+                raise MailboxError(f"No folder named {self.folder}")
+            uidvalidity = int(imap.response("UIDVALIDITY")[1][-1])
+            # A new UIDVALIDITY means the server renumbered the folder
+            last_uid = checkpoint.get("uid", 0) if checkpoint.get("uidvalidity") == uidvalidity else 0
+            _, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+            # "n:*" always matches the highest UID, even when it is below n
+            uids = sorted(uid for uid in map(int, data[0].split()) if uid > last_uid)
+            for start in range(0, len(uids), batch_size):
+                chunk = uids[start:start + batch_size]
+                _, data = imap.uid("FETCH", ",".join(map(str, chunk)), "(BODY.PEEK[])")
+                raws = [part[1] for part in data if isinstance(part, tuple)]
+                yield raws, {"uidvalidity": uidvalidity, "uid": chunk[-1]}
+        except (imaplib.IMAP4.error, OSError) as e:
+            raise MailboxError(f"IMAP error: {e}")
+        finally:
+            try:
+                imap.logout()
+            except Exception:
+                pass
+
+
+class MboxSource:
+    """Messages appended past the checkpoint's byte offset"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def batches(self, checkpoint: Dict, batch_size: int) -> Iterator[Batch]:
+        try:
+            size = os.stat(self.path).st_size
+        except FileNotFoundError:
+            raise MailboxError(f"No mbox file at {self.path}")
+        offset = checkpoint.get("offset", 0)
+        if offset == size:
+            return
+        with open(self.path, "rb") as f:
+            if offset:
+                f.seek(offset)
+                # Shorter, or no message boundary at the offset: the file was
+                # rewritten (compacted) since the last scan, so start over
+                if offset > size or f.read(5) != b"From ":
+                    offset = 0
+            f.seek(offset)
+            if offset == 0 and size and f.read(5) != b"From ":
+                raise MailboxError(f"{self.path} is not an mbox file")
+            f.seek(offset)
+
+            batch, lines = [], None
+            start = position = offset
+            previous = b"\n"
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being appended; picked up by the next scan
+                    lines = None
+                    break
+                if line.startswith(b"From ") and previous in (b"\n", b"\r\n"):
+                    if lines is not None:
+                        batch.append(b"".join(lines))
+                        if len(batch) >= batch_size:
+                            yield batch, {"offset": position}
+                            batch = []
+                    lines = []
+                    start = position
+                elif line.startswith(b">") and line.lstrip(b">").startswith(b"From "):
+                    # mboxrd quoting
+                    lines.append(line[1:])
+                else:
+                    lines.append(line)
+                previous = line
+                position += len(line)
+            if lines is not None:
+                batch.append(b"".join(lines))
+                start = position
+            if batch or start != offset:
+                yield batch, {"offset": start}
+
+
+class MaildirSource:
+    """Files in new/ and cur/ modified at or after the checkpoint's mtime"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def batches(self, checkpoint: Dict, batch_size: int) -> Iterator[Batch]:
+        folders = [os.path.join(self.path, sub) for sub in ("new", "cur")]
+        try:
+            folder_mtimes = [os.stat(folder).st_mtime_ns for folder in folders]
+        except FileNotFoundError:
+            raise MailboxError(f"No Maildir at {self.path}")
+        # Delivery and new -> cur moves change the folder mtimes. Trust an
+        # unchanged mtime only if the last listing came well after it, so a
+        # delivery in the same clock tick as that listing is not missed.
+        if folder_mtimes == checkpoint.get("folder_mtimes") and checkpoint.get("settled"):
+            return
+        listed_ns = time.time_ns()
+        since = checkpoint.get("mtime", 0)
+
+        found = []
+        for folder in folders:
+            with os.scandir(folder) as entries:
+                for entry in entries:
+                    if entry.name.startswith(".") or not entry.is_file():
+                        continue
+                    mtime = entry.stat().st_mtime_ns
+                    if mtime >= since:
+                        found.append((mtime, entry.name, entry.path))
+        found.sort()
+
+        final = {
+            "folder_mtimes": folder_mtimes,
+            "settled": listed_ns - max(folder_mtimes) > 1_000_000_000,
+        }
+        for start in range(0, len(found), batch_size):
+            chunk = found[start:start + batch_size]
+            raws = [raw for raw in map(self._read, chunk) if raw is not None]
+            checkpoint = {"mtime": chunk[-1][0]}
+            if start + batch_size >= len(found):
+                checkpoint.update(final)
+            yield raws, checkpoint
+        if not found:
+            yield [], dict(final, mtime=since)
+
+    def _read(self, item) -> Optional[bytes]:
+        _, name, path = item
+        try:
+            with open(path, "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            # Moved from new/ to cur/ (gaining ":2,<flags>") since the listing
+            moved = glob.glob(os.path.join(glob.escape(self.path), "cur", glob.escape(name.split(":")[0]) + ":*"))
+            if moved:
+                with open(moved[0], "rb") as f:
+                    return f.read()
+            return None
+
+
+def local_mailbox_path(location: str) -> str:
+    """location resolved under LEADFLOW_MAILBOX_ROOT; anything outside it is refused"""
+    if not MAILBOX_ROOT:
+        raise MailboxError("Local mailboxes are disabled (LEADFLOW_MAILBOX_ROOT is not set)")
+    root = os.path.realpath(MAILBOX_ROOT)
+    path = os.path.realpath(os.path.join(root, location))
+    if path != root and not path.startswith(root + os.sep):
+        raise MailboxError("Mailbox path must be inside the mailbox root")
+    return path
+
+
+_SEALED_PREFIX = "sealed:v1:"
+
+
+def _mailbox_keys() -> Tuple[bytes, bytes]:
+    if not MAILBOX_KEY:
+        raise MailboxError("IMAP mailboxes are disabled (LEADFLOW_MAILBOX_KEY is not set)")
+    master = MAILBOX_KEY.encode("utf-8")
+    return (hmac.new(master, b"leadflow mailbox encrypt", hashlib.sha256).digest(),
+            hmac.new(master, b"leadflow mailbox mac", hashlib.sha256).digest())
+
+
+def _keystream(key: bytes, nonce: bytes, length: int) -> bytes:
+    blocks = (hmac.new(key, nonce + counter.to_bytes(8, "big"), hashlib.sha256).digest()
+              for counter in range((length + 31) // 32))
+    return b"".join(blocks)[:length]
+
+
+def seal_secret(secret: str) -> str:
+    """Encrypt-then-MAC with keys derived from LEADFLOW_MAILBOX_KEY
+
+    HMAC-SHA256 in counter mode supplies the keystream and a second
+    HMAC-SHA256 authenticates nonce and ciphertext; only the standard
+    library is needed.
+    """
+    encrypt_key, mac_key = _mailbox_keys()
+    nonce = secrets.token_bytes(16)
+    plain = secret.encode("utf-8")
+    cipher = bytes(a ^ b for a, b in zip(plain, _keystream(encrypt_key, nonce, len(plain))))
+    tag = hmac.new(mac_key, nonce + cipher, hashlib.sha256).digest()
+    return _SEALED_PREFIX + base64.urlsafe_b64encode(nonce + cipher + tag).decode("ascii")
+
+
+def unseal_secret(value: Optional[str]) -> Optional[str]:
+    """The plaintext of a seal_secret value; rows saved before sealing pass through"""
+    if not value or not value.startswith(_SEALED_PREFIX):
+        return value
+    encrypt_key, mac_key = _mailbox_keys()
+    raw = base64.urlsafe_b64decode(value[len(_SEALED_PREFIX):])
+    nonce, cipher, tag = raw[:16], raw[16:-32], raw[-32:]
+    if not hmac.compare_digest(tag, hmac.new(mac_key, nonce + cipher, hashlib.sha256).digest()):
+        raise MailboxError("Stored mailbox password cannot be decrypted (was LEADFLOW_MAILBOX_KEY changed?)")
+    return bytes(a ^ b for a, b in zip(cipher, _keystream(encrypt_key, nonce, len(cipher)))).decode("utf-8")
+
+
+def validate_mailbox(config: dict) -> dict:
+    """Column values for agent_mailboxes from a PUT /api/automation/mailbox body"""
+    kind = str(config.get("kind") or "").lower()
+    location = str(config.get("location") or "").strip()
+    if kind not in MAILBOX_KINDS:
+        raise MailboxError(f"kind must be one of {', '.join(MAILBOX_KINDS)}")
+    if not location:
+        raise MailboxError("location is required")
+    if kind == "imap":
+        if not config.get("username") or not config.get("password"):
+            raise MailboxError("username and password are required for IMAP")
+    else:
+        local_mailbox_path(location)
+    return {
+        "kind": kind,
+        "location": location,
+        "username": config.get("username"),
+        "password": seal_secret(str(config["password"])) if kind == "imap" else None,
+        "folder": config.get("folder") or "INBOX",
+    }
+
+
+def open_source(mailbox):
+    """The source for an agent_mailboxes row"""
+    if mailbox["kind"] == "imap":
+        return ImapSource(mailbox["location"], mailbox["username"], unseal_secret(mailbox["password"]), mailbox["folder"])
+    path = local_mailbox_path(mailbox["location"])
+    return MboxSource(path) if mailbox["kind"] == "mbox" else MaildirSource(path)
+
+
+def save_mailbox(agent_id: int, values: dict, conn=None):
+    """Create or replace the agent's mailbox; the checkpoint starts over
+
+    mailbox_messages is kept, so messages already ingested from the old
+    configuration are not turned into inquiries again.
+    """
+    conn.execute("""
+        INSERT INTO agent_mailboxes (agent_id, kind, location, username, password, folder, checkpoint)
+        VALUES (?, ?, ?, ?, ?, ?, NULL)
+        ON CONFLICT(agent_id) DO UPDATE SET
+            kind = excluded.kind, location = excluded.location, username = excluded.username,
+            password = excluded.password, folder = excluded.folder, checkpoint = NULL,
+            updated_at = CURRENT_TIMESTAMP
+    """, (agent_id, values["kind"], values["location"], values["username"], values["password"], values["folder"]))
+    conn.commit()
+
+
+def message_key(raw: bytes, lead: dict) -> str:
+    """Message-ID, or a content hash for messages without one"""
+    return lead.get("message_id") or "blake2b:" + hashlib.blake2b(raw, digest_size=16).hexdigest()
+
+
+def store_scan_batch(agent_id: int, leads: List[dict], keys: List[str], checkpoint: Dict, conn=None) -> List[dict]:
+    """Insert one batch's new inquiries and advance the checkpoint, atomically
+
+    Messages whose key is already in mailbox_messages are reported as
+    duplicates; repeats from a known prospect are stored and "linked". Unusable ones (parse errors, no contact details) are
+    recorded too, so they are not parsed again.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        matcher = load_property_matcher(agent_id, conn=conn)
+        results = []
+        for lead, key in zip(leads, keys):
+            seen = conn.execute(
+                "INSERT OR IGNORE INTO mailbox_messages (agent_id, message_key) VALUES (?, ?)", (agent_id, key)
+            )
+            if seen.rowcount == 0:
+                results.append({"status": "duplicate"})
+                continue
+            result = insert_lead(agent_id, lead, matcher, conn=conn)
+            if "inquiry_id" in result:
+                conn.execute(
+                    "UPDATE mailbox_messages SET inquiry_id = ? WHERE agent_id = ? AND message_key = ?",
+                    (result["inquiry_id"], agent_id, key)
+                )
+            results.append(result)
+        conn.execute(
+            "UPDATE agent_mailboxes SET checkpoint = ? WHERE agent_id = ?", (json.dumps(checkpoint), agent_id)
+        )
+        conn.commit()
+        return results
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def load_mailbox(agent_id: int, conn=None):
+    """The agent's mailbox row; a password saved before sealing is sealed now"""
+    mailbox = conn.execute("SELECT * FROM agent_mailboxes WHERE agent_id = ?", (agent_id,)).fetchone()
+    if mailbox is not None and mailbox["password"] and not mailbox["password"].startswith(_SEALED_PREFIX) and MAILBOX_KEY:
+        conn.execute(
+            "UPDATE agent_mailboxes SET password = ? WHERE agent_id = ?", (seal_secret(mailbox["password"]), agent_id)
+        )
+        conn.commit()
+    return mailbox
+
+
+def _record_scan(agent_id: int, created: int, conn=None):
+    conn.execute(
+        "UPDATE agent_mailboxes SET last_scan_at = CURRENT_TIMESTAMP, last_scan_created = ? WHERE agent_id = ?",
+        (created, agent_id)
+    )
+    conn.commit()
+
+
+async def scan_mailbox(agent_id: int, max_messages: int = SCAN_MAX_MESSAGES, keep: int = 50) -> dict:
+    """Ingest everything that arrived since the agent's last scan
+
+    Returns the counts plus up to keep of the new inquiries (parsed lead
+    merged with its insert result). "more" is set when max_messages was
+    reached before the mailbox was exhausted.
+    """
+    if agent_id in _scanning:
+        raise ScanInProgress("A scan of this mailbox is already running")
+    _scanning.add(agent_id)
+    try:
+        return await _scan_mailbox(agent_id, max_messages, keep)
+    finally:
+        _scanning.discard(agent_id)
+
+
+async def _scan_mailbox(agent_id: int, max_messages: int, keep: int) -> dict:
+    executor = get_executor()
+    mailbox = await executor.run_with_connection(load_mailbox, agent_id)
+    if mailbox is None:
+        raise MailboxError("No mailbox configured")
+    source = open_source(mailbox)
+    batches = source.batches(json.loads(mailbox["checkpoint"] or "{}"), SCAN_BATCH_SIZE)
+
+    scanned = created = linked = duplicates = 0
+    inquiries = []
+    more = False
+    try:
+        while True:
+            batch = await asyncio.to_thread(next, batches, None)
+            if batch is None:
+                break
+            raws, checkpoint = batch
+            leads = await parse_messages_async(raws) if raws else []
+            keys = [message_key(raw, lead) for raw, lead in zip(raws, leads)]
+            results = await executor.run_with_connection(store_scan_batch, agent_id, leads, keys, checkpoint)
+            for lead, result in zip(leads, results):
+                if result["status"] == "created":
+                    created += 1
+                    if len(inquiries) < keep:
+                        inquiries.append({**lead, **result})
+                elif result["status"] == "linked":
+                    linked += 1
+                elif result["status"] == "duplicate":
+                    duplicates += 1
+            scanned += len(raws)
+            if scanned >= max_messages:
+                more = True
+                break
+    finally:
+        await asyncio.to_thread(batches.close)
+
+    await executor.run_with_connection(_record_scan, agent_id, created)
+    return {
+        "scanned": scanned,
+        "created": created,
+        "linked": linked,
+        "duplicates": duplicates,
+        "skipped": scanned - created - linked - duplicates,
+        "more": more,
+        "inquiries": inquiries,
+    }
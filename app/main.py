@@ -1,24 +1,59 @@
 # Complete LeadFlow Pro main.py with bulletproof authentication and Wone.co style endpoints
+# First, so the startup "imports" phase covers everything below
+from app.startup import startup_timer
+
+import os
 import sqlite3
-import hashlib
 import secrets
 import jwt
 import logging
-import time
+import asyncio
 import re
 from datetime import datetime, timedelta
 import json
 from typing import Optional
+from urllib.parse import parse_qs
 
-from fastapi import FastAPI, HTTPException, Depends, Request, Form, status
+from fastapi import FastAPI, HTTPException, Depends, Request, Form, Header, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import HTMLResponse, JSONResponse
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, EmailStr, validator
 from contextlib import contextmanager
 
+from app.db import AsyncConnection, DatabaseBusy, PoolTimeout, get_pool, get_executor, close_pool, get_db
+from app.migrations import MIGRATIONS, ensure_schema
+from app.export import (
+    EXPORT_FORMATS, INQUIRY_EXPORT_COLUMNS, TRACKING_EXPORT_COLUMNS,
+    ExportResponse, parse_export_date, inquiries_export_query, tracking_export_query, stream_export
+)
+from app.pagination import InvalidCursor, use_pagination, page_size, keyset_filter, next_cursor
+from app.token_cache import TokenCache
+from app.rate_limit import RateLimitPolicy, create_rate_limiter
+from app.stats import stats_cache, get_agent_stats, reconcile_stats_forever
+from app.etag import conditional_etag
+from app.serialization import fetch_dicts, list_response
+from app.assets import page_assets
+from app.property_index import property_index
+from app.search import MAX_SEARCH_OFFSET, SEARCH_KINDS, search_inquiries, search_properties, rebuild_search_index
+from app.activity import parse_activity_types, property_activity
+from app.bulk import (
+    MAX_BULK_ROWS, BulkRequestError, parse_property_rows, validate_property_row,
+    insert_properties, update_property_statuses, log_email_batch
+)
+from app.lead_parser import (
+    MAX_PARSE_BATCH, LeadParseError, parse_lead, parse_message, parse_messages_async, shutdown_parse_executor
+)
+from app.leads import ingest_leads
+from app.replies import (
+    DEFAULT_TEMPLATE, MAX_RENDER_BATCH, ReplyTemplateError, delete_template, list_templates,
+    render_replies, save_template, template_cache
+)
+from app.mailbox import MailboxError, ScanInProgress, save_mailbox, scan_mailbox, validate_mailbox
+from app.dispatcher import MailDispatcher, enqueue_replies, mail_configured, outbound_depth
+from app.webhooks import InboxWorker, enqueue_webhook, inbox_depth, requeue_dead
+from app.passwords import needs_rehash, hash_password_async, verify_password_async, shutdown_hash_executor
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -50,11 +85,24 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 1440  # 24 hours
 # Security scheme
 security = HTTPBearer()
 
-# Database configuration
-DATABASE_PATH = "app/leadflow.db"
+# Verified tokens, so repeat requests skip jwt.decode
+token_cache = TokenCache()
+
+# Admin operations (rate-limit resets etc.) require this token in X-Admin-Token
+ADMIN_TOKEN = os.environ.get("LEADFLOW_ADMIN_TOKEN")
+
+# Rate limiting
+rate_limiter = create_rate_limiter()
+rate_limiter.add_policy(RateLimitPolicy.from_env("login", max_requests=5, window_seconds=15 * 60))
+rate_limiter.add_policy(RateLimitPolicy.from_env("register", max_requests=3, window_seconds=60 * 60))
+
+# Webhook inbox
+webhook_worker = InboxWorker()
+webhook_worker.on_applied = stats_cache.invalidate
 
-# Rate limiting storage
-rate_limit_storage = {}
+# Outbound mail
+mail_dispatcher = MailDispatcher()
+mail_dispatcher.on_sent = stats_cache.invalidate
 
 # Pydantic models
 class AgentCreate(BaseModel):
@@ -97,198 +145,24 @@ class TokenResponse(BaseModel):
     token_type: str
     agent: dict
 
-# Initialize automation tracking tables
-def init_automation_tracking_tables():
-    """Initialize automation tracking tables"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    
-    # Email automation tracking table
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS email_automation_tracking (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            property_id INTEGER,
-            prospect_email TEXT,
-            email_sent_date DATETIME DEFAULT CURRENT_TIMESTAMP,
-            acuity_appointment_id INTEGER,
-            tour_scheduled BOOLEAN DEFAULT FALSE,
-            tour_date DATETIME,
-            appointment_type_id TEXT,
-            prospect_name TEXT,
-            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (property_id) REFERENCES agent_properties (id)
-        )
-    """)
-    
-    # Automation stats table for dashboard
-    conn.execute("""
-        CREATE TABLE IF NOT EXISTS automation_stats (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            agent_id INTEGER,
-            emails_sent INTEGER DEFAULT 0,
-            tours_scheduled INTEGER DEFAULT 0,
-            response_rate REAL DEFAULT 0.0,
-            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (agent_id) REFERENCES agents (id)
-        )
-    """)
-    
-    conn.commit()
-    conn.close()
-
-def update_automation_stats(agent_id: int, conn=None):
-    """Update automation statistics for an agent"""
-    close_conn = False
-    if conn is None:
-        conn = sqlite3.connect(DATABASE_PATH)
-        close_conn = True
-    
-    try:
-        # Count emails sent (placeholder for now - we'll implement email logging later)
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM email_automation_tracking WHERE property_id IN (SELECT id FROM agent_properties WHERE agent_id = ?)",
-            (agent_id,)
-        )
-        emails_sent = cursor.fetchone()[0] or 0
-        
-        # Count tours scheduled
-        cursor = conn.execute(
-            "SELECT COUNT(*) FROM email_automation_tracking WHERE tour_scheduled = TRUE AND property_id IN (SELECT id FROM agent_properties WHERE agent_id = ?)",
-            (agent_id,)
-        )
-        tours_scheduled = cursor.fetchone()[0] or 0
-        
-        # Calculate response rate
-        response_rate = (tours_scheduled / emails_sent * 100) if emails_sent > 0 else 0.0
-        
-        # Update or insert stats
-        cursor = conn.execute("SELECT id FROM automation_stats WHERE agent_id = ?", (agent_id,))
-        existing = cursor.fetchone()
-        
-        if existing:
-            conn.execute("""
-                UPDATE automation_stats 
-                SET emails_sent = ?, tours_scheduled = ?, response_rate = ?, last_updated = CURRENT_TIMESTAMP
-                WHERE agent_id = ?
-            """, (emails_sent, tours_scheduled, response_rate, agent_id))
-        else:
-            conn.execute("""
-                INSERT INTO automation_stats (agent_id, emails_sent, tours_scheduled, response_rate)
-                VALUES (?, ?, ?, ?)
-            """, (agent_id, emails_sent, tours_scheduled, response_rate))
-        
-        if close_conn:
-            conn.commit()
-            
-    finally:
-        if close_conn:
-            conn.close()
-
-def get_active_properties_count(agent_id: int) -> int:
-    """Get count of active properties for an agent"""
-    conn = sqlite3.connect(DATABASE_PATH)
-    cursor = conn.execute(
-        "SELECT COUNT(*) FROM agent_properties WHERE agent_id = ? AND is_active = TRUE",
-        (agent_id,)
-    )
-    count = cursor.fetchone()[0] or 0
-    conn.close()
-    return count
-
-def initialize_automation_system():
-    """Initialize automation tracking system"""
-    init_automation_tracking_tables()
-    logger.info("Automation tracking system initialized")
-
 # Database initialization
 def init_database():
-    """Initialize the database with all required tables"""
+    """Bring the database schema up to date
+
+    The acuity index is not loaded here: the webhook worker and the
+    property write paths load it on first use.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        # Agents table
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS agents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                email TEXT UNIQUE NOT NULL,
-                first_name TEXT NOT NULL,
-                last_name TEXT NOT NULL,
-                company TEXT NOT NULL,
-                password_hash TEXT NOT NULL,
-                is_active BOOLEAN DEFAULT TRUE,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        # Agent properties table
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS agent_properties (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id INTEGER NOT NULL,
-                address TEXT NOT NULL,
-                unit TEXT,
-                rent REAL,
-                bedrooms INTEGER,
-                bathrooms REAL,
-                square_feet INTEGER,
-                description TEXT,
-                amenities TEXT,
-                availability_date TEXT,
-                is_active BOOLEAN DEFAULT TRUE,
-                status TEXT DEFAULT 'active',
-                acuity_id TEXT,
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (agent_id) REFERENCES agents (id)
-            )
-        """)
-        
-        # Agent inquiries table
-        conn.execute("""
-            CREATE TABLE IF NOT EXISTS agent_inquiries (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                agent_id INTEGER NOT NULL,
-                property_id INTEGER,
-                prospect_name TEXT,
-                prospect_email TEXT,
-                prospect_phone TEXT,
-                message TEXT,
-                source TEXT,
-                status TEXT DEFAULT 'new',
-                created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (agent_id) REFERENCES agents (id),
-                FOREIGN KEY (property_id) REFERENCES agent_properties (id)
-            )
-        """)
+        with get_pool().connection() as conn:
+            applied = ensure_schema(conn)
         
-        # Initialize automation tracking tables
-        init_automation_tracking_tables()
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info("Database initialized successfully")
+        logger.info(f"Database initialized successfully (schema version {MIGRATIONS[-1][0]}, applied {applied or 'none'})")
         
     except Exception as e:
         logger.error(f"Database initialization error: {str(e)}")
         raise
 
 # Authentication functions
-def hash_password(password: str) -> str:
-    """Hash a password with salt"""
-    salt = secrets.token_hex(16)
-    pwd_hash = hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000)
-    return f"{salt}:{pwd_hash.hex()}"
-
-def verify_password(password: str, password_hash: str) -> bool:
-    """Verify a password against its hash"""
-    try:
-        salt, pwd_hash = password_hash.split(':')
-        return pwd_hash == hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), 100000).hex()
-    except:
-        return False
-
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create a JWT access token"""
     to_encode = data.copy()
@@ -300,92 +174,103 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
-    """Verify JWT token"""
+async def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    """Verify JWT token, skipping signature checks for recently verified tokens"""
+    token = credentials.credentials
+    agent_id = token_cache.get(token)
+    if agent_id is not None:
+        return agent_id
+    
     try:
-        payload = jwt.decode(credentials.credentials, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         agent_id: int = payload.get("sub")
         if agent_id is None:
             raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-        return agent_id
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid authentication credentials")
-
-def get_current_agent_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
-    """Get current authenticated agent ID"""
-    return verify_token(credentials)
-
-def rate_limit_check(identifier: str, max_requests: int = 5, window_minutes: int = 15) -> bool:
-    """Check if request should be rate limited"""
-    current_time = time.time()
-    window_start = current_time - (window_minutes * 60)
-    
-    if identifier not in rate_limit_storage:
-        rate_limit_storage[identifier] = []
     
-    # Remove old requests outside the window
-    rate_limit_storage[identifier] = [
-        req_time for req_time in rate_limit_storage[identifier] 
-        if req_time > window_start
-    ]
-    
-    # Check if limit exceeded
-    if len(rate_limit_storage[identifier]) >= max_requests:
-        return False
+    if token_cache.is_revoked(agent_id, token_cache.digest(token)):
+        raise HTTPException(status_code=401, detail="Invalid authentication credentials")
     
-    # Add current request
-    rate_limit_storage[identifier].append(current_time)
-    return True
+    token_cache.put(token, agent_id, payload["exp"])
+    return agent_id
 
-# Templates
-templates = Jinja2Templates(directory="app/templates")
+async def get_current_agent_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> int:
+    """Get current authenticated agent ID"""
+    return await verify_token(credentials)
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Guard for operational endpoints"""
+    if not ADMIN_TOKEN or not x_admin_token or not secrets.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Admin token required")
 
 # Startup event
 @app.on_event("startup")
 async def startup():
     """Initialize the application"""
-    init_database()
-    initialize_automation_system()
+    startup_timer.mark("imports")
+    with startup_timer.phase("database"):
+        init_database()
+    with startup_timer.phase("background tasks"):
+        # Pages are built on demand until the prebuild catches up
+        app.state.asset_prebuild = asyncio.create_task(asyncio.to_thread(page_assets.load))
+        app.state.stats_reconciler = asyncio.create_task(reconcile_stats_forever())
+        app.state.webhook_worker = asyncio.create_task(webhook_worker.run_forever())
+        if mail_configured():
+            app.state.mail_dispatcher = asyncio.create_task(mail_dispatcher.run_forever())
+    startup_timer.log()
     logger.info("LeadFlow Pro started successfully")
 
-# Static files
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
+# Shutdown event
+@app.on_event("shutdown")
+async def shutdown():
+    """Release pooled database connections and worker pools"""
+    tasks = [app.state.stats_reconciler, app.state.webhook_worker]
+    if getattr(app.state, "mail_dispatcher", None) is not None:
+        tasks.append(app.state.mail_dispatcher)
+    for task in tasks:
+        task.cancel()
+    # Let them unwind before the executor they run on goes away
+    await asyncio.gather(*tasks, return_exceptions=True)
+    close_pool()
+    shutdown_hash_executor()
+    shutdown_parse_executor()
+
+@app.exception_handler(DatabaseBusy)
+@app.exception_handler(PoolTimeout)
+async def database_busy_handler(request: Request, exc: Exception):
+    """Shed load when the database queue is full or no connection frees up"""
+    return JSONResponse(status_code=503, content={"detail": "Server busy, please retry"}, headers={"Retry-After": "1"})
 
 # Authentication routes
 @app.post("/api/auth/register", response_model=TokenResponse)
-async def register_agent(agent: AgentCreate, request: Request):
+async def register_agent(agent: AgentCreate, request: Request, db: AsyncConnection = Depends(get_db)):
     """Register a new agent"""
     client_ip = request.client.host
     
     # Rate limiting
-    if not rate_limit_check(f"register_{client_ip}", max_requests=3, window_minutes=60):
+    if not await rate_limiter.check("register", client_ip, db):
         raise HTTPException(status_code=429, detail="Too many registration attempts")
     
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
         # Check if agent already exists
-        cursor = conn.execute("SELECT id FROM agents WHERE email = ?", (agent.email,))
-        if cursor.fetchone():
+        if await db.fetchone("SELECT id FROM agents WHERE email = ?", (agent.email,)):
             raise HTTPException(status_code=400, detail="Email already registered")
         
         # Hash password
-        password_hash = hash_password(agent.password)
+        password_hash = await hash_password_async(agent.password)
         
         # Insert new agent
-        cursor = conn.execute("""
+        cursor = await db.execute("""
             INSERT INTO agents (email, first_name, last_name, company, password_hash)
             VALUES (?, ?, ?, ?, ?)
         """, (agent.email, agent.first_name, agent.last_name, agent.company, password_hash))
         
         agent_id = cursor.lastrowid
-        conn.commit()
+        await db.commit()
         
         # Get the created agent
-        cursor = conn.execute("SELECT * FROM agents WHERE id = ?", (agent_id,))
-        agent_data = cursor.fetchone()
-        conn.close()
+        agent_data = await db.fetchone("SELECT * FROM agents WHERE id = ?", (agent_id,))
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -407,6 +292,8 @@ async def register_agent(agent: AgentCreate, request: Request):
             }
         )
         
+    except HTTPException:
+        raise
     except sqlite3.IntegrityError:
         raise HTTPException(status_code=400, detail="Email already registered")
     except Exception as e:
@@ -414,26 +301,30 @@ async def register_agent(agent: AgentCreate, request: Request):
         raise HTTPException(status_code=500, detail="Registration failed")
 
 @app.post("/api/auth/login", response_model=TokenResponse)
-async def login_agent(agent: AgentLogin, request: Request):
+async def login_agent(agent: AgentLogin, request: Request, db: AsyncConnection = Depends(get_db)):
     """Login an agent"""
     client_ip = request.client.host
     
     # Rate limiting
-    if not rate_limit_check(f"login_{client_ip}", max_requests=5, window_minutes=15):
+    if not await rate_limiter.check("login", client_ip, db):
         raise HTTPException(status_code=429, detail="Too many login attempts")
     
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
         # Get agent by email
-        cursor = conn.execute("SELECT * FROM agents WHERE email = ? AND is_active = TRUE", (agent.email,))
-        agent_data = cursor.fetchone()
+        agent_data = await db.fetchone("SELECT * FROM agents WHERE email = ? AND is_active = TRUE", (agent.email,))
         
-        if not agent_data or not verify_password(agent.password, agent_data["password_hash"]):
+        if not agent_data or not await verify_password_async(agent.password, agent_data["password_hash"]):
             raise HTTPException(status_code=401, detail="Invalid email or password")
         
-        conn.close()
+        # Transparently upgrade hashes made with an older KDF cost
+        if needs_rehash(agent_data["password_hash"]):
+            new_hash = await hash_password_async(agent.password)
+            await db.execute(
+                "UPDATE agents SET password_hash = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                (new_hash, agent_data["id"])
+            )
+            await db.commit()
+            logger.info(f"Password hash upgraded for agent {agent_data['id']}")
         
         # Create access token
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -463,57 +354,64 @@ async def login_agent(agent: AgentLogin, request: Request):
 
 # Properties API endpoints
 @app.get("/api/properties")
-async def get_properties(agent_id: int = Depends(get_current_agent_id)):
-    """Get all properties for the current agent"""
+async def get_properties(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Get properties for the current agent, newest first
+
+    Pass limit and/or cursor for keyset pagination; the response then carries
+    next_cursor instead of total. Supports If-None-Match.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        cursor = conn.execute("""
-            SELECT id, address, unit, rent, bedrooms, bathrooms, 
-                   availability_date, status, acuity_id, created_at, updated_at, is_active
+        _, not_modified = await conditional_etag(request, response, agent_id, db)
+        if not_modified:
+            return not_modified
+        
+        paginate = use_pagination(limit, cursor)
+        size = page_size(limit)
+        after, after_params = keyset_filter(cursor) if paginate else ("", ())
+        page = f"LIMIT {size + 1}" if paginate else ""
+        
+        rows = await db.run(fetch_dicts, f"""
+            SELECT id, address, unit, COALESCE(CAST(NULLIF(rent, '') AS REAL), 0.0) AS rent,
+                   bedrooms, bathrooms, availability_date, COALESCE(NULLIF(status, ''), 'active') AS status,
+                   acuity_id, is_active, created_at, updated_at
             FROM agent_properties 
-            WHERE agent_id = ?
-            ORDER BY created_at DESC
-        """, (agent_id,))
-        
-        properties = []
-        for row in cursor.fetchall():
-            property_dict = {
-                "id": row["id"],
-                "address": row["address"],
-                "unit": row["unit"],
-                "rent": float(row["rent"]) if row["rent"] else 0.0,
-                "bedrooms": row["bedrooms"],
-                "bathrooms": row["bathrooms"],
-                "availability_date": row["availability_date"],
-                "status": row["status"] or "active",
-                "acuity_id": row["acuity_id"],
-                "is_active": bool(row["is_active"]),
-                "created_at": row["created_at"],
-                "updated_at": row["updated_at"]
-            }
-            properties.append(property_dict)
-        
-        conn.close()
-        
-        return {
+            WHERE agent_id = ?{after}
+            ORDER BY created_at DESC, id DESC
+            {page}
+        """, (agent_id, *after_params), {"is_active": bool})
+        
+        if paginate:
+            return list_response(request, response, {
+                "success": True,
+                "properties": rows[:size],
+                "next_cursor": next_cursor(rows, size),
+                "has_more": len(rows) > size
+            })
+        
+        return list_response(request, response, {
             "success": True,
-            "properties": properties,
-            "total": len(properties)
-        }
+            "properties": rows,
+            "total": len(rows)
+        })
         
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching properties: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to fetch properties: {str(e)}")
 
 @app.post("/api/properties")
-async def create_property(property_data: dict, agent_id: int = Depends(get_current_agent_id)):
+async def create_property(property_data: dict, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
     """Create a new property"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        cursor = conn.execute("""
+        cursor = await db.execute("""
             INSERT INTO agent_properties 
             (agent_id, address, unit, rent, bedrooms, bathrooms, square_feet, description, amenities, availability_date, acuity_id)
             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
@@ -532,8 +430,9 @@ async def create_property(property_data: dict, agent_id: int = Depends(get_curre
         ))
         
         property_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        await db.commit()
+        stats_cache.invalidate(agent_id)
+        await db.run(property_index.refresh_property, property_id)
         
         logger.info(f"Property created by agent {agent_id}: {property_data.get('address')}")
         
@@ -548,22 +447,18 @@ async def create_property(property_data: dict, agent_id: int = Depends(get_curre
         raise HTTPException(status_code=500, detail=f"Failed to create property: {str(e)}")
 
 @app.put("/api/properties/{property_id}")
-async def update_property(property_id: int, property_data: dict, agent_id: int = Depends(get_current_agent_id)):
+async def update_property(property_id: int, property_data: dict, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
     """Update a property"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
         # Verify the property belongs to the current agent
-        cursor = conn.execute(
+        if not await db.fetchone(
             "SELECT id FROM agent_properties WHERE id = ? AND agent_id = ?",
             (property_id, agent_id)
-        )
-        
-        if not cursor.fetchone():
+        ):
             raise HTTPException(status_code=404, detail="Property not found")
         
         # Update the property
-        cursor = conn.execute("""
+        await db.execute("""
             UPDATE agent_properties 
             SET address = ?, unit = ?, rent = ?, bedrooms = ?, bathrooms = ?, 
                 square_feet = ?, description = ?, amenities = ?, availability_date = ?, 
@@ -584,117 +479,231 @@ async def update_property(property_id: int, property_data: dict, agent_id: int =
             agent_id
         ))
         
-        conn.commit()
-        conn.close()
+        await db.commit()
+        await db.run(property_index.refresh_property, property_id)
         
         return {
             "success": True,
             "message": "Property updated successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating property: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update property: {str(e)}")
 
+@app.get("/api/properties/{property_id}/activity")
+async def get_property_activity(
+    request: Request,
+    response: Response,
+    property_id: int,
+    types: Optional[str] = None,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Inquiries, emails and tours for one property, newest first
+
+    types is a comma-separated subset of inquiry,email,tour. Pages are
+    keyset-paginated like the list endpoints: pass next_cursor back as cursor.
+    """
+    try:
+        activity_types = parse_activity_types(types)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    try:
+        property_row = await db.fetchone("""
+            SELECT id, address, unit, rent, bedrooms, bathrooms, square_feet, status, is_active, created_at
+            FROM agent_properties WHERE id = ? AND agent_id = ?
+        """, (property_id, agent_id))
+        if not property_row:
+            raise HTTPException(status_code=404, detail="Property not found")
+        
+        activity = await db.run(property_activity, property_id, activity_types, cursor, page_size(limit))
+        
+        return list_response(request, response, {
+            "success": True,
+            "property": dict(property_row),
+            **activity
+        })
+        
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error fetching property activity: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to fetch property activity")
+
+@app.post("/api/properties/bulk")
+async def create_properties_bulk(
+    request: Request,
+    skip_invalid: bool = False,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Import many properties from a JSON array or a CSV body (Content-Type: text/csv)
+
+    Every row is validated before anything is written. Unless skip_invalid
+    is set, one bad row rejects the whole import; either way the errors
+    are reported per row (1-based, as in the uploaded file).
+    """
+    try:
+        rows = parse_property_rows(await request.body(), request.headers.get("content-type", ""))
+    except BulkRequestError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    valid = []
+    errors = []
+    for index, row in enumerate(rows, start=1):
+        values, row_errors = validate_property_row(row)
+        if row_errors:
+            errors.append({"row": index, "errors": row_errors})
+        else:
+            valid.append(values)
+    
+    if errors and not skip_invalid:
+        raise HTTPException(status_code=422, detail={"message": "No properties imported", "errors": errors})
+    
+    try:
+        property_ids = await db.run(insert_properties, agent_id, valid) if valid else []
+        stats_cache.invalidate(agent_id)
+        await db.run(property_index.load)
+        
+        logger.info(f"Bulk import by agent {agent_id}: {len(property_ids)} created, {len(errors)} rejected")
+        
+        return {
+            "success": True,
+            "created": len(property_ids),
+            "property_ids": property_ids,
+            "errors": errors
+        }
+        
+    except Exception as e:
+        logger.error(f"Error importing properties: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to import properties: {str(e)}")
+
+@app.patch("/api/properties/status/bulk")
+async def update_property_status_bulk(status_data: dict, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """Set the same status on many properties in one transaction"""
+    property_ids = status_data.get("property_ids")
+    if not isinstance(property_ids, list) or not property_ids or not all(isinstance(i, int) for i in property_ids):
+        raise HTTPException(status_code=400, detail="property_ids must be a non-empty list of ids")
+    if len(property_ids) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ROWS} properties per request")
+    
+    try:
+        status = status_data.get("status", "active")
+        is_active = status_data.get("is_active", status == "active")
+        
+        updated = await db.run(update_property_statuses, agent_id, property_ids, status, is_active)
+        stats_cache.invalidate(agent_id)
+        await db.run(property_index.load)
+        
+        return {
+            "success": True,
+            "updated": len(updated),
+            "not_found": sorted(set(property_ids) - set(updated))
+        }
+        
+    except Exception as e:
+        logger.error(f"Error updating property statuses: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to update property statuses: {str(e)}")
+
 @app.patch("/api/properties/{property_id}/status")
-async def update_property_status(property_id: int, status_data: dict, agent_id: int = Depends(get_current_agent_id)):
+async def update_property_status(property_id: int, status_data: dict, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
     """Update property status"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
         # Verify the property belongs to the current agent
-        cursor = conn.execute(
+        if not await db.fetchone(
             "SELECT id FROM agent_properties WHERE id = ? AND agent_id = ?",
             (property_id, agent_id)
-        )
-        
-        if not cursor.fetchone():
+        ):
             raise HTTPException(status_code=404, detail="Property not found")
         
         # Update the property status
         status = status_data.get("status", "active")
         is_active = status_data.get("is_active", status == "active")
         
-        cursor = conn.execute("""
+        await db.execute("""
             UPDATE agent_properties 
             SET status = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP
             WHERE id = ? AND agent_id = ?
         """, (status, is_active, property_id, agent_id))
         
-        conn.commit()
-        conn.close()
+        await db.commit()
+        stats_cache.invalidate(agent_id)
+        await db.run(property_index.refresh_property, property_id)
         
         return {
             "success": True,
             "message": "Property status updated successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error updating property status: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to update property status: {str(e)}")
 
 @app.delete("/api/properties/{property_id}")
-async def delete_property(property_id: int, agent_id: int = Depends(get_current_agent_id)):
+async def delete_property(property_id: int, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
     """Delete a property"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
         # Verify the property belongs to the current agent
-        cursor = conn.execute(
+        if not await db.fetchone(
             "SELECT id FROM agent_properties WHERE id = ? AND agent_id = ?",
             (property_id, agent_id)
-        )
-        
-        if not cursor.fetchone():
+        ):
             raise HTTPException(status_code=404, detail="Property not found")
         
         # Delete the property
-        cursor = conn.execute(
+        await db.execute(
             "DELETE FROM agent_properties WHERE id = ? AND agent_id = ?",
             (property_id, agent_id)
         )
         
-        conn.commit()
-        conn.close()
+        await db.commit()
+        stats_cache.invalidate(agent_id)
+        await db.run(property_index.refresh_property, property_id)
         
         return {
             "success": True,
             "message": "Property deleted successfully"
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error deleting property: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to delete property: {str(e)}")
 
 # Dashboard API endpoints
 @app.get("/api/dashboard/stats")
-async def get_dashboard_stats(agent_id: int = Depends(get_current_agent_id)):
-    """Get dashboard statistics"""
+async def get_dashboard_stats(
+    request: Request,
+    response: Response,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Get dashboard statistics; supports If-None-Match"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        # Get total properties
-        cursor = conn.execute("SELECT COUNT(*) as count FROM agent_properties WHERE agent_id = ?", (agent_id,))
-        total_properties = cursor.fetchone()["count"]
-        
-        # Get active properties
-        cursor = conn.execute("SELECT COUNT(*) as count FROM agent_properties WHERE agent_id = ? AND is_active = TRUE", (agent_id,))
-        active_properties = cursor.fetchone()["count"]
-        
-        # Get total inquiries
-        cursor = conn.execute("SELECT COUNT(*) as count FROM agent_inquiries WHERE agent_id = ?", (agent_id,))
-        total_inquiries = cursor.fetchone()["count"]
+        version, not_modified = await conditional_etag(request, response, agent_id, db)
+        if not_modified:
+            return not_modified
         
-        conn.close()
+        stats = await get_agent_stats(agent_id, db, version)
         
         return {
             "success": True,
             "stats": {
-                "total_properties": total_properties,
-                "active_properties": active_properties,
-                "total_inquiries": total_inquiries,
-                "response_rate": 0  # Placeholder
+                "total_properties": stats["total_properties"],
+                "active_properties": stats["active_properties"],
+                "total_inquiries": stats["total_inquiries"],
+                "response_rate": stats["response_rate"]
             }
         }
         
@@ -704,148 +713,128 @@ async def get_dashboard_stats(agent_id: int = Depends(get_current_agent_id)):
 
 # Inquiries API endpoints
 @app.get("/api/inquiries")
-async def get_inquiries(agent_id: int = Depends(get_current_agent_id)):
-    """Get inquiries for the current agent"""
+async def get_inquiries(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = None,
+    cursor: Optional[str] = None,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Get inquiries for the current agent, newest first
+
+    Pass limit and/or cursor for keyset pagination. Supports If-None-Match.
+    """
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        cursor = conn.execute("""
-            SELECT i.*, p.address, p.unit 
+        _, not_modified = await conditional_etag(request, response, agent_id, db)
+        if not_modified:
+            return not_modified
+        
+        paginate = use_pagination(limit, cursor)
+        size = page_size(limit)
+        after, after_params = keyset_filter(cursor, "i") if paginate else ("", ())
+        page = f"LIMIT {size + 1}" if paginate else ""
+        
+        rows = await db.run(fetch_dicts, f"""
+            SELECT i.id, i.prospect_name, i.prospect_email, i.prospect_phone, i.message,
+                   i.source, i.status, i.prospect_id, i.duplicate_of, i.created_at,
+                   p.address AS property_address, p.unit AS property_unit
             FROM agent_inquiries i
             LEFT JOIN agent_properties p ON i.property_id = p.id
-            WHERE i.agent_id = ?
-            ORDER BY i.created_at DESC
-        """, (agent_id,))
-        
-        inquiries = []
-        for row in cursor.fetchall():
-            inquiry = {
-                "id": row["id"],
-                "prospect_name": row["prospect_name"],
-                "prospect_email": row["prospect_email"],
-                "prospect_phone": row["prospect_phone"],
-                "message": row["message"],
-                "source": row["source"],
-                "status": row["status"],
-                "created_at": row["created_at"],
-                "property_address": row["address"],
-                "property_unit": row["unit"]
-            }
-            inquiries.append(inquiry)
-        
-        conn.close()
-        
-        return {
+            WHERE i.agent_id = ?{after}
+            ORDER BY i.created_at DESC, i.id DESC
+            {page}
+        """, (agent_id, *after_params))
+        
+        if paginate:
+            return list_response(request, response, {
+                "success": True,
+                "inquiries": rows[:size],
+                "next_cursor": next_cursor(rows, size),
+                "has_more": len(rows) > size
+            })
+        
+        return list_response(request, response, {
             "success": True,
-            "inquiries": inquiries
-        }
+            "inquiries": rows
+        })
         
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error fetching inquiries: {str(e)}")
         raise HTTPException(status_code=500, detail="Failed to fetch inquiries")
 
-# Acuity webhook endpoint
-@app.post("/api/webhooks/acuity")
-async def acuity_webhook(request: Request):
-    """Handle Acuity Scheduling webhooks for tour bookings"""
+# Search endpoint
+@app.get("/api/search")
+async def search(
+    request: Request,
+    response: Response,
+    q: str,
+    type: str = "all",
+    limit: Optional[int] = None,
+    offset: int = 0,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Ranked full-text search over the agent's inquiries and/or properties
+
+    Every word of q is matched as a prefix (so "jo gma" finds
+    john@gmail.com). type is inquiries, properties or all. Results are
+    ranked, so pages are addressed by offset rather than by cursor.
+    """
+    kinds = SEARCH_KINDS if type == "all" else (type,)
+    if any(kind not in SEARCH_KINDS for kind in kinds):
+        raise HTTPException(status_code=400, detail="type must be inquiries, properties or all")
+    if not 0 <= offset <= MAX_SEARCH_OFFSET:
+        raise HTTPException(status_code=400, detail=f"offset must be between 0 and {MAX_SEARCH_OFFSET}")
+    
     try:
-        # Get the webhook payload
-        body = await request.body()
-        webhook_data = json.loads(body.decode('utf-8'))
-        
-        logger.info(f"Acuity webhook received: {webhook_data}")
-        
-        # Extract appointment details
-        appointment_id = webhook_data.get('id')
-        appointment_type_id = webhook_data.get('appointmentTypeID')
-        client_email = webhook_data.get('email')
-        client_name = f"{webhook_data.get('firstName', '')} {webhook_data.get('lastName', '')}".strip()
-        appointment_datetime = webhook_data.get('datetime')
-        
-        if not appointment_type_id:
-            logger.warning("No appointmentTypeID in webhook data")
-            return {"status": "error", "message": "No appointment type ID"}
-        
-        # Find the property with this Acuity ID
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        cursor = conn.execute(
-            "SELECT id, address, unit, agent_id FROM agent_properties WHERE acuity_id = ?",
-            (str(appointment_type_id),)
-        )
-        property_data = cursor.fetchone()
-        
-        if not property_data:
-            logger.warning(f"No property found with Acuity ID: {appointment_type_id}")
-            conn.close()
-            return {"status": "error", "message": "Property not found"}
-        
-        # Log the tour booking
-        cursor = conn.execute("""
-            INSERT INTO email_automation_tracking 
-            (property_id, prospect_email, prospect_name, acuity_appointment_id, 
-             tour_scheduled, tour_date, appointment_type_id)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (
-            property_data['id'],
-            client_email,
-            client_name,
-            appointment_id,
-            True,
-            appointment_datetime,
-            appointment_type_id
-        ))
-        
-        # Update automation stats
-        update_automation_stats(property_data['agent_id'], conn)
-        
-        conn.commit()
-        conn.close()
-        
-        logger.info(f"Tour scheduled: {client_name} for {property_data['address']}")
-        
-        return {"status": "success", "message": "Tour booking logged"}
+        size = page_size(limit)
+        results = {"success": True, "query": q}
+        for kind in kinds:
+            search_fn = search_inquiries if kind == "inquiries" else search_properties
+            rows = await db.run(search_fn, agent_id, q, size + 1, offset)
+            results[kind] = rows[:size]
+            results[f"{kind}_has_more"] = len(rows) > size
+        return list_response(request, response, results)
         
     except Exception as e:
-        logger.error(f"Acuity webhook error: {str(e)}")
-        return {"status": "error", "message": str(e)}
+        logger.error(f"Error searching: {str(e)}")
+        raise HTTPException(status_code=500, detail="Search failed")
+
+# Acuity webhook endpoint
+@app.post("/api/webhooks/acuity")
+async def acuity_webhook(request: Request, db: AsyncConnection = Depends(get_db)):
+    """Queue an Acuity Scheduling notification and ack immediately
+
+    The delivery is applied by webhook_worker; retries of the same
+    appointment event are acknowledged but not stored twice.
+    """
+    body = await request.body()
+    inbox_id = await db.run(enqueue_webhook, "acuity", body)
+    if inbox_id is None:
+        return {"status": "success", "message": "Duplicate delivery ignored"}
+    
+    webhook_worker.notify()
+    logger.info(f"Acuity webhook queued: inbox {inbox_id}")
+    
+    return {"status": "success", "message": "Webhook queued"}
 
 # Automation stats API endpoint
 @app.get("/api/automation/stats")
-async def get_automation_stats(agent_id: int = Depends(get_current_agent_id)):
+async def get_automation_stats(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
     """Get automation statistics for the current agent"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        conn.row_factory = sqlite3.Row
-        
-        cursor = conn.execute(
-            "SELECT * FROM automation_stats WHERE agent_id = ?",
-            (agent_id,)
-        )
-        stats = cursor.fetchone()
-        
-        if not stats:
-            # Initialize stats if they don't exist
-            update_automation_stats(agent_id, conn)
-            conn.commit()
-            
-            cursor = conn.execute(
-                "SELECT * FROM automation_stats WHERE agent_id = ?",
-                (agent_id,)
-            )
-            stats = cursor.fetchone()
-        
-        conn.close()
+        stats = await get_agent_stats(agent_id, db)
         
         return {
             "success": True,
             "stats": {
-                "emails_sent": stats['emails_sent'] if stats else 0,
-                "tours_scheduled": stats['tours_scheduled'] if stats else 0,
-                "response_rate": round(stats['response_rate'], 1) if stats else 0.0,
-                "active_properties": get_active_properties_count(agent_id)
+                "emails_sent": stats["emails_sent"],
+                "tours_scheduled": stats["tours_scheduled"],
+                "response_rate": stats["tour_rate"],
+                "active_properties": stats["active_properties"]
             }
         }
         
@@ -857,13 +846,12 @@ async def get_automation_stats(agent_id: int = Depends(get_current_agent_id)):
 @app.post("/api/automation/log-email")
 async def log_email_sent(
     email_data: dict,
-    agent_id: int = Depends(get_current_agent_id)
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
 ):
     """Log when an automated email is sent"""
     try:
-        conn = sqlite3.connect(DATABASE_PATH)
-        
-        cursor = conn.execute("""
+        await db.execute("""
             INSERT INTO email_automation_tracking 
             (property_id, prospect_email, prospect_name, email_sent_date)
             VALUES (?, ?, ?, CURRENT_TIMESTAMP)
@@ -873,11 +861,9 @@ async def log_email_sent(
             email_data.get('prospect_name', '')
         ))
         
-        # Update stats
-        update_automation_stats(agent_id, conn)
-        
-        conn.commit()
-        conn.close()
+        # automation_stats is updated by the tracking insert trigger
+        await db.commit()
+        stats_cache.invalidate(agent_id)
         
         return {"success": True, "message": "Email logged"}
         
@@ -885,6 +871,484 @@ async def log_email_sent(
         logger.error(f"Error logging email: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/api/automation/log-email/batch")
+async def log_emails_sent_batch(
+    batch: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Log many automated emails in one transaction
+
+    Body: {"emails": [{"property_id", "prospect_email", "prospect_name"}, ...]}.
+    Returns one result per email, in request order.
+    """
+    emails = batch.get("emails")
+    if not isinstance(emails, list) or not emails:
+        raise HTTPException(status_code=400, detail="emails must be a non-empty list")
+    if len(emails) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ROWS} emails per request")
+    
+    try:
+        results = await db.run(log_email_batch, agent_id, emails)
+        stats_cache.invalidate(agent_id)
+        
+        logged = sum(1 for result in results if result["status"] == "logged")
+        return {
+            "success": True,
+            "logged": logged,
+            "rejected": len(results) - logged,
+            "results": results
+        }
+        
+    except Exception as e:
+        logger.error(f"Error logging email batch: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Mailbox scanning endpoints
+_QUESTION = re.compile(r"[^.!?\n]*\?")
+
+def _pending_email(inquiry: dict, reply: dict) -> dict:
+    """A newly scanned inquiry and its drafted reply, in the shape automation.html lists"""
+    message = inquiry.get("message") or ""
+    questions = [q.strip() for q in _QUESTION.findall(message)][:3]
+    return {
+        "id": inquiry["inquiry_id"],
+        "subject": inquiry.get("subject") or inquiry.get("property_info") or "New inquiry",
+        "platform": inquiry.get("source_label") or "Email",
+        "preview": message[:160],
+        "content": reply.get("body", ""),
+        "needsAgentInput": bool(questions),
+        "questions": questions,
+        "confidence": 95 if inquiry.get("property_id") else 75
+    }
+
+@app.get("/api/automation/mailbox")
+async def get_mailbox(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """The agent's lead mailbox settings and last scan (never the password)"""
+    mailbox = await db.fetchone("""
+        SELECT kind, location, username, folder, checkpoint IS NOT NULL AS scanned, last_scan_at, last_scan_created
+        FROM agent_mailboxes WHERE agent_id = ?
+    """, (agent_id,))
+    return {"success": True, "mailbox": dict(mailbox) if mailbox else None}
+
+@app.put("/api/automation/mailbox")
+async def put_mailbox(
+    config: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Set the lead mailbox: {"kind": "imap", "location": "host[:port]", "username",
+    "password", "folder"}, or {"kind": "maildir" | "mbox", "location": "<path>"} with
+    the path relative to LEADFLOW_MAILBOX_ROOT. The scan checkpoint starts over.
+    """
+    try:
+        values = validate_mailbox(config)
+    except MailboxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    await db.run(save_mailbox, agent_id, values)
+    return {"success": True, "message": "Mailbox saved"}
+
+@app.post("/api/automation/scan")
+async def scan_for_inquiries(agent_id: int = Depends(get_current_agent_id)):
+    """Turn lead emails that arrived since the last scan into inquiries
+
+    Only messages past the mailbox checkpoint are read, so rescanning an
+    unchanged mailbox is close to free. "more" means the per-call limit was
+    reached; scanning again continues from there. The scan leases database
+    connections per batch rather than for the whole request.
+    """
+    try:
+        result = await scan_mailbox(agent_id)
+    except ScanInProgress as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except MailboxError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error scanning mailbox: {str(e)}")
+        raise HTTPException(status_code=500, detail="Mailbox scan failed")
+    
+    if result["created"] or result["linked"]:
+        stats_cache.invalidate(agent_id)
+        logger.info(f"Mailbox scan for agent {agent_id}: {result['created']} new inquiries from {result['scanned']} messages")
+    replies = await get_executor().run_with_connection(
+        render_replies, agent_id, [{"inquiry_id": inquiry["inquiry_id"]} for inquiry in result["inquiries"]]
+    )
+    
+    return {
+        "success": True,
+        "scanned": result["scanned"],
+        "created": result["created"],
+        "linked": result["linked"],
+        "duplicates": result["duplicates"],
+        "skipped": result["skipped"],
+        "more": result["more"],
+        "emails": [_pending_email(inquiry, reply) for inquiry, reply in zip(result["inquiries"], replies)]
+    }
+
+@app.post("/api/automation/send", status_code=202)
+async def send_replies(
+    batch: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Queue replies to scanned inquiries; delivery happens in the background
+
+    Body: {"emails": [{"id": <inquiry id>, "subject", "finalContent"}, ...]}.
+    Emails without finalContent get the property's reply template. Returns
+    once the replies are queued. Each sent reply is recorded in
+    email_automation_tracking by the dispatcher.
+    """
+    emails = batch.get("emails")
+    if not isinstance(emails, list) or not emails:
+        raise HTTPException(status_code=400, detail="emails must be a non-empty list")
+    if len(emails) > MAX_BULK_ROWS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_ROWS} emails per request")
+    if not mail_configured():
+        raise HTTPException(status_code=503, detail="Outbound email is not configured")
+    
+    try:
+        drafts = [index for index, item in enumerate(emails)
+                  if isinstance(item, dict) and not item.get("finalContent") and not item.get("body")]
+        if drafts:
+            rendered = await db.run(render_replies, agent_id, [
+                {"inquiry_id": emails[index].get("inquiry_id", emails[index].get("id"))} for index in drafts
+            ])
+            for index, reply in zip(drafts, rendered):
+                if "body" in reply:
+                    emails[index] = {**emails[index], "subject": reply["subject"], "finalContent": reply["body"]}
+        results = await db.run(enqueue_replies, agent_id, emails)
+        mail_dispatcher.notify()
+        
+        queued = sum(1 for result in results if result["status"] == "queued")
+        return {
+            "success": True,
+            "queued": queued,
+            "rejected": len(results) - queued,
+            "results": results
+        }
+        
+    except Exception as e:
+        logger.error(f"Error queueing replies: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+# Reply template endpoints
+@app.get("/api/automation/templates")
+async def get_reply_templates(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """The agent's reply templates, plus the built-in default they fall back to"""
+    return {
+        "success": True,
+        "templates": await db.run(list_templates, agent_id),
+        "default": DEFAULT_TEMPLATE
+    }
+
+@app.put("/api/automation/templates")
+async def put_reply_template(
+    template: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Save a reply template: {"property_id": <id, or null for the agent default>, "subject", "body"}
+
+    Templates are Jinja2 text with prospect, property and agent variables
+    (see app.replies.DEFAULT_TEMPLATE).
+    """
+    property_id = template.get("property_id")
+    subject, body = template.get("subject"), template.get("body")
+    if property_id is not None and (not isinstance(property_id, int) or isinstance(property_id, bool)):
+        raise HTTPException(status_code=400, detail="property_id must be an integer or null")
+    if not isinstance(subject, str) or not subject.strip() or not isinstance(body, str) or not body.strip():
+        raise HTTPException(status_code=400, detail="subject and body are required")
+    
+    try:
+        saved = await db.run(save_template, agent_id, property_id, subject, body)
+    except ReplyTemplateError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "template": saved}
+
+@app.delete("/api/automation/templates/{template_id}")
+async def delete_reply_template(template_id: int, agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """Remove a template; its property falls back to the agent default"""
+    if not await db.run(delete_template, agent_id, template_id):
+        raise HTTPException(status_code=404, detail="Template not found")
+    return {"success": True, "message": "Template deleted"}
+
+@app.post("/api/automation/replies/render")
+async def render_reply_batch(
+    batch: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Render replies for many recipients at once
+
+    Body: {"recipients": [{"inquiry_id"} or {"property_id", "prospect_name",
+    "prospect_email"}, ...]}. Results come back in request order.
+    """
+    recipients = batch.get("recipients")
+    if not isinstance(recipients, list) or not recipients:
+        raise HTTPException(status_code=400, detail="recipients must be a non-empty list")
+    if len(recipients) > MAX_RENDER_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_RENDER_BATCH} recipients per request")
+    
+    try:
+        results = await db.run(render_replies, agent_id, recipients)
+        failed = sum(1 for result in results if "error" in result)
+        return {
+            "success": True,
+            "rendered": len(results) - failed,
+            "failed": failed,
+            "results": results
+        }
+        
+    except Exception as e:
+        logger.error(f"Error rendering replies: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to render replies")
+
+# Lead email parsing endpoints
+@app.post("/api/email/test-parser")
+async def test_email_parser(request: Request):
+    """Parse one lead email without storing it (used by the email test page)
+
+    Takes the page's form fields (sender_email, subject, body), or a raw
+    RFC 822 message with Content-Type: message/rfc822.
+    """
+    body = await request.body()
+    try:
+        if request.headers.get("content-type", "").startswith("message/rfc822"):
+            parsed = await asyncio.to_thread(parse_message, body)
+        else:
+            form = {key: values[0] for key, values in parse_qs(body.decode("utf-8", errors="replace")).items()}
+            parsed = await asyncio.to_thread(parse_lead, form.get("sender_email", ""), form.get("subject", ""), form.get("body", ""))
+        return {
+            "success": True,
+            "parsed_data": parsed
+        }
+        
+    except LeadParseError as e:
+        return {"success": False, "error": str(e)}
+    except Exception as e:
+        logger.error(f"Error parsing test email: {str(e)}")
+        return {"success": False, "error": "Error parsing email"}
+
+@app.post("/api/email/parse-batch")
+async def parse_email_batch(
+    batch: dict,
+    agent_id: int = Depends(get_current_agent_id),
+    db: AsyncConnection = Depends(get_db)
+):
+    """Parse many raw RFC 822 messages, optionally storing them as inquiries
+
+    Body: {"messages": ["<raw message>", ...], "ingest": false}. Large
+    batches are parsed across the worker process pool. Results come back
+    in request order; with ingest, each parsed lead also carries the new
+    inquiry_id and the property it was matched to.
+    """
+    messages = batch.get("messages")
+    if not isinstance(messages, list) or not messages or not all(isinstance(m, str) for m in messages):
+        raise HTTPException(status_code=400, detail="messages must be a non-empty list of raw emails")
+    if len(messages) > MAX_PARSE_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_PARSE_BATCH} messages per request")
+    
+    try:
+        leads = await parse_messages_async(messages)
+        results = [{"index": index, **lead} for index, lead in enumerate(leads)]
+        failed = sum(1 for lead in leads if "error" in lead)
+        
+        created = linked = 0
+        if batch.get("ingest"):
+            stored = await db.run(ingest_leads, agent_id, leads)
+            for result, outcome in zip(results, stored):
+                result.update(outcome)
+            created = sum(1 for outcome in stored if outcome["status"] == "created")
+            linked = sum(1 for outcome in stored if outcome["status"] == "linked")
+            stats_cache.invalidate(agent_id)
+            logger.info(f"Ingested {created} parsed lead emails for agent {agent_id}")
+        
+        return {
+            "success": True,
+            "parsed": len(leads) - failed,
+            "failed": failed,
+            "created": created,
+            "linked": linked,
+            "results": results
+        }
+        
+    except Exception as e:
+        logger.error(f"Error parsing email batch: {str(e)}")
+        raise HTTPException(status_code=500, detail="Failed to parse emails")
+
+# Export endpoints
+def _export_response(kind: str, agent_id: int, fmt: str, since: Optional[str], until: Optional[str]):
+    """Validate export parameters and build the streaming response"""
+    if fmt not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {fmt}")
+    try:
+        since, until = parse_export_date(since), parse_export_date(until)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="since/until must be ISO dates")
+    
+    if kind == "inquiries":
+        sql, params = inquiries_export_query(agent_id, since, until)
+        columns = INQUIRY_EXPORT_COLUMNS
+    else:
+        sql, params = tracking_export_query(agent_id, since, until)
+        columns = TRACKING_EXPORT_COLUMNS
+    
+    filename = f"{kind}-{datetime.utcnow().strftime('%Y%m%d')}.{'csv' if fmt == 'csv' else 'ndjson'}"
+    return ExportResponse(
+        stream_export(sql, params, columns, fmt),
+        media_type=EXPORT_FORMATS[fmt],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+@app.get("/api/export/inquiries")
+async def export_inquiries(
+    format: str = "ndjson",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    agent_id: int = Depends(get_current_agent_id)
+):
+    """Stream the agent's inquiries as NDJSON or CSV, optionally limited to [since, until)"""
+    return _export_response("inquiries", agent_id, format, since, until)
+
+@app.get("/api/export/tracking")
+async def export_tracking(
+    format: str = "ndjson",
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    agent_id: int = Depends(get_current_agent_id)
+):
+    """Stream the agent's email automation tracking history as NDJSON or CSV"""
+    return _export_response("tracking", agent_id, format, since, until)
+
+# System endpoints
+@app.get("/api/system/db-pool")
+async def get_db_pool_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Connection pool usage (in use, waits, wait time)"""
+    return {
+        "success": True,
+        "pool": get_pool().stats(),
+        "executor": get_executor().stats()
+    }
+
+@app.get("/api/system/token-cache")
+async def get_token_cache_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Decoded-JWT cache hit/miss counters"""
+    return {
+        "success": True,
+        "token_cache": token_cache.stats()
+    }
+
+@app.get("/api/system/stats-cache")
+async def get_stats_cache_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Per-agent dashboard stats cache counters"""
+    return {
+        "success": True,
+        "stats_cache": stats_cache.stats()
+    }
+
+@app.get("/api/system/rate-limits")
+async def get_rate_limit_stats(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """Rate limiter policies, tracked keys and rejections"""
+    return {
+        "success": True,
+        "rate_limits": await db.run(rate_limiter.stats)
+    }
+
+# Admin endpoints
+@app.delete("/api/admin/rate-limits", dependencies=[Depends(require_admin)])
+async def clear_rate_limits(
+    policy: Optional[str] = None,
+    identifier: Optional[str] = None,
+    db: AsyncConnection = Depends(get_db)
+):
+    """Reset rate-limit counters for one client, one route, or everyone"""
+    cleared = await db.run(rate_limiter.clear, policy, identifier)
+    logger.info(f"Rate limits cleared: policy={policy} identifier={identifier} ({cleared} keys)")
+    return {
+        "success": True,
+        "cleared": cleared
+    }
+
+@app.get("/api/system/startup")
+async def get_startup_timing(agent_id: int = Depends(get_current_agent_id)):
+    """Per-phase startup time of this process against the budget"""
+    return {
+        "success": True,
+        "startup": startup_timer.report()
+    }
+
+@app.get("/api/system/assets")
+async def get_asset_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Prebuilt page and static asset sizes"""
+    return {
+        "success": True,
+        "assets": page_assets.stats()
+    }
+
+@app.get("/api/system/acuity-index")
+async def get_acuity_index_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Webhook routing index size and reload counters"""
+    return {
+        "success": True,
+        "acuity_index": property_index.stats()
+    }
+
+@app.get("/api/system/webhook-inbox")
+async def get_webhook_inbox_stats(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """Webhook inbox depth, lag and worker counters"""
+    return {
+        "success": True,
+        "inbox": await db.run(inbox_depth),
+        "worker": webhook_worker.stats()
+    }
+
+@app.get("/api/system/outbound")
+async def get_outbound_stats(agent_id: int = Depends(get_current_agent_id), db: AsyncConnection = Depends(get_db)):
+    """Outbound mail queue depth and dispatcher throughput / queue latency"""
+    return {
+        "success": True,
+        "queue": await db.run(outbound_depth),
+        "dispatcher": mail_dispatcher.stats()
+    }
+
+@app.get("/api/system/reply-templates")
+async def get_reply_template_cache_stats(agent_id: int = Depends(get_current_agent_id)):
+    """Compiled reply template cache size and hit counters"""
+    return {
+        "success": True,
+        "template_cache": template_cache.stats()
+    }
+
+@app.post("/api/admin/webhooks/requeue", dependencies=[Depends(require_admin)])
+async def requeue_dead_webhooks(inbox_id: Optional[int] = None, db: AsyncConnection = Depends(get_db)):
+    """Retry dead-lettered webhook deliveries (all, or one by inbox id)"""
+    requeued = await db.run(requeue_dead, inbox_id)
+    webhook_worker.notify()
+    logger.info(f"Webhooks requeued: inbox_id={inbox_id} ({requeued} rows)")
+    return {
+        "success": True,
+        "requeued": requeued
+    }
+
+@app.post("/api/admin/search/rebuild", dependencies=[Depends(require_admin)])
+async def rebuild_search(db: AsyncConnection = Depends(get_db)):
+    """Rebuild the full-text indexes from the inquiry and property tables"""
+    indexed = await db.run(rebuild_search_index)
+    logger.info(f"Search index rebuilt: {indexed}")
+    return {
+        "success": True,
+        "indexed": indexed
+    }
+
+# Static files, prebuilt by page_assets
+@app.get("/static/{path:path}")
+async def static_file(path: str, request: Request):
+    """Static file by plain or fingerprinted name"""
+    response = page_assets.static_response(request, path)
+    if response is None:
+        raise HTTPException(status_code=404, detail="Not found")
+    return response
+
 # HTML page routes
 @app.get("/", response_class=HTMLResponse)
 async def root():
@@ -897,39 +1361,49 @@ async def root():
     """
 
 @app.get("/login", response_class=HTMLResponse)
-async def login_page():
+async def login_page(request: Request):
     """Login page"""
-    return templates.TemplateResponse("login.html", {"request": {}})
+    return page_assets.page_response(request, "login.html")
 
 @app.get("/signup", response_class=HTMLResponse)
-async def signup_page():
+async def signup_page(request: Request):
     """Signup page"""
-    return templates.TemplateResponse("signup.html", {"request": {}})
+    return page_assets.page_response(request, "signup.html")
 
 @app.get("/dashboard", response_class=HTMLResponse)
-async def dashboard_page():
+async def dashboard_page(request: Request):
     """Dashboard page"""
-    return templates.TemplateResponse("dashboard.html", {"request": {}})
+    return page_assets.page_response(request, "dashboard.html")
 
 @app.get("/properties", response_class=HTMLResponse)
-async def properties_page():
+async def properties_page(request: Request):
     """Properties page"""
-    return templates.TemplateResponse("properties.html", {"request": {}})
+    return page_assets.page_response(request, "properties.html")
 
 @app.get("/inquiries", response_class=HTMLResponse)
-async def inquiries_page():
+async def inquiries_page(request: Request):
     """Inquiries page"""
-    return templates.TemplateResponse("inquiries.html", {"request": {}})
+    return page_assets.page_response(request, "inquiries.html")
 
 @app.get("/automation", response_class=HTMLResponse)
-async def automation_page():
+async def automation_page(request: Request):
     """Automation page"""
-    return templates.TemplateResponse("automation.html", {"request": {}})
+    return page_assets.page_response(request, "automation.html")
+
+@app.get("/property/{property_id}", response_class=HTMLResponse)
+async def property_activity_page(request: Request, property_id: int):
+    """Property activity page"""
+    return page_assets.page_response(request, "property_activity.html")
+
+@app.get("/email-test", response_class=HTMLResponse)
+async def email_test_page(request: Request):
+    """Lead email parser test page"""
+    return page_assets.page_response(request, "email-test.html")
 
 @app.get("/profile", response_class=HTMLResponse)
-async def profile_page():
+async def profile_page(request: Request):
     """Profile & Settings page"""
-    return templates.TemplateResponse("profile.html", {"request": {}})
+    return page_assets.page_response(request, "profile.html")
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,585 @@
+# Versioned schema migrations for LeadFlow Pro
+#
+# Each migration runs once, in order, inside its own transaction, and is
+# written to be safe on databases that were patched by hand with the old
+# fix_*.py / update_database.py scripts. To change the schema, append a new
+# (version, name, function) entry to MIGRATIONS; never edit one that has
+# shipped.
+import zlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _columns(conn, table: str) -> set:
+    return {row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()}
+
+
+def _baseline_schema(conn):
+    """Tables previously created by init_database / init_automation_tracking_tables"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            email TEXT UNIQUE NOT NULL,
+            first_name TEXT NOT NULL,
+            last_name TEXT NOT NULL,
+            company TEXT NOT NULL,
+            password_hash TEXT NOT NULL,
+            is_active BOOLEAN DEFAULT TRUE,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_properties (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER NOT NULL,
+            address TEXT NOT NULL,
+            unit TEXT,
+            rent REAL,
+            bedrooms INTEGER,
+            bathrooms REAL,
+            square_feet INTEGER,
+            description TEXT,
+            amenities TEXT,
+            availability_date TEXT,
+            is_active BOOLEAN DEFAULT TRUE,
+            status TEXT DEFAULT 'active',
+            acuity_id TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_inquiries (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER NOT NULL,
+            property_id INTEGER,
+            prospect_name TEXT,
+            prospect_email TEXT,
+            prospect_phone TEXT,
+            message TEXT,
+            source TEXT,
+            status TEXT DEFAULT 'new',
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id),
+            FOREIGN KEY (property_id) REFERENCES agent_properties (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS email_automation_tracking (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            property_id INTEGER,
+            prospect_email TEXT,
+            email_sent_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+            acuity_appointment_id INTEGER,
+            tour_scheduled BOOLEAN DEFAULT FALSE,
+            tour_date DATETIME,
+            appointment_type_id TEXT,
+            prospect_name TEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (property_id) REFERENCES agent_properties (id)
+        )
+    """)
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS automation_stats (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER,
+            emails_sent INTEGER DEFAULT 0,
+            tours_scheduled INTEGER DEFAULT 0,
+            response_rate REAL DEFAULT 0.0,
+            last_updated DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    """)
+
+
+def _legacy_columns(conn):
+    """Columns the fix_database*.py / fix_status_column.py scripts used to add"""
+    columns = _columns(conn, "agent_properties")
+    # ALTER TABLE cannot use a non-constant default, so backfill instead
+    for column in ("created_at", "updated_at"):
+        if column not in columns:
+            conn.execute(f"ALTER TABLE agent_properties ADD COLUMN {column} DATETIME")
+            conn.execute(f"UPDATE agent_properties SET {column} = CURRENT_TIMESTAMP WHERE {column} IS NULL")
+    if "status" not in columns:
+        conn.execute("ALTER TABLE agent_properties ADD COLUMN status TEXT DEFAULT 'active'")
+        conn.execute("UPDATE agent_properties SET status = 'active' WHERE status IS NULL")
+    if "acuity_id" not in columns:
+        conn.execute("ALTER TABLE agent_properties ADD COLUMN acuity_id TEXT")
+
+
+def _hot_query_indexes(conn):
+    """Composite indexes for every query shape in main.py"""
+    # Property list (agent_id = ? ORDER BY created_at DESC) and COUNT(*) by agent
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_properties_agent_created ON agent_properties (agent_id, created_at)")
+    # Active property counts
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_properties_agent_active ON agent_properties (agent_id, is_active)")
+    # Acuity webhook routing
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_properties_acuity ON agent_properties (acuity_id)")
+    # Inquiry list and counts
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_inquiries_agent_created ON agent_inquiries (agent_id, created_at)")
+    # Per-property tracking counts in update_automation_stats
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracking_property_tour ON email_automation_tracking (property_id, tour_scheduled)")
+    # Stats lookups by agent
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_automation_stats_agent ON automation_stats (agent_id)")
+
+
+def _rate_limit_table(conn):
+    """Shared counters for LEADFLOW_RATE_LIMIT_BACKEND=sqlite"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rate_limits (
+            key TEXT PRIMARY KEY,
+            window_start REAL NOT NULL,
+            current_count INTEGER NOT NULL,
+            previous_count INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rate_limits_expires ON rate_limits (expires_at)")
+
+
+def _incremental_automation_stats(conn):
+    """One stats row per agent, kept current by triggers on the tracking table"""
+    # Collapse duplicate rows left by the old SELECT-then-INSERT upsert
+    conn.execute("""
+        DELETE FROM automation_stats
+        WHERE agent_id IS NULL
+           OR id NOT IN (SELECT MAX(id) FROM automation_stats GROUP BY agent_id)
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_automation_stats_agent")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_automation_stats_agent_unique ON automation_stats (agent_id)")
+
+    # Start the counters from an exact recount; triggers keep them current after this
+    conn.execute("""
+        INSERT INTO automation_stats (agent_id, emails_sent, tours_scheduled, response_rate, last_updated)
+        SELECT p.agent_id, COUNT(*), SUM(t.tour_scheduled = TRUE), SUM(t.tour_scheduled = TRUE) * 100.0 / COUNT(*), CURRENT_TIMESTAMP
+        FROM agent_properties p
+        JOIN email_automation_tracking t ON t.property_id = p.id
+        WHERE true
+        GROUP BY p.agent_id
+        ON CONFLICT(agent_id) DO UPDATE SET
+            emails_sent = excluded.emails_sent,
+            tours_scheduled = excluded.tours_scheduled,
+            response_rate = excluded.response_rate,
+            last_updated = CURRENT_TIMESTAMP
+    """)
+
+    # Each tracking row counts as one email sent, and as a tour when flagged
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tracking_stats_insert
+        AFTER INSERT ON email_automation_tracking
+        WHEN NEW.property_id IS NOT NULL
+        BEGIN
+            INSERT INTO automation_stats (agent_id, emails_sent, tours_scheduled, response_rate, last_updated)
+            SELECT agent_id, 1, (NEW.tour_scheduled = TRUE), (NEW.tour_scheduled = TRUE) * 100.0, CURRENT_TIMESTAMP
+            FROM agent_properties WHERE id = NEW.property_id
+            ON CONFLICT(agent_id) DO UPDATE SET
+                emails_sent = emails_sent + 1,
+                tours_scheduled = tours_scheduled + excluded.tours_scheduled,
+                response_rate = (tours_scheduled + excluded.tours_scheduled) * 100.0 / (emails_sent + 1),
+                last_updated = CURRENT_TIMESTAMP;
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tracking_stats_delete
+        AFTER DELETE ON email_automation_tracking
+        WHEN OLD.property_id IS NOT NULL
+        BEGIN
+            UPDATE automation_stats SET
+                emails_sent = MAX(emails_sent - 1, 0),
+                tours_scheduled = MAX(tours_scheduled - (OLD.tour_scheduled = TRUE), 0),
+                response_rate = CASE WHEN emails_sent > 1
+                    THEN MAX(tours_scheduled - (OLD.tour_scheduled = TRUE), 0) * 100.0 / (emails_sent - 1)
+                    ELSE 0.0 END,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE agent_id = (SELECT agent_id FROM agent_properties WHERE id = OLD.property_id);
+        END
+    """)
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_tracking_stats_tour_update
+        AFTER UPDATE OF tour_scheduled ON email_automation_tracking
+        WHEN NEW.property_id IS NOT NULL AND (NEW.tour_scheduled = TRUE) != (OLD.tour_scheduled = TRUE)
+        BEGIN
+            UPDATE automation_stats SET
+                tours_scheduled = MAX(tours_scheduled + (NEW.tour_scheduled = TRUE) - (OLD.tour_scheduled = TRUE), 0),
+                response_rate = CASE WHEN emails_sent > 0
+                    THEN MAX(tours_scheduled + (NEW.tour_scheduled = TRUE) - (OLD.tour_scheduled = TRUE), 0) * 100.0 / emails_sent
+                    ELSE 0.0 END,
+                last_updated = CURRENT_TIMESTAMP
+            WHERE agent_id = (SELECT agent_id FROM agent_properties WHERE id = NEW.property_id);
+        END
+    """)
+    # Tracking rows of a deleted property stop counting, as with the old recount
+    conn.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_property_stats_delete
+        AFTER DELETE ON agent_properties
+        BEGIN
+            UPDATE automation_stats SET
+                emails_sent = MAX(emails_sent - (SELECT COUNT(*) FROM email_automation_tracking WHERE property_id = OLD.id), 0),
+                tours_scheduled = MAX(tours_scheduled - (SELECT COUNT(*) FROM email_automation_tracking WHERE property_id = OLD.id AND tour_scheduled = TRUE), 0),
+                last_updated = CURRENT_TIMESTAMP
+            WHERE agent_id = OLD.agent_id;
+            UPDATE automation_stats SET
+                response_rate = CASE WHEN emails_sent > 0 THEN tours_scheduled * 100.0 / emails_sent ELSE 0.0 END
+            WHERE agent_id = OLD.agent_id;
+        END
+    """)
+
+
+def _inquiry_status_index(conn):
+    """Covering index for the inquiry total / answered counts in compute_agent_stats"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_inquiries_agent_status ON agent_inquiries (agent_id, status)")
+
+
+def _webhook_inbox(conn):
+    """Durable inbox for webhook deliveries, drained by app.webhooks"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS webhook_inbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            source TEXT NOT NULL,
+            external_id TEXT,
+            event_type TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            received_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            processed_at DATETIME
+        )
+    """)
+    # Idempotency: one row per (source, appointment id, event type)
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_inbox_event
+        ON webhook_inbox (source, external_id, event_type) WHERE external_id IS NOT NULL
+    """)
+    # Worker batches, depth/lag and pruning
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_webhook_inbox_status ON webhook_inbox (status, id)")
+    # Tracking rows for an appointment (dedupe, cancel, reschedule)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracking_appointment ON email_automation_tracking (acuity_appointment_id)")
+
+
+def _data_versions(conn):
+    """Change counters that in-memory indexes compare against to detect staleness"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_versions (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_versions (name, version) VALUES ('agent_properties', 0)")
+    bump = "UPDATE data_versions SET version = version + 1 WHERE name = 'agent_properties';"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_properties_version_insert
+        AFTER INSERT ON agent_properties
+        BEGIN {bump} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_properties_version_update
+        AFTER UPDATE OF agent_id, address, unit, is_active, acuity_id ON agent_properties
+        BEGIN {bump} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_properties_version_delete
+        AFTER DELETE ON agent_properties
+        BEGIN {bump} END
+    """)
+
+
+def _activity_indexes(conn):
+    """Per-property timeline reads (GET /api/properties/{id}/activity)"""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_inquiries_property_created ON agent_inquiries (property_id, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_tracking_property_created ON email_automation_tracking (property_id, created_at)")
+
+
+def _search_index(conn):
+    """FTS5 indexes over inquiries and properties, kept in sync by triggers"""
+    fts_tables = (
+        ("inquiries_fts", "agent_inquiries", ("agent_id", "prospect_name", "prospect_email", "prospect_phone", "message")),
+        ("properties_fts", "agent_properties", ("agent_id", "address", "unit", "description", "amenities")),
+    )
+    for table, content, columns in fts_tables:
+        column_list = ", ".join(columns)
+        new_values = ", ".join(f"new.{column}" for column in columns)
+        old_values = ", ".join(f"old.{column}" for column in columns)
+        conn.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+                {column_list},
+                content='{content}', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3 4 5 6'
+            )
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_insert AFTER INSERT ON {content}
+            BEGIN
+                INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_delete AFTER DELETE ON {content}
+            BEGIN
+                INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+            END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_update AFTER UPDATE OF {column_list} ON {content}
+            BEGIN
+                INSERT INTO {table}({table}, rowid, {column_list}) VALUES ('delete', old.id, {old_values});
+                INSERT INTO {table}(rowid, {column_list}) VALUES (new.id, {new_values});
+            END
+        """)
+        # Index whatever is already in the table
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+
+
+def _agent_data_versions(conn):
+    """Per-agent change counter behind the ETags of the dashboard read endpoints"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_data_versions (
+            agent_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    bump = """
+        INSERT INTO agent_data_versions (agent_id, version)
+        SELECT {agent}.agent_id, 1 WHERE {agent}.agent_id IS NOT NULL
+        ON CONFLICT(agent_id) DO UPDATE SET version = version + 1;
+    """
+    for table in ("agent_properties", "agent_inquiries"):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_agent_version_insert
+            AFTER INSERT ON {table}
+            BEGIN {bump.format(agent="NEW")} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_agent_version_delete
+            AFTER DELETE ON {table}
+            BEGIN {bump.format(agent="OLD")} END
+        """)
+        # A row moved between agents changes both agents' lists
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_agent_version_update
+            AFTER UPDATE ON {table}
+            BEGIN
+                {bump.format(agent="NEW")}
+                UPDATE agent_data_versions SET version = version + 1
+                WHERE agent_id = OLD.agent_id AND OLD.agent_id IS NOT NEW.agent_id;
+            END
+        """)
+
+
+def _mailbox_scanning(conn):
+    """Per-agent lead mailbox, its scan checkpoint, and the messages already ingested"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS agent_mailboxes (
+            agent_id INTEGER PRIMARY KEY,
+            kind TEXT NOT NULL,
+            location TEXT NOT NULL,
+            username TEXT,
+            password TEXT,
+            folder TEXT DEFAULT 'INBOX',
+            checkpoint TEXT,
+            last_scan_at DATETIME,
+            last_scan_created INTEGER DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    """)
+    # Message-ID (or content hash) of every scanned message, so a reset or
+    # overlapping checkpoint never creates the same inquiry twice
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS mailbox_messages (
+            agent_id INTEGER NOT NULL,
+            message_key TEXT NOT NULL,
+            inquiry_id INTEGER,
+            PRIMARY KEY (agent_id, message_key)
+        ) WITHOUT ROWID
+    """)
+
+
+def _outbound_mail_queue(conn):
+    """Replies waiting for app.dispatcher to deliver them over SMTP"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS outbound_emails (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER NOT NULL,
+            inquiry_id INTEGER,
+            property_id INTEGER,
+            recipient TEXT NOT NULL,
+            recipient_domain TEXT NOT NULL,
+            prospect_name TEXT,
+            sender_name TEXT,
+            reply_to TEXT,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            enqueued_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            claimed_at REAL,
+            sent_at REAL,
+            FOREIGN KEY (agent_id) REFERENCES agents (id),
+            FOREIGN KEY (inquiry_id) REFERENCES agent_inquiries (id)
+        )
+    """)
+    # Due rows (pending by next attempt, stale claims by claim time) and depth
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_emails_due ON outbound_emails (status, next_attempt_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_outbound_emails_claimed ON outbound_emails (status, claimed_at)")
+
+
+def _reply_templates(conn):
+    """Auto-reply templates: one per property, plus the agent's default (property_id NULL)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS reply_templates (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER NOT NULL,
+            property_id INTEGER,
+            subject TEXT NOT NULL,
+            body TEXT NOT NULL,
+            version INTEGER NOT NULL DEFAULT 1,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (agent_id) REFERENCES agents (id),
+            FOREIGN KEY (property_id) REFERENCES agent_properties (id)
+        )
+    """)
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_reply_templates_scope ON reply_templates (agent_id, COALESCE(property_id, 0))")
+
+
+def _prospect_dedup(conn):
+    """Prospects behind the inquiries, found by hashed email / phone fingerprints (app.prospects)"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS prospects (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            agent_id INTEGER NOT NULL,
+            name TEXT,
+            email TEXT,
+            phone TEXT,
+            primary_inquiry_id INTEGER,
+            primary_at REAL NOT NULL,
+            FOREIGN KEY (agent_id) REFERENCES agents (id)
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS prospect_keys (
+            agent_id INTEGER NOT NULL,
+            key_hash INTEGER NOT NULL,
+            prospect_id INTEGER NOT NULL,
+            PRIMARY KEY (agent_id, key_hash)
+        ) WITHOUT ROWID
+    """)
+    columns = _columns(conn, "agent_inquiries")
+    if "prospect_id" not in columns:
+        conn.execute("ALTER TABLE agent_inquiries ADD COLUMN prospect_id INTEGER REFERENCES prospects (id)")
+    if "duplicate_of" not in columns:
+        conn.execute("ALTER TABLE agent_inquiries ADD COLUMN duplicate_of INTEGER")
+    # A prospect's inquiries, and how many there are
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_agent_inquiries_prospect ON agent_inquiries (prospect_id)")
+
+
+def _webhook_event_keys(conn):
+    """Keep every real reschedule of an appointment, and back off retried deliveries"""
+    columns = _columns(conn, "webhook_inbox")
+    if "event_key" not in columns:
+        # Appointment time (or payload digest) of a reschedule/change
+        conn.execute("ALTER TABLE webhook_inbox ADD COLUMN event_key TEXT")
+    if "next_attempt_at" not in columns:
+        conn.execute("ALTER TABLE webhook_inbox ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+    # An appointment is booked and canceled once, but can move many times:
+    # reschedules are deduplicated against the appointment's latest one in
+    # app.webhooks.enqueue_webhook instead
+    conn.execute("DROP INDEX IF EXISTS idx_webhook_inbox_event")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_webhook_inbox_event
+        ON webhook_inbox (source, external_id, event_type)
+        WHERE external_id IS NOT NULL AND event_type NOT IN ('rescheduled', 'changed')
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_webhook_inbox_appointment
+        ON webhook_inbox (source, external_id, id) WHERE external_id IS NOT NULL
+    """)
+
+
+MIGRATIONS = [
+    (1, "baseline schema", _baseline_schema),
+    (2, "legacy column patches", _legacy_columns),
+    (3, "hot query indexes", _hot_query_indexes),
+    (4, "shared rate limit table", _rate_limit_table),
+    (5, "incremental automation stats", _incremental_automation_stats),
+    (6, "inquiry status index", _inquiry_status_index),
+    (7, "webhook inbox", _webhook_inbox),
+    (8, "property data version", _data_versions),
+    (9, "property activity indexes", _activity_indexes),
+    (10, "full-text search", _search_index),
+    (11, "agent data versions", _agent_data_versions),
+    (12, "mailbox scanning", _mailbox_scanning),
+    (13, "outbound mail queue", _outbound_mail_queue),
+    (14, "reply templates", _reply_templates),
+    (15, "prospect de-duplication", _prospect_dedup),
+    (16, "webhook event keys and retry backoff", _webhook_event_keys),
+]
+
+
+def schema_version(conn) -> int:
+    """Highest applied migration, 0 for a database that has never been migrated"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    return conn.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations").fetchone()[0]
+
+
+def schema_fingerprint() -> int:
+    """Checksum of the migration list, as stored in PRAGMA user_version"""
+    listing = "|".join(f"{version}:{name}" for version, name, _ in MIGRATIONS)
+    return zlib.crc32(listing.encode("utf-8")) & 0x7fffffff
+
+
+def ensure_schema(conn) -> list:
+    """run_migrations, skipped entirely when the stored fingerprint matches
+
+    user_version lives in the database header, so an up-to-date database
+    costs one pragma read at boot: no DDL, no schema_migrations lookup.
+    """
+    fingerprint = schema_fingerprint()
+    if conn.execute("PRAGMA user_version").fetchone()[0] == fingerprint:
+        return []
+    applied = run_migrations(conn)
+    conn.execute(f"PRAGMA user_version = {fingerprint}")
+    return applied
+
+
+def run_migrations(conn) -> list:
+    """Apply every pending migration in order; returns the versions applied"""
+    current = schema_version(conn)
+    applied = []
+    for version, name, migrate in MIGRATIONS:
+        if version <= current:
+            continue
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another worker may have applied it while we waited for the lock
+            if conn.execute("SELECT 1 FROM schema_migrations WHERE version = ?", (version,)).fetchone():
+                conn.rollback()
+                continue
+            migrate(conn)
+            conn.execute("INSERT INTO schema_migrations (version, name) VALUES (?, ?)", (version, name))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            logger.error(f"Migration {version} ({name}) failed")
+            raise
+        logger.info(f"Applied migration {version}: {name}")
+        applied.append(version)
+    return applied
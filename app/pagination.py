@@ -0,0 +1,66 @@
+# Keyset pagination helpers for LeadFlow Pro list endpoints
+import os
+import json
+import base64
+from typing import Optional, Tuple
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# While on, list endpoints called without limit/cursor keep returning every
+# row in the original response shape, which the shipped pages rely on.
+LEGACY_LIST_RESPONSES = os.environ.get("LEADFLOW_LEGACY_LIST_RESPONSES", "true").lower() in ("1", "true", "yes")
+
+
+class InvalidCursor(ValueError):
+    """Raised for cursors that were not produced by encode_cursor"""
+
+
+def encode_cursor(created_at: str, row_id: int) -> str:
+    """Opaque cursor pointing just past the row with this (created_at, id)"""
+    raw = json.dumps([created_at, row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[str, int]:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        if not isinstance(row_id, int) or not isinstance(created_at, (str, type(None))):
+            raise ValueError
+        return created_at, row_id
+    except Exception:
+        raise InvalidCursor("Invalid pagination cursor")
+
+
+def use_pagination(limit: Optional[int], cursor: Optional[str]) -> bool:
+    """Whether a list request should get the paginated response shape"""
+    return not LEGACY_LIST_RESPONSES or limit is not None or cursor is not None
+
+
+def page_size(limit: Optional[int]) -> int:
+    if limit is None:
+        return DEFAULT_PAGE_SIZE
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def keyset_filter(cursor: Optional[str], alias: str = "") -> Tuple[str, tuple]:
+    """SQL predicate and params selecting rows after the cursor
+
+    Rows are ordered by (created_at DESC, id DESC). The (agent_id,
+    created_at) indexes end in the rowid, so this predicate and ordering
+    are a range seek on the index no matter how deep the page is.
+    """
+    if cursor is None:
+        return "", ()
+    created_at, row_id = decode_cursor(cursor)
+    prefix = f"{alias}." if alias else ""
+    return f" AND ({prefix}created_at, {prefix}id) < (?, ?)", (created_at, row_id)
+
+
+def next_cursor(rows: list, size: int) -> Optional[str]:
+    """Cursor for the page after rows, given that size + 1 rows were requested"""
+    if len(rows) <= size:
+        return None
+    last = rows[size - 1]
+    return encode_cursor(last["created_at"], last["id"])
@@ -0,0 +1,87 @@
+# Password hashing for LeadFlow Pro
+import os
+import hmac
+import asyncio
+import hashlib
+import secrets
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# KDF configuration. Raising or lowering the cost only affects new hashes;
+# existing ones are upgraded the next time their owner logs in.
+HASH_ALGORITHM = "pbkdf2_sha256"
+HASH_ITERATIONS = int(os.environ.get("LEADFLOW_PBKDF2_ITERATIONS", "100000"))
+HASH_WORKERS = int(os.environ.get("LEADFLOW_HASH_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+# Hashes written before the cost was configurable are "salt:hash" at this cost
+LEGACY_ITERATIONS = 100000
+
+_executor = None
+
+
+def _pbkdf2(password: str, salt: str, iterations: int) -> str:
+    return hashlib.pbkdf2_hmac('sha256', password.encode('utf-8'), salt.encode('utf-8'), iterations).hex()
+
+
+def _parse(password_hash: str):
+    """Split a stored hash into (iterations, salt, hash)"""
+    if password_hash.startswith(HASH_ALGORITHM + "$"):
+        _, iterations, salt, pwd_hash = password_hash.split('$')
+        return int(iterations), salt, pwd_hash
+    salt, pwd_hash = password_hash.split(':')
+    return LEGACY_ITERATIONS, salt, pwd_hash
+
+
+def hash_password(password: str, iterations: int = None) -> str:
+    """Hash a password with salt at the configured cost"""
+    iterations = iterations or HASH_ITERATIONS
+    salt = secrets.token_hex(16)
+    return f"{HASH_ALGORITHM}${iterations}${salt}${_pbkdf2(password, salt, iterations)}"
+
+
+def verify_password(password: str, password_hash: str) -> bool:
+    """Verify a password against its hash"""
+    try:
+        iterations, salt, pwd_hash = _parse(password_hash)
+        return hmac.compare_digest(pwd_hash, _pbkdf2(password, salt, iterations))
+    except Exception:
+        return False
+
+
+def needs_rehash(password_hash: str) -> bool:
+    """Whether a stored hash was made with a different cost or format"""
+    try:
+        iterations, _, _ = _parse(password_hash)
+    except Exception:
+        return False
+    return not password_hash.startswith(HASH_ALGORITHM + "$") or iterations != HASH_ITERATIONS
+
+
+def get_hash_executor() -> ThreadPoolExecutor:
+    """Worker pool for PBKDF2; hashlib releases the GIL while hashing"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="leadflow-hash")
+        logger.info(f"Password hashing pool started ({HASH_WORKERS} workers, {HASH_ITERATIONS} iterations)")
+    return _executor
+
+
+def shutdown_hash_executor():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def hash_password_async(password: str) -> str:
+    """hash_password on the hashing pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    """verify_password on the hashing pool"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_hash_executor(), verify_password, password, password_hash)
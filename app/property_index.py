@@ -0,0 +1,154 @@
+# In-memory acuity_id -> property routing index for LeadFlow Pro
+import logging
+import threading
+from collections import namedtuple
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PropertyRoute = namedtuple("PropertyRoute", "property_id agent_id address unit is_active")
+
+# Bumped by triggers (migration 8) on every routing-relevant property change
+INDEX_VERSION_KEY = "agent_properties"
+
+
+def _normalize(acuity_id) -> Optional[str]:
+    if acuity_id is None:
+        return None
+    acuity_id = str(acuity_id).strip()
+    return acuity_id or None
+
+
+class AcuityIndex:
+    """Appointment type ID -> properties, for webhook routing without a query
+
+    The property write paths call refresh_property() after committing. Any
+    other writer (scripts, another worker process) still bumps the
+    data_versions row through the triggers, and ensure_current() reloads
+    when the stored version is not the one this index was built from.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        self._acuity_by_property = {}
+        self._lock = threading.Lock()
+        self.version = None
+        self.loads = 0
+        self.lookups = 0
+        self.stale_reloads = 0
+
+    @staticmethod
+    def _stored_version(conn) -> int:
+        row = conn.execute("SELECT version FROM data_versions WHERE name = ?", (INDEX_VERSION_KEY,)).fetchone()
+        return row[0] if row else 0
+
+    def load(self, conn=None):
+        """Rebuild the whole index from agent_properties"""
+        # Version and rows must come from one read snapshot
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute("BEGIN")
+        try:
+            version = self._stored_version(conn)
+            rows = conn.execute("""
+                SELECT id, agent_id, address, unit, is_active, acuity_id
+                FROM agent_properties
+                WHERE acuity_id IS NOT NULL AND acuity_id != ''
+                ORDER BY id
+            """).fetchall()
+        finally:
+            if own_transaction:
+                conn.rollback()
+
+        routes = {}
+        acuity_by_property = {}
+        for row in rows:
+            acuity_id = _normalize(row['acuity_id'])
+            if acuity_id is None:
+                continue
+            route = PropertyRoute(row['id'], row['agent_id'], row['address'], row['unit'], bool(row['is_active']))
+            routes[acuity_id] = routes.get(acuity_id, ()) + (route,)
+            acuity_by_property[row['id']] = acuity_id
+
+        with self._lock:
+            self._routes = routes
+            self._acuity_by_property = acuity_by_property
+            self.version = version
+            self.loads += 1
+        logger.info(f"Acuity index loaded: {len(acuity_by_property)} properties, {len(routes)} appointment types")
+
+    def ensure_current(self, conn=None) -> bool:
+        """Reload if the properties changed behind our back; True if it reloaded"""
+        if self.version == self._stored_version(conn):
+            return False
+        if self.version is not None:
+            self.stale_reloads += 1
+        self.load(conn)
+        return True
+
+    def _remove(self, property_id: int):
+        acuity_id = self._acuity_by_property.pop(property_id, None)
+        if acuity_id is None:
+            return
+        remaining = tuple(route for route in self._routes.get(acuity_id, ()) if route.property_id != property_id)
+        if remaining:
+            self._routes[acuity_id] = remaining
+        else:
+            self._routes.pop(acuity_id, None)
+
+    def refresh_property(self, property_id: int, conn=None):
+        """Re-read one property after this process wrote it (created, updated or deleted)"""
+        row = conn.execute(
+            "SELECT id, agent_id, address, unit, is_active, acuity_id FROM agent_properties WHERE id = ?",
+            (property_id,)
+        ).fetchone()
+        version = self._stored_version(conn)
+        with self._lock:
+            expected = self.version is not None and version == self.version + 1
+            if expected:
+                self._remove(property_id)
+                acuity_id = _normalize(row['acuity_id']) if row else None
+                if acuity_id is not None:
+                    route = PropertyRoute(row['id'], row['agent_id'], row['address'], row['unit'], bool(row['is_active']))
+                    self._routes[acuity_id] = tuple(sorted(
+                        self._routes.get(acuity_id, ()) + (route,), key=lambda r: r.property_id
+                    ))
+                    self._acuity_by_property[property_id] = acuity_id
+                self.version = version
+        if not expected and version != self.version:
+            # Other writes landed in between (or this write bumped nothing); start over
+            self.load(conn)
+
+    def lookup(self, acuity_id) -> Tuple[PropertyRoute, ...]:
+        """Every property using this appointment type"""
+        with self._lock:
+            self.lookups += 1
+            return self._routes.get(_normalize(acuity_id), ())
+
+    def route(self, acuity_id) -> Optional[PropertyRoute]:
+        """The property a booking belongs to
+
+        When several properties share an appointment type, active ones win
+        and the most recently created of those is used.
+        """
+        routes = self.lookup(acuity_id)
+        if not routes:
+            return None
+        if len(routes) > 1:
+            logger.warning(f"Acuity ID {acuity_id} is shared by properties {[r.property_id for r in routes]}")
+        return max(routes, key=lambda r: (r.is_active, r.property_id))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "version": self.version,
+                "properties": len(self._acuity_by_property),
+                "appointment_types": len(self._routes),
+                "shared_appointment_types": sum(1 for routes in self._routes.values() if len(routes) > 1),
+                "lookups": self.lookups,
+                "loads": self.loads,
+                "stale_reloads": self.stale_reloads,
+            }
+
+
+property_index = AcuityIndex()
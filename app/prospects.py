@@ -0,0 +1,226 @@
+# Prospect de-duplication for LeadFlow Pro
+#
+# The same prospect reaches an agent through several portals and listings.
+# Each inquiry's email and phone are normalized (email_key, phone_key),
+# hashed to 64-bit fingerprints and looked up in prospect_keys, a WITHOUT
+# ROWID table keyed by (agent_id, fingerprint), so matching costs one
+# primary-key probe per fingerprint however long the history gets.
+#
+# An inquiry from a known prospect within PROSPECT_DEDUP_WINDOW_DAYS of
+# that prospect's primary inquiry is still stored (its message and listing
+# are worth keeping) but with status 'duplicate' and duplicate_of set to
+# the primary: it does not count towards total_inquiries and gets no
+# auto-reply. The first inquiry after the window becomes the new primary.
+# The window only runs forwards: an inquiry never links to a later primary.
+import os
+import re
+import time
+import hashlib
+from typing import Dict, Iterator, List, NamedTuple, Optional
+
+PROSPECT_DEDUP_WINDOW_DAYS = float(os.environ.get("LEADFLOW_PROSPECT_DEDUP_WINDOW_DAYS", "30"))
+PROSPECT_BACKFILL_BATCH_SIZE = int(os.environ.get("LEADFLOW_PROSPECT_BACKFILL_BATCH_SIZE", "1000"))
+
+DUPLICATE_INQUIRY_STATUS = "duplicate"
+
+# Providers that ignore dots in the local part, and their canonical domain
+_DOTLESS_DOMAINS = {"gmail.com": "gmail.com", "googlemail.com": "gmail.com"}
+_NON_DIGIT = re.compile(r"\D")
+_EXTENSION = re.compile(r"\s*(?:x|ext\.?|extension)\s*\d+\s*$", re.IGNORECASE)
+
+
+def email_key(email: Optional[str]) -> Optional[str]:
+    """'Jane.Doe+zillow@GoogleMail.com' -> 'janedoe@gmail.com'"""
+    if not email:
+        return None
+    local, at, domain = email.strip().lower().rpartition("@")
+    local = local.split("+", 1)[0]
+    if domain in _DOTLESS_DOMAINS:
+        domain = _DOTLESS_DOMAINS[domain]
+        local = local.replace(".", "")
+    if not at or not local or not domain:
+        return None
+    return f"{local}@{domain}"
+
+
+def phone_key(phone: Optional[str]) -> Optional[str]:
+    """E.164, US by default: '(212) 555-0147' -> '+12125550147'; None if incomplete"""
+    if not phone:
+        return None
+    phone = _EXTENSION.sub("", phone.strip())
+    digits = _NON_DIGIT.sub("", phone)
+    if phone.startswith("+"):
+        return f"+{digits}" if 8 <= len(digits) <= 15 else None
+    if len(digits) == 10:
+        return f"+1{digits}"
+    if len(digits) == 11 and digits[0] == "1":
+        return f"+{digits}"
+    return None
+
+
+def fingerprint(key: str) -> int:
+    """Signed 64-bit hash of a normalized key, as stored in prospect_keys"""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big", signed=True)
+
+
+def prospect_fingerprints(email: Optional[str], phone: Optional[str]) -> List[int]:
+    keys = []
+    email = email_key(email)
+    if email:
+        keys.append(fingerprint(f"email:{email}"))
+    phone = phone_key(phone)
+    if phone:
+        keys.append(fingerprint(f"phone:{phone}"))
+    return keys
+
+
+class ProspectMatch(NamedTuple):
+    prospect_id: int
+    primary_inquiry_id: Optional[int]
+    primary_at: float
+
+    def duplicate_of(self, seen_at: float) -> Optional[int]:
+        """The primary inquiry, if one seen at seen_at falls within the window after it"""
+        if self.primary_inquiry_id is None or not 0 <= seen_at - self.primary_at <= PROSPECT_DEDUP_WINDOW_DAYS * 86400:
+            return None
+        return self.primary_inquiry_id
+
+
+def match_prospect(agent_id: int, name: Optional[str], email: Optional[str], phone: Optional[str],
+                   seen_at: float, conn=None) -> Optional[ProspectMatch]:
+    """Find or create the prospect behind an inquiry, inside the caller's transaction
+
+    Returns None when the inquiry has no usable email or phone. Unless
+    duplicate_of() names a primary, the caller stores the inquiry and
+    passes its id to set_primary. When the email and phone belong to different
+    prospects, the inquiry goes to the older one; the prospects are not merged
+    and each keeps its own fingerprints.
+    """
+    keys = prospect_fingerprints(email, phone)
+    if not keys:
+        return None
+    rows = conn.execute(f"""
+        SELECT k.key_hash, p.id, p.primary_inquiry_id, p.primary_at
+        FROM prospect_keys k JOIN prospects p ON p.id = k.prospect_id
+        WHERE k.agent_id = ? AND k.key_hash IN ({", ".join("?" * len(keys))})
+    """, (agent_id, *keys)).fetchall()
+
+    if not rows:
+        prospect_id = conn.execute("""
+            INSERT INTO prospects (agent_id, name, email, phone, primary_at) VALUES (?, ?, ?, ?, ?)
+        """, (agent_id, name, email, phone, seen_at)).lastrowid
+        conn.executemany(
+            "INSERT OR IGNORE INTO prospect_keys (agent_id, key_hash, prospect_id) VALUES (?, ?, ?)",
+            [(agent_id, key, prospect_id) for key in keys]
+        )
+        return ProspectMatch(prospect_id, None, seen_at)
+
+    _, prospect_id, primary_inquiry_id, primary_at = min(rows, key=lambda row: row[1])
+    # A repeat only writes here when it brings a new email or phone
+    known = {row[0] for row in rows}
+    if len(known) < len(keys):
+        conn.executemany(
+            "INSERT OR IGNORE INTO prospect_keys (agent_id, key_hash, prospect_id) VALUES (?, ?, ?)",
+            [(agent_id, key, prospect_id) for key in keys if key not in known]
+        )
+        conn.execute(
+            "UPDATE prospects SET email = COALESCE(email, ?), phone = COALESCE(phone, ?) WHERE id = ?",
+            (email, phone, prospect_id)
+        )
+    return ProspectMatch(prospect_id, primary_inquiry_id, primary_at)
+
+
+def set_primary(prospect_id: int, inquiry_id: int, seen_at: float, conn=None):
+    """Make the inquiry its prospect's primary, unless a later one already is"""
+    conn.execute("""
+        UPDATE prospects SET primary_inquiry_id = ?, primary_at = ?
+        WHERE id = ? AND (primary_inquiry_id IS NULL OR primary_at <= ?)
+    """, (inquiry_id, seen_at, prospect_id, seen_at))
+
+
+def promote_primary(prospect_id: int, inquiry_id: int, seen_at: float, later_primary_id: int, conn=None):
+    """Make an earlier inquiry the primary of a later primary's window
+
+    The later primary and its duplicates become duplicates of the earlier
+    inquiry; answered ones keep their status.
+    """
+    conn.execute(
+        "UPDATE agent_inquiries SET duplicate_of = ? WHERE prospect_id = ? AND duplicate_of = ?",
+        (inquiry_id, prospect_id, later_primary_id)
+    )
+    conn.execute("""
+        UPDATE agent_inquiries SET duplicate_of = ?,
+            status = CASE WHEN status = 'new' THEN ? ELSE status END
+        WHERE id = ?
+    """, (inquiry_id, DUPLICATE_INQUIRY_STATUS, later_primary_id))
+    conn.execute(
+        "UPDATE prospects SET primary_inquiry_id = ?, primary_at = ? WHERE id = ?",
+        (inquiry_id, seen_at, prospect_id)
+    )
+
+
+def backfill_prospects(agent_id: Optional[int] = None, batch_size: int = PROSPECT_BACKFILL_BATCH_SIZE,
+                       conn=None) -> Iterator[dict]:
+    """Link existing inquiries to prospects, oldest first, one transaction per batch
+
+    Yields running totals after each batch. Only inquiries without a
+    prospect are read, so an interrupted backfill resumes where it
+    stopped. Duplicates that were already answered keep their status and
+    only gain duplicate_of. An inquiry older than a primary linked on
+    ingest, and within the window before it, is promoted to primary.
+    """
+    where = "AND agent_id = ?" if agent_id is not None else ""
+    totals = {"scanned": 0, "primary": 0, "duplicates": 0, "skipped": 0}
+    # Each prospect's latest primary in the history replayed so far; the
+    # stored primary can be a newer inquiry that was linked on ingest
+    replayed: Dict[int, ProspectMatch] = {}
+    after = 0
+    while True:
+        rows = conn.execute(f"""
+            SELECT id, agent_id, prospect_name, prospect_email, prospect_phone,
+                   CAST(strftime('%s', created_at) AS REAL) AS seen_at
+            FROM agent_inquiries
+            WHERE id > ? AND prospect_id IS NULL {where}
+            ORDER BY id LIMIT ?
+        """, (after, *((agent_id,) if agent_id is not None else ()), batch_size)).fetchall()
+        if not rows:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for row in rows:
+                seen_at = row["seen_at"] if row["seen_at"] is not None else time.time()
+                match = match_prospect(
+                    row["agent_id"], row["prospect_name"], row["prospect_email"], row["prospect_phone"], seen_at, conn=conn
+                )
+                if match is None:
+                    totals["skipped"] += 1
+                    continue
+                # Link to the latest primary at or before this inquiry
+                earlier = [
+                    candidate for candidate in (replayed.get(match.prospect_id), match)
+                    if candidate is not None and candidate.primary_inquiry_id is not None and candidate.primary_at <= seen_at
+                ]
+                duplicate_of = max(earlier, key=lambda candidate: candidate.primary_at).duplicate_of(seen_at) if earlier else None
+                if duplicate_of is None:
+                    if match.primary_inquiry_id is not None and match.primary_at > seen_at:
+                        if match.primary_at - seen_at <= PROSPECT_DEDUP_WINDOW_DAYS * 86400:
+                            promote_primary(match.prospect_id, row["id"], seen_at, match.primary_inquiry_id, conn=conn)
+                    else:
+                        set_primary(match.prospect_id, row["id"], seen_at, conn=conn)
+                    replayed[match.prospect_id] = ProspectMatch(match.prospect_id, row["id"], seen_at)
+                    conn.execute("UPDATE agent_inquiries SET prospect_id = ? WHERE id = ?", (match.prospect_id, row["id"]))
+                    totals["primary"] += 1
+                else:
+                    conn.execute("""
+                        UPDATE agent_inquiries SET prospect_id = ?, duplicate_of = ?,
+                            status = CASE WHEN status = 'new' THEN ? ELSE status END
+                        WHERE id = ?
+                    """, (match.prospect_id, duplicate_of, DUPLICATE_INQUIRY_STATUS, row["id"]))
+                    totals["duplicates"] += 1
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        totals["scanned"] += len(rows)
+        after = rows[-1]["id"]
+        yield dict(totals)
@@ -0,0 +1,224 @@
+# Rate limiting for LeadFlow Pro
+import os
+import math
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+from app.db import get_executor
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_BACKEND = os.environ.get("LEADFLOW_RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.environ.get("LEADFLOW_RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class RateLimitPolicy:
+    """At most max_requests per window_seconds for one route"""
+
+    def __init__(self, name: str, max_requests: int, window_seconds: int):
+        self.name = name
+        self.max_requests = max_requests
+        self.window_seconds = window_seconds
+
+    @classmethod
+    def from_env(cls, name: str, max_requests: int, window_seconds: int) -> "RateLimitPolicy":
+        """Allow LEADFLOW_RATE_LIMIT_<NAME>="<requests>/<seconds>" to override a default"""
+        override = os.environ.get(f"LEADFLOW_RATE_LIMIT_{name.upper()}")
+        if override:
+            requests, seconds = override.split('/')
+            max_requests, window_seconds = int(requests), int(seconds)
+        return cls(name, max_requests, window_seconds)
+
+    def to_dict(self) -> dict:
+        return {"max_requests": self.max_requests, "window_seconds": self.window_seconds}
+
+
+def _sliding_window(window_start: float, current: int, previous: int, policy: RateLimitPolicy, now: float):
+    """Roll counters forward to now's window and estimate the request rate
+
+    Returns (window_start, current, previous, estimated) for the window
+    containing ``now``. The estimate weights the previous window's count
+    by how much of it still overlaps the sliding window.
+    """
+    window = policy.window_seconds
+    current_start = math.floor(now / window) * window
+    if window_start != current_start:
+        previous = current if window_start == current_start - window else 0
+        current = 0
+        window_start = current_start
+    overlap = (window - (now - current_start)) / window
+    return window_start, current, previous, previous * overlap + current
+
+
+class MemoryBackend:
+    """Per-process sliding-window counters with LRU and idle-key eviction"""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float, conn=None) -> bool:
+        with self._lock:
+            entry = self._entries.get(key)
+            window_start, current, previous = entry[:3] if entry else (0, 0, 0)
+            window_start, current, previous, estimated = _sliding_window(window_start, current, previous, policy, now)
+
+            allowed = estimated + 1 <= policy.max_requests
+            if allowed:
+                current += 1
+            # Counters are meaningless two windows after the last one started
+            self._entries[key] = (window_start, current, previous, window_start + 2 * policy.window_seconds)
+            self._entries.move_to_end(key)
+            self._evict(now)
+            return allowed
+
+    def _evict(self, now: float):
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_keys and entry[3] > now:
+                break
+            del self._entries[key]
+            self.evictions += 1
+
+    def clear(self, prefix: Optional[str] = None, key: Optional[str] = None, conn=None) -> int:
+        with self._lock:
+            if key is not None:
+                return 1 if self._entries.pop(key, None) is not None else 0
+            if prefix is None:
+                cleared = len(self._entries)
+                self._entries.clear()
+                return cleared
+            keys = [key for key in self._entries if key.startswith(prefix)]
+            for key in keys:
+                del self._entries[key]
+            return len(keys)
+
+    def stats(self, conn=None) -> dict:
+        with self._lock:
+            return {"backend": "memory", "keys": len(self._entries), "max_keys": self.max_keys, "evictions": self.evictions}
+
+
+class SQLiteBackend:
+    """Sliding-window counters in a shared table so limits hold across workers
+
+    The rate_limits table is created by migration 4 in app/migrations.py.
+    Every method runs on the caller's connection: a request checks its
+    limit on the connection it already leases, so the limiter never waits
+    on the pool while holding a connection of its own.
+    """
+
+    blocking = True
+    SWEEP_EVERY = 1000
+
+    def __init__(self):
+        self._hits = 0
+
+    def hit(self, key: str, policy: RateLimitPolicy, now: float, conn=None) -> bool:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT window_start, current_count, previous_count FROM rate_limits WHERE key = ?",
+                (key,)
+            ).fetchone()
+            window_start, current, previous = tuple(row) if row else (0, 0, 0)
+            window_start, current, previous, estimated = _sliding_window(window_start, current, previous, policy, now)
+
+            allowed = estimated + 1 <= policy.max_requests
+            if allowed:
+                current += 1
+            conn.execute("""
+                INSERT INTO rate_limits (key, window_start, current_count, previous_count, expires_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT(key) DO UPDATE SET
+                    window_start = excluded.window_start,
+                    current_count = excluded.current_count,
+                    previous_count = excluded.previous_count,
+                    expires_at = excluded.expires_at
+            """, (key, window_start, current, previous, window_start + 2 * policy.window_seconds))
+
+            self._hits += 1
+            if self._hits % self.SWEEP_EVERY == 0:
+                conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+            conn.commit()
+            return allowed
+        except Exception:
+            conn.rollback()
+            raise
+
+    def clear(self, prefix: Optional[str] = None, key: Optional[str] = None, conn=None) -> int:
+        if key is not None:
+            cursor = conn.execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+        elif prefix is None:
+            cursor = conn.execute("DELETE FROM rate_limits")
+        else:
+            cursor = conn.execute("DELETE FROM rate_limits WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+        conn.commit()
+        return cursor.rowcount
+
+    def stats(self, conn=None) -> dict:
+        keys = conn.execute("SELECT COUNT(*) FROM rate_limits").fetchone()[0]
+        return {"backend": "sqlite", "keys": keys}
+
+
+class RateLimiter:
+    """Applies named per-route policies against a counter backend"""
+
+    def __init__(self, backend=None, policies: Optional[Dict[str, RateLimitPolicy]] = None):
+        self.backend = backend or MemoryBackend()
+        self.policies = policies or {}
+        self.rejected = 0
+
+    def add_policy(self, policy: RateLimitPolicy):
+        self.policies[policy.name] = policy
+
+    async def check(self, policy_name: str, identifier: str, db=None) -> bool:
+        """Record a request; False when it exceeds the route's policy
+
+        Pass the request's AsyncConnection as db when it holds one; a
+        blocking backend then runs on it instead of leasing another.
+        """
+        policy = self.policies[policy_name]
+        key = f"{policy_name}:{identifier}"
+        now = time.time()
+        if self.backend.blocking:
+            if db is not None:
+                allowed = await db.run(self.backend.hit, key, policy, now)
+            else:
+                allowed = await get_executor().run_with_connection(self.backend.hit, key, policy, now)
+        else:
+            allowed = self.backend.hit(key, policy, now)
+        if not allowed:
+            self.rejected += 1
+        return allowed
+
+    def clear(self, policy_name: Optional[str] = None, identifier: Optional[str] = None, conn=None) -> int:
+        """Reset counters for one identifier, one policy, or everything"""
+        if policy_name is None:
+            return self.backend.clear(conn=conn)
+        if identifier is None:
+            return self.backend.clear(prefix=f"{policy_name}:", conn=conn)
+        return self.backend.clear(key=f"{policy_name}:{identifier}", conn=conn)
+
+    def stats(self, conn=None) -> dict:
+        stats = self.backend.stats(conn=conn)
+        stats["rejected"] = self.rejected
+        stats["policies"] = {name: policy.to_dict() for name, policy in self.policies.items()}
+        return stats
+
+
+def create_rate_limiter(backend_name: str = RATE_LIMIT_BACKEND) -> RateLimiter:
+    if backend_name == "sqlite":
+        backend = SQLiteBackend()
+    elif backend_name == "memory":
+        backend = MemoryBackend()
+    else:
+        raise ValueError(f"Unknown rate limit backend: {backend_name}")
+    logger.info(f"Rate limiter using {backend_name} backend")
+    return RateLimiter(backend)
@@ -0,0 +1,309 @@
+# Auto-reply templates for LeadFlow Pro
+#
+# A reply is rendered from the property's template, else the agent's
+# default template, else DEFAULT_TEMPLATE (the reply the automation page
+# used to preview). Templates are Jinja2 text run in the sandbox, since
+# agents write them. Each one is compiled once and kept in template_cache
+# under (template id, version); saving a template bumps its version, so
+# every process picks up the new text on its next render without being
+# told. Batch renders load every recipient's inquiry and property with
+# one query each and build each property's context once.
+import os
+import json
+import threading
+from collections import OrderedDict
+from datetime import date
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from app.lead_parser import DEFAULT_PROSPECT_NAME
+
+REPLY_TEMPLATE_CACHE_SIZE = int(os.environ.get("LEADFLOW_REPLY_TEMPLATE_CACHE_SIZE", "1000"))
+MAX_RENDER_BATCH = int(os.environ.get("LEADFLOW_MAX_RENDER_BATCH", "10000"))
+ACUITY_BOOKING_URL = "https://app.acuityscheduling.com/schedule.php?appointmentType={}"
+
+DEFAULT_TEMPLATE = {
+    "subject": "Re: Your inquiry about {{ property.label }}",
+    "body": """Thank you for your inquiry!
+
+Hi {{ prospect.first_name or "there" }},
+
+Hope all is well and thank you for your interest in {{ property.label }}!
+
+{% if property.booking_url %}
+If you would like to schedule a tour, please book a private showing here:
+{{ property.booking_url }}
+{% else %}
+If you would like to schedule a tour, just reply with a few times that work for you.
+{% endif %}
+
+Thank you, and looking forward to meeting you!
+
+Best,
+{{ agent.name }}
+{{ agent.company }}
+{{ agent.email }}
+{% if property.rent %}
+
+Application requirements for reference:
+* Applicants must have an annual income of 40x the monthly rent ({{ property.income_40x }})
+* If more than one person is applying, their incomes may be combined
+* Minimum credit score required is 650
+* Guarantors are accepted. A guarantor must have an annual income of 80x the monthly rent ({{ property.income_80x }}) and excellent credit
+* More than one guarantor may be used
+* $20 application fee per applicant
+{% if property.available_on %}
+* Owner is seeking a {{ property.available_on }} lease-start
+{% endif %}
+{% endif %}
+""",
+}
+
+
+class ReplyTemplateError(ValueError):
+    """A template that does not compile, or a render request that cannot be served"""
+
+
+def money(value) -> str:
+    return f"${value:,.0f}" if isinstance(value, (int, float)) else ""
+
+
+def _available_on(value: Optional[str]) -> Optional[str]:
+    """'2026-12-01' -> 'December 1'"""
+    if not value:
+        return None
+    try:
+        day = date.fromisoformat(value)
+    except ValueError:
+        return value
+    return f"{day:%B} {day.day}"
+
+
+# Template variables are namespaces rather than dicts: the sandbox tries
+# attribute access first, and a dict turns every {{ property.address }} into
+# a caught AttributeError. property["address"] still works.
+def property_context(row) -> SimpleNamespace:
+    if row is None:
+        return SimpleNamespace(label="our listing")
+    rent = row["rent"] if isinstance(row["rent"], (int, float)) else None
+    return SimpleNamespace(
+        id=row["id"],
+        address=row["address"],
+        unit=row["unit"],
+        label=f"{row['address']} {row['unit']}" if row["unit"] else row["address"],
+        rent=money(rent) if rent else None,
+        bedrooms=row["bedrooms"],
+        bathrooms=row["bathrooms"],
+        availability_date=row["availability_date"],
+        available_on=_available_on(row["availability_date"]),
+        booking_url=ACUITY_BOOKING_URL.format(row["acuity_id"]) if row["acuity_id"] else None,
+        income_40x=money(rent * 40) if rent else None,
+        income_80x=money(rent * 80) if rent else None,
+    )
+
+
+def prospect_context(name: Optional[str], email: Optional[str]) -> SimpleNamespace:
+    name = (name or "").strip()
+    if name == DEFAULT_PROSPECT_NAME:
+        name = ""
+    return SimpleNamespace(name=name or None, first_name=name.split()[0] if name else None, email=email)
+
+
+class CompiledReply:
+    """A template's subject and body, compiled, with their globals flattened once"""
+
+    def __init__(self, subject, body):
+        self.subject = subject
+        self.body = body
+        self._globals = dict(body.globals)
+
+    def render(self, context: dict) -> Tuple[str, str]:
+        # Template.render() rebuilds a context from the layered globals on
+        # every call, which costs more than running these short templates
+        variables = {**self._globals, **context}
+        subject = "".join(self.subject.root_render_func(self.subject.new_context(variables, shared=True)))
+        body = "".join(self.body.root_render_func(self.body.new_context(variables, shared=True)))
+        return " ".join(subject.split()), body.strip() + "\n"
+
+
+class TemplateCache:
+    """CompiledReply per template, LRU keyed by (template id, version)"""
+
+    def __init__(self, max_size: int = REPLY_TEMPLATE_CACHE_SIZE):
+        self.max_size = max_size
+        self._env = None
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def env(self):
+        # Imported on first use, like the page assets, to keep it off the cold start
+        if self._env is None:
+            from jinja2.sandbox import SandboxedEnvironment
+
+            class ReplyEnvironment(SandboxedEnvironment):
+                def is_safe_attribute(self, obj, attr, value):
+                    # The template variables hold plain values; skip the
+                    # general-purpose inspection for them
+                    if type(obj) is SimpleNamespace:
+                        return not attr.startswith("_")
+                    return super().is_safe_attribute(obj, attr, value)
+
+            env = ReplyEnvironment(autoescape=False, trim_blocks=True, lstrip_blocks=True)
+            env.filters["money"] = money
+            self._env = env
+        return self._env
+
+    def compile(self, subject: str, body: str) -> CompiledReply:
+        """Raises ReplyTemplateError with the line for syntax errors"""
+        from jinja2 import TemplateSyntaxError
+        try:
+            return CompiledReply(self.env.from_string(subject), self.env.from_string(body))
+        except TemplateSyntaxError as e:
+            raise ReplyTemplateError(f"Template error on line {e.lineno}: {e.message}")
+
+    def get(self, key: Tuple, subject: str, body: str) -> CompiledReply:
+        with self._lock:
+            compiled = self._entries.get(key)
+            if compiled is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return compiled
+            self.misses += 1
+        compiled = self.compile(subject, body)
+        with self._lock:
+            self._entries[key] = compiled
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return compiled
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"size": len(self._entries), "max_size": self.max_size, "hits": self.hits, "misses": self.misses}
+
+
+template_cache = TemplateCache()
+
+
+def list_templates(agent_id: int, conn=None) -> List[dict]:
+    rows = conn.execute("""
+        SELECT id, property_id, subject, body, version, updated_at FROM reply_templates
+        WHERE agent_id = ? ORDER BY property_id IS NOT NULL, property_id
+    """, (agent_id,)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def save_template(agent_id: int, property_id: Optional[int], subject: str, body: str, conn=None) -> dict:
+    """Create or replace the template for a property (or the agent default)"""
+    template_cache.compile(subject, body)
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if property_id is not None and not conn.execute(
+            "SELECT 1 FROM agent_properties WHERE id = ? AND agent_id = ?", (property_id, agent_id)
+        ).fetchone():
+            raise ReplyTemplateError("Property not found")
+        cursor = conn.execute("""
+            UPDATE reply_templates SET subject = ?, body = ?, version = version + 1, updated_at = CURRENT_TIMESTAMP
+            WHERE agent_id = ? AND COALESCE(property_id, 0) = COALESCE(?, 0)
+        """, (subject, body, agent_id, property_id))
+        if cursor.rowcount == 0:
+            conn.execute(
+                "INSERT INTO reply_templates (agent_id, property_id, subject, body) VALUES (?, ?, ?, ?)",
+                (agent_id, property_id, subject, body)
+            )
+        row = conn.execute("""
+            SELECT id, property_id, version FROM reply_templates
+            WHERE agent_id = ? AND COALESCE(property_id, 0) = COALESCE(?, 0)
+        """, (agent_id, property_id)).fetchone()
+        conn.commit()
+        return dict(row)
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def delete_template(agent_id: int, template_id: int, conn=None) -> bool:
+    cursor = conn.execute("DELETE FROM reply_templates WHERE id = ? AND agent_id = ?", (template_id, agent_id))
+    conn.commit()
+    return cursor.rowcount > 0
+
+
+def render_replies(agent_id: int, recipients: List[dict], conn=None) -> List[dict]:
+    """Render the reply for each recipient, in order
+
+    A recipient is {"inquiry_id"} (prospect and property come from the
+    inquiry), or {"property_id", "prospect_name", "prospect_email"} for a
+    campaign to people who are not inquiries yet. Results carry subject,
+    body, property_id and the template id/version used, or an error.
+    """
+    inquiry_ids = sorted({r["inquiry_id"] for r in recipients if isinstance(r, dict) and isinstance(r.get("inquiry_id"), int)})
+    inquiries = {row["id"]: row for row in conn.execute("""
+        SELECT id, property_id, prospect_name, prospect_email FROM agent_inquiries
+        WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+    """, (agent_id, json.dumps(inquiry_ids))).fetchall()} if inquiry_ids else {}
+
+    wanted = []
+    for recipient in recipients:
+        if not isinstance(recipient, dict):
+            wanted.append(None)
+        elif "inquiry_id" in recipient:
+            inquiry = inquiries.get(recipient["inquiry_id"])
+            wanted.append((inquiry["property_id"], inquiry["prospect_name"], inquiry["prospect_email"]) if inquiry else None)
+        else:
+            wanted.append((recipient.get("property_id"), recipient.get("prospect_name"), recipient.get("prospect_email")))
+
+    property_ids = sorted({item[0] for item in wanted if item and isinstance(item[0], int)})
+    properties = {row["id"]: row for row in conn.execute("""
+        SELECT id, address, unit, rent, bedrooms, bathrooms, availability_date, acuity_id FROM agent_properties
+        WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))
+    """, (agent_id, json.dumps(property_ids))).fetchall()} if property_ids else {}
+    templates = {row["property_id"]: row for row in conn.execute(
+        "SELECT id, property_id, subject, body, version FROM reply_templates WHERE agent_id = ?", (agent_id,)
+    ).fetchall()}
+    agent = conn.execute("SELECT first_name, last_name, company, email FROM agents WHERE id = ?", (agent_id,)).fetchone()
+    agent_context = SimpleNamespace(
+        name=f"{agent['first_name']} {agent['last_name']}" if agent else "",
+        first_name=agent["first_name"] if agent else "",
+        company=agent["company"] if agent else "",
+        email=agent["email"] if agent else "",
+    )
+
+    contexts: Dict[Optional[int], SimpleNamespace] = {}
+    results = []
+    for index, item in enumerate(wanted):
+        if item is None:
+            results.append({"index": index, "error": "Inquiry not found"})
+            continue
+        property_id, prospect_name, prospect_email = item
+        if property_id is not None and property_id not in properties:
+            results.append({"index": index, "error": "Property not found"})
+            continue
+        if property_id not in contexts:
+            contexts[property_id] = property_context(properties.get(property_id))
+        template = templates.get(property_id) or templates.get(None)
+        if template is not None:
+            key, version = template["id"], template["version"]
+            compiled = template_cache.get((key, version), template["subject"], template["body"])
+        else:
+            key, version = None, 0
+            compiled = template_cache.get(("default", 0), DEFAULT_TEMPLATE["subject"], DEFAULT_TEMPLATE["body"])
+        context = {
+            "prospect": prospect_context(prospect_name, prospect_email),
+            "property": contexts[property_id],
+            "agent": agent_context,
+        }
+        try:
+            subject, body = compiled.render(context)
+            results.append({
+                "index": index,
+                "property_id": property_id,
+                "subject": subject,
+                "body": body,
+                "template_id": key,
+                "template_version": version,
+            })
+        except Exception as e:
+            results.append({"index": index, "error": f"Template error: {e}"})
+    return results
@@ -0,0 +1,211 @@
+# Full-text search over inquiries and properties for LeadFlow Pro
+#
+# inquiries_fts / properties_fts (migration 10) are external-content FTS5
+# tables kept in sync by triggers. agent_id is indexed as a column of its
+# own, so the agent scope is part of the MATCH and FTS intersects doclists
+# instead of ranking every agent's matches and filtering afterwards.
+# Prefix indexes for 2-6 characters serve the typeahead-style prefix terms
+# (names, email fragments) without expanding every matching token.
+#
+# Each prefix term still reads its doclist across all agents, so for common
+# words FTS costs the same whatever the tenant's size and only pays off for
+# large ones. An agent with at most
+# SEARCH_SCAN_MAX_ROWS rows is searched by reading those rows through the
+# (agent_id, ...) index and matching them here, with the tokenizer's rules
+# (unicode61, diacritics folded) and the same column weights.
+import os
+import re
+import unicodedata
+from typing import List
+
+SEARCH_SCAN_MAX_ROWS = int(os.environ.get("LEADFLOW_SEARCH_SCAN_MAX_ROWS", "2000"))
+SNIPPET_TOKENS = 12
+MAX_QUERY_TERMS = 8
+MAX_SEARCH_OFFSET = 1000
+SEARCH_KINDS = ("inquiries", "properties")
+
+# bm25 weights, in column order; agent_id only scopes and never ranks
+INQUIRY_SEARCH_COLUMNS = ("prospect_name", "prospect_email", "prospect_phone", "message")
+INQUIRY_WEIGHTS = (0.0, 10.0, 8.0, 6.0, 1.0)
+PROPERTY_SEARCH_COLUMNS = ("address", "unit", "description", "amenities")
+PROPERTY_WEIGHTS = (0.0, 10.0, 6.0, 1.0, 1.0)
+
+# unicode61 token characters: letters, digits and private-use code points.
+# The group makes split() return the separators and tokens alternately.
+_TOKEN = re.compile(r"([^\W_]+)", re.UNICODE)
+
+
+def build_match_query(q: str, agent_id: int, columns) -> str:
+    """FTS5 MATCH expression: every term as a prefix, scoped to one agent
+
+    Terms are reduced to word characters before quoting, so user input can
+    never inject FTS5 syntax. Returns "" when nothing searchable is left.
+    """
+    terms = re.findall(r"\w+", q.lower(), re.UNICODE)[:MAX_QUERY_TERMS]
+    if not terms:
+        return ""
+    column_set = "{" + " ".join(columns) + "}"
+    body = " AND ".join(f'{column_set} : "{term}"*' for term in terms)
+    return f'agent_id : "{int(agent_id)}" AND {body}'
+
+
+def _fold(text: str) -> str:
+    """Lowercase and strip diacritics, as 'unicode61 remove_diacritics 2' does"""
+    if text.isascii():
+        return text.lower()
+    decomposed = unicodedata.normalize("NFKD", text.lower())
+    return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def _scan_terms(q: str) -> List[str]:
+    terms = re.findall(r"\w+", q.lower(), re.UNICODE)[:MAX_QUERY_TERMS]
+    return [token for term in terms for token in _TOKEN.findall(_fold(term))]
+
+
+def _term_pattern(term: str):
+    # The term at the start of a token, i.e. not preceded by a token character
+    return re.compile(r"(?<![^\W_])" + re.escape(term), re.UNICODE)
+
+
+def _scan_prefilter(columns, terms):
+    """SQL that keeps the rows containing every term, ignoring ASCII case
+
+    LIKE cannot fold diacritics, so rows with any non-ASCII text (more
+    bytes than characters) always pass and are left to _scan_search.
+    """
+    contains = " AND ".join("(" + " OR ".join(f"{column} LIKE ?" for column in columns) + ")" for _ in terms)
+    non_ascii = " OR ".join(f"length(CAST({column} AS BLOB)) != length({column})" for column in columns)
+    return f"({contains} OR {non_ascii})", [f"%{term}%" for term in terms for _ in columns]
+
+
+def _is_small_tenant(table: str, agent_id: int, conn) -> bool:
+    # A row past the threshold exists only for a large tenant; the probe
+    # stops there, so it costs the same however many rows the tenant has
+    return conn.execute(
+        f"SELECT 1 FROM {table} WHERE agent_id = ? LIMIT 1 OFFSET ?", (agent_id, SEARCH_SCAN_MAX_ROWS)
+    ).fetchone() is None
+
+
+def _snippet(text, terms) -> str:
+    """The SNIPPET_TOKENS-token window with the most matches, matches in [brackets]"""
+    if not text:
+        return ""
+    parts = _TOKEN.split(text)
+    tokens = parts[1::2]
+    if not tokens:
+        return text
+    folded = _fold(text)
+    if not any(term in folded for term in terms):
+        hits = [False] * len(tokens)
+    else:
+        ascii_only = text.isascii()
+        hits = [(token.lower() if ascii_only else _fold(token)).startswith(terms) for token in tokens]
+    # Slide the window along, keeping the first one with the most matches
+    count = sum(hits[:SNIPPET_TOKENS])
+    best, best_count = 0, count
+    for start in range(1, len(tokens) - SNIPPET_TOKENS + 1):
+        count += hits[start + SNIPPET_TOKENS - 1] - hits[start - 1]
+        if count > best_count:
+            best, best_count = start, count
+    last = min(best + SNIPPET_TOKENS, len(tokens))
+    for index in range(best, last):
+        if hits[index]:
+            parts[2 * index + 1] = f"[{tokens[index]}]"
+    head = "…" if best > 0 else parts[0]
+    tail = "…" if last < len(tokens) else parts[-1]
+    return head + "".join(parts[2 * best + 1:2 * last]) + tail
+
+
+def _scan_search(table: str, select: str, agent_id: int, q: str, columns, weights, snippet_column: str,
+                 limit: int, offset: int, conn) -> List[dict]:
+    """Match and rank one tenant's rows like the FTS query would: every term a token prefix"""
+    terms = _scan_terms(q)
+    if not terms:
+        return []
+    prefilter, params = _scan_prefilter(columns, terms)
+    rows = conn.execute(
+        f"SELECT {select} FROM {table} WHERE agent_id = ? AND {prefilter}", (agent_id, *params)
+    ).fetchall()
+    patterns = [(term, _term_pattern(term)) for term in terms]
+    matches = []
+    for row in rows:
+        texts = [_fold(row[column] or "") for column in columns]
+        score = 0.0
+        for term, pattern in patterns:
+            # The substring test rules most rows out before any regex runs
+            matched = [weight for text, weight in zip(texts, weights) if term in text and pattern.search(text)]
+            if not matched:
+                break
+            score -= sum(matched)
+        else:
+            matches.append((score, -row["id"], row))
+    matches.sort(key=lambda match: match[:2])
+    results = []
+    for score, _, row in matches[offset:offset + limit]:
+        row = dict(row)
+        row["snippet"] = _snippet(row[snippet_column], tuple(terms))
+        row["score"] = score
+        results.append(row)
+    return results
+
+
+def search_inquiries(agent_id: int, q: str, limit: int, offset: int = 0, conn=None) -> List[dict]:
+    if _is_small_tenant("agent_inquiries", agent_id, conn):
+        results = _scan_search(
+            "agent_inquiries", "id, property_id, prospect_name, prospect_email, prospect_phone, status, created_at, message",
+            agent_id, q, INQUIRY_SEARCH_COLUMNS, INQUIRY_WEIGHTS[1:], "message", limit, offset, conn
+        )
+        for row in results:
+            del row["message"]
+        return results
+    match = build_match_query(q, agent_id, INQUIRY_SEARCH_COLUMNS)
+    if not match:
+        return []
+    rows = conn.execute(f"""
+        SELECT i.id, i.property_id, i.prospect_name, i.prospect_email, i.prospect_phone,
+               i.status, i.created_at,
+               snippet(inquiries_fts, 4, '[', ']', '…', 12) AS snippet,
+               bm25(inquiries_fts, {', '.join(str(w) for w in INQUIRY_WEIGHTS)}) AS score
+        FROM inquiries_fts
+        JOIN agent_inquiries i ON i.id = inquiries_fts.rowid
+        WHERE inquiries_fts MATCH ?
+        ORDER BY score, i.id DESC
+        LIMIT ? OFFSET ?
+    """, (match, limit, offset)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def search_properties(agent_id: int, q: str, limit: int, offset: int = 0, conn=None) -> List[dict]:
+    if _is_small_tenant("agent_properties", agent_id, conn):
+        results = _scan_search(
+            "agent_properties", "id, address, unit, rent, status, is_active, created_at, description, amenities",
+            agent_id, q, PROPERTY_SEARCH_COLUMNS, PROPERTY_WEIGHTS[1:], "description", limit, offset, conn
+        )
+        for row in results:
+            del row["description"], row["amenities"]
+        return results
+    match = build_match_query(q, agent_id, PROPERTY_SEARCH_COLUMNS)
+    if not match:
+        return []
+    rows = conn.execute(f"""
+        SELECT p.id, p.address, p.unit, p.rent, p.status, p.is_active, p.created_at,
+               snippet(properties_fts, 3, '[', ']', '…', 12) AS snippet,
+               bm25(properties_fts, {', '.join(str(w) for w in PROPERTY_WEIGHTS)}) AS score
+        FROM properties_fts
+        JOIN agent_properties p ON p.id = properties_fts.rowid
+        WHERE properties_fts MATCH ?
+        ORDER BY score, p.id DESC
+        LIMIT ? OFFSET ?
+    """, (match, limit, offset)).fetchall()
+    return [dict(row) for row in rows]
+
+
+def rebuild_search_index(conn=None) -> dict:
+    """Rebuild both FTS indexes from their content tables and optimize them"""
+    counts = {}
+    for table, content in (("inquiries_fts", "agent_inquiries"), ("properties_fts", "agent_properties")):
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {table}({table}) VALUES ('optimize')")
+        counts[content] = conn.execute(f"SELECT COUNT(*) FROM {content}").fetchone()[0]
+    conn.commit()
+    return counts
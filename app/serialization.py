@@ -0,0 +1,120 @@
+# Fast response pipeline for LeadFlow Pro list endpoints
+#
+# Rows are fetched as plain tuples (no sqlite3.Row), keyed by the column
+# names the SELECT projects, and encoded in one pass by orjson. Returning
+# the Response directly skips FastAPI's jsonable_encoder walk. Bodies above
+# COMPRESS_MIN_BYTES are brotli- or gzip-compressed when the client accepts
+# it. orjson and brotli are optional: without them the stdlib json and gzip
+# paths are used.
+import os
+import json
+import gzip
+from typing import Callable, Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESS_MIN_BYTES = int(os.environ.get("LEADFLOW_COMPRESS_MIN_BYTES", "1024"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 4
+
+
+def fetch_dicts(sql: str, params=(), converters: Optional[Dict[str, Callable]] = None, conn=None) -> List[dict]:
+    """Rows as dicts keyed by the projected column names (use AS for renames)
+
+    converters maps a column name to a function applied to its value; keep
+    them for what SQL cannot express (e.g. ints that must encode as bools).
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(sql, params)
+    names = [column[0] for column in cursor.description]
+    rows = [dict(zip(names, row)) for row in cursor.fetchall()]
+    for name, convert in (converters or {}).items():
+        for row in rows:
+            row[name] = convert(row[name])
+    return rows
+
+
+def dumps(content) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """br if accepted and available, else gzip if accepted, else None"""
+    if not accept_encoding:
+        return None
+    accepted = set()
+    for item in accept_encoding.lower().split(","):
+        coding, _, param = item.partition(";")
+        param = param.strip()
+        try:
+            q = float(param[2:]) if param.startswith("q=") else 1.0
+        except ValueError:
+            q = 0.0
+        if q > 0:
+            accepted.add(coding.strip())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted or "*" in accepted:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str, best: bool = False) -> bytes:
+    """Compress with per-request settings, or the slowest/smallest for best"""
+    if encoding == "br":
+        return brotli.compress(body, quality=11 if best else BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=9 if best else GZIP_LEVEL)
+
+
+class FastJSONResponse(Response):
+    """JSON response encoded with orjson, compressed above COMPRESS_MIN_BYTES
+
+    Pass the request's Accept-Encoding to allow compression. A compressed
+    body gets its own strong ETag, suffixed with the coding, since each
+    content coding is a distinct representation (app.etag strips the
+    suffix again when comparing).
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, content, status_code: int = 200, headers: Optional[dict] = None, accept_encoding: Optional[str] = None):
+        self.accept_encoding = accept_encoding
+        self.content_encoding = None
+        super().__init__(content, status_code=status_code, headers=headers)
+        self.headers["Vary"] = "Accept-Encoding"
+        if self.content_encoding:
+            self.headers["Content-Encoding"] = self.content_encoding
+            etag = self.headers.get("etag")
+            if etag:
+                self.headers["ETag"] = f'{etag[:-1]}-{self.content_encoding}"'
+
+    def render(self, content) -> bytes:
+        body = dumps(content)
+        if len(body) >= COMPRESS_MIN_BYTES:
+            self.content_encoding = choose_encoding(self.accept_encoding)
+            if self.content_encoding:
+                body = compress(body, self.content_encoding)
+        return body
+
+
+def list_response(request: Request, response: Response, content) -> FastJSONResponse:
+    """FastJSONResponse for a list endpoint's payload
+
+    Headers already set on the injected response (ETag, Cache-Control) are
+    carried over, since returning a Response directly bypasses them.
+    """
+    headers = {name: value for name, value in response.headers.items() if name != "content-length"}
+    return FastJSONResponse(content, headers=headers, accept_encoding=request.headers.get("accept-encoding"))
@@ -0,0 +1,61 @@
+# Startup phase timing for LeadFlow Pro
+#
+# app.main imports this module before anything heavy, so the "imports"
+# phase covers FastAPI, pydantic and the app modules. The startup hook then
+# times each of its own phases; the breakdown is logged once and served
+# at GET /api/system/startup.
+import os
+import time
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Imports plus the startup hook; exceeding it logs a warning
+STARTUP_BUDGET_MS = float(os.environ.get("LEADFLOW_STARTUP_BUDGET_MS", "1500"))
+
+
+class StartupTimer:
+    """Wall-clock time per startup phase, in order"""
+
+    def __init__(self, budget_ms: float = STARTUP_BUDGET_MS):
+        self.budget_ms = budget_ms
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = {}
+
+    def mark(self, name: str):
+        """Close a phase that began where the previous one ended"""
+        now = time.perf_counter()
+        self.phases[name] = round((now - self._last) * 1000, 2)
+        self._last = now
+
+    @contextmanager
+    def phase(self, name: str):
+        self._last = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.mark(name)
+
+    @property
+    def total_ms(self) -> float:
+        return round(sum(self.phases.values()), 2)
+
+    def report(self) -> dict:
+        return {
+            "phases_ms": dict(self.phases),
+            "total_ms": self.total_ms,
+            "budget_ms": self.budget_ms,
+            "within_budget": self.total_ms <= self.budget_ms,
+        }
+
+    def log(self):
+        breakdown = ", ".join(f"{name} {ms:.1f} ms" for name, ms in self.phases.items())
+        if self.total_ms > self.budget_ms:
+            logger.warning(f"Startup took {self.total_ms:.1f} ms, over the {self.budget_ms:.0f} ms budget ({breakdown})")
+        else:
+            logger.info(f"Startup took {self.total_ms:.1f} ms ({breakdown})")
+
+
+startup_timer = StartupTimer()
@@ -0,0 +1,219 @@
+# Automation statistics for LeadFlow Pro
+#
+# emails_sent / tours_scheduled in automation_stats are maintained
+# incrementally by the triggers from migration 5. The functions here do the
+# exact recount: on demand for one agent, and periodically for everyone to
+# repair any drift (rows changed with triggers bypassed, manual edits, ...).
+#
+# The dashboard numbers come from compute_agent_stats, cached per agent in
+# stats_cache and invalidated by the request handlers that write.
+import os
+import time
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from app.db import get_executor
+from app.etag import agent_data_version
+from app.prospects import DUPLICATE_INQUIRY_STATUS
+
+logger = logging.getLogger(__name__)
+
+STATS_RECONCILE_SECONDS = int(os.environ.get("LEADFLOW_STATS_RECONCILE_SECONDS", "3600"))
+STATS_CACHE_SIZE = int(os.environ.get("LEADFLOW_STATS_CACHE_SIZE", "10000"))
+# Safety net for writes this process never sees (other workers, scripts)
+STATS_CACHE_TTL = float(os.environ.get("LEADFLOW_STATS_CACHE_TTL", "30"))
+
+# Inquiries still in their initial status have not been responded to yet
+UNANSWERED_INQUIRY_STATUS = "new"
+
+
+def recount_automation_stats(agent_id: Optional[int] = None, conn=None) -> int:
+    """Recount stats for one agent (or all); returns how many rows were corrected"""
+    where = "WHERE p.agent_id = ?" if agent_id is not None else ""
+    stored_where = "WHERE agent_id = ?" if agent_id is not None else ""
+    params = (agent_id,) if agent_id is not None else ()
+
+    actual = {
+        row[0]: (row[1], row[2] or 0)
+        for row in conn.execute(f"""
+            SELECT p.agent_id, COUNT(*), SUM(t.tour_scheduled = TRUE)
+            FROM agent_properties p
+            JOIN email_automation_tracking t ON t.property_id = p.id
+            {where}
+            GROUP BY p.agent_id
+        """, params).fetchall()
+    }
+    stored = {
+        row[0]: (row[1], row[2])
+        for row in conn.execute(
+            f"SELECT agent_id, emails_sent, tours_scheduled FROM automation_stats {stored_where}",
+            params
+        ).fetchall()
+    }
+    if agent_id is not None:
+        actual.setdefault(agent_id, (0, 0))
+
+    drifted = []
+    for agent in set(actual) | set(stored):
+        emails_sent, tours_scheduled = actual.get(agent, (0, 0))
+        if stored.get(agent) != (emails_sent, tours_scheduled):
+            response_rate = (tours_scheduled / emails_sent * 100) if emails_sent > 0 else 0.0
+            drifted.append((agent, emails_sent, tours_scheduled, response_rate))
+
+    if drifted:
+        conn.executemany("""
+            INSERT INTO automation_stats (agent_id, emails_sent, tours_scheduled, response_rate, last_updated)
+            VALUES (?, ?, ?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(agent_id) DO UPDATE SET
+                emails_sent = excluded.emails_sent,
+                tours_scheduled = excluded.tours_scheduled,
+                response_rate = excluded.response_rate,
+                last_updated = CURRENT_TIMESTAMP
+        """, drifted)
+        conn.commit()
+    return len(drifted)
+
+
+async def reconcile_stats_forever(interval: int = STATS_RECONCILE_SECONDS):
+    """Background job: periodically repair drift in the incremental counters"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            corrected = await get_executor().run_with_connection(recount_automation_stats)
+            if corrected:
+                logger.warning(f"Automation stats reconciliation corrected {corrected} agents")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Automation stats reconciliation failed: {str(e)}")
+
+
+def compute_agent_stats(agent_id: int, conn=None) -> dict:
+    """Every dashboard/automation number for one agent in a single query
+
+    Each aggregate is answered from an (agent_id, ...) index, and the
+    response rate is the share of inquiries that have moved past 'new'.
+    Inquiries linked to a prospect's earlier one as duplicates do not count.
+    """
+    row = conn.execute("""
+        SELECT p.total_properties, p.active_properties, i.total_inquiries, i.answered_inquiries,
+               COALESCE(s.emails_sent, 0), COALESCE(s.tours_scheduled, 0), COALESCE(s.response_rate, 0.0)
+        FROM (
+            SELECT COUNT(*) AS total_properties, COALESCE(SUM(is_active = TRUE), 0) AS active_properties
+            FROM agent_properties WHERE agent_id = ?
+        ) p, (
+            SELECT COALESCE(SUM(status IS NOT ?), 0) AS total_inquiries,
+                   COALESCE(SUM(status != ? AND status != ?), 0) AS answered_inquiries
+            FROM agent_inquiries WHERE agent_id = ?
+        ) i
+        LEFT JOIN automation_stats s ON s.agent_id = ?
+    """, (
+        agent_id, DUPLICATE_INQUIRY_STATUS, UNANSWERED_INQUIRY_STATUS, DUPLICATE_INQUIRY_STATUS, agent_id, agent_id
+    )).fetchone()
+    total_properties, active_properties, total_inquiries, answered, emails_sent, tours_scheduled, tour_rate = row
+    return {
+        "total_properties": total_properties,
+        "active_properties": active_properties,
+        "total_inquiries": total_inquiries,
+        "response_rate": round(answered / total_inquiries * 100, 1) if total_inquiries else 0.0,
+        "emails_sent": emails_sent,
+        "tours_scheduled": tours_scheduled,
+        "tour_rate": round(tour_rate, 1),
+    }
+
+
+class AgentStatsCache:
+    """Per-agent LRU of compute_agent_stats results
+
+    Write paths call invalidate(agent_id). Each invalidation bumps the
+    agent's generation, and put() drops results computed before the latest
+    bump, so a slow read racing a write can never re-cache stale numbers.
+    Entries also remember the agent_data_versions counter they were computed
+    at; a get() for another version misses, so numbers served under an ETag
+    always match it, even after writes made by another process.
+    """
+
+    def __init__(self, max_size: int = STATS_CACHE_SIZE, ttl: float = STATS_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, agent_id: int) -> int:
+        agent_id = int(agent_id)
+        with self._lock:
+            return self._generations.get(agent_id, 0)
+
+    def get(self, agent_id: int, data_version: Optional[int] = None) -> Optional[dict]:
+        agent_id = int(agent_id)
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is None or entry[1] <= time.monotonic() or (data_version is not None and entry[2] != data_version):
+                self._entries.pop(agent_id, None)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(agent_id)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, agent_id: int, stats: dict, generation: int, data_version: Optional[int] = None):
+        agent_id = int(agent_id)
+        with self._lock:
+            if self._generations.get(agent_id, 0) != generation:
+                return
+            self._entries[agent_id] = (stats, time.monotonic() + self.ttl, data_version)
+            self._entries.move_to_end(agent_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, agent_id: int):
+        # Handlers pass the JWT subject (a string), the worker passes the column value
+        agent_id = int(agent_id)
+        with self._lock:
+            self._entries.pop(agent_id, None)
+            self._generations[agent_id] = self._generations.get(agent_id, 0) + 1
+            self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+            }
+
+
+stats_cache = AgentStatsCache()
+
+
+async def get_agent_stats(agent_id: int, db, data_version: Optional[int] = None) -> dict:
+    """Cached compute_agent_stats; a dict lookup unless a write invalidated it
+
+    Pass the agent_data_versions counter read for an ETag to get numbers
+    computed at that version (or later); without one it is read here, so
+    every caller looks the entry up at the same version.
+    """
+    if data_version is None:
+        data_version = await db.run(agent_data_version, int(agent_id))
+    stats = stats_cache.get(agent_id, data_version)
+    if stats is None:
+        generation = stats_cache.generation(agent_id)
+        stats = await db.run(compute_agent_stats, agent_id)
+        stats_cache.put(agent_id, stats, generation, data_version)
+    return stats
@@ -0,0 +1,98 @@
+# Decoded-JWT cache for LeadFlow Pro
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, List, Optional
+
+TOKEN_CACHE_SIZE = int(os.environ.get("LEADFLOW_TOKEN_CACHE_SIZE", "10000"))
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens keyed by their SHA-256 digest
+
+    Only the subject and expiry are kept, never the token itself. Entries
+    drop out when they expire, when the LRU is full, or when a revocation
+    hook reports the token as revoked.
+    """
+
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._revocation_hooks: List[Callable[[str, bytes], bool]] = []
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.revocations = 0
+
+    @staticmethod
+    def digest(token: str) -> bytes:
+        return hashlib.sha256(token.encode('utf-8')).digest()
+
+    def add_revocation_hook(self, hook: Callable[[str, bytes], bool]):
+        """Register hook(subject, digest) -> True when the token must be rejected"""
+        self._revocation_hooks.append(hook)
+
+    def is_revoked(self, subject: str, digest: bytes) -> bool:
+        return any(hook(subject, digest) for hook in self._revocation_hooks)
+
+    def get(self, token: str) -> Optional[str]:
+        """Return the cached subject for a token, or None on a miss"""
+        key = self.digest(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            subject, expires_at = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        if self._revocation_hooks and self.is_revoked(subject, key):
+            self.revoke(token)
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return subject
+
+    def put(self, token: str, subject: str, expires_at: float):
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = (subject, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def revoke(self, token: str):
+        """Drop a token so the next request re-verifies it"""
+        with self._lock:
+            if self._entries.pop(self.digest(token), None) is not None:
+                self.revocations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "revocations": self.revocations,
+            }
@@ -0,0 +1,306 @@
+# Durable webhook inbox for LeadFlow Pro
+#
+# /api/webhooks/acuity only appends the raw delivery to webhook_inbox and
+# acks. InboxWorker applies pending deliveries in batches, one
+# write transaction per batch. Each (source, appointment id, event type) is
+# stored once, so Acuity retries and bursts cannot create duplicate
+# tracking rows; reschedules are the exception, since an appointment can
+# move many times, and only a repeat of its latest move is dropped.
+# Deliveries that fail transiently are retried with exponential backoff;
+# payloads that can never be applied are dead-lettered with the reason
+# instead of being retried forever.
+import os
+import json
+import time
+import asyncio
+import hashlib
+import logging
+from typing import Optional, Tuple
+from urllib.parse import parse_qs
+
+from app.db import get_executor
+from app.property_index import property_index
+
+logger = logging.getLogger(__name__)
+
+WEBHOOK_BATCH_SIZE = int(os.environ.get("LEADFLOW_WEBHOOK_BATCH_SIZE", "100"))
+WEBHOOK_POLL_SECONDS = float(os.environ.get("LEADFLOW_WEBHOOK_POLL_SECONDS", "2"))
+WEBHOOK_MAX_ATTEMPTS = int(os.environ.get("LEADFLOW_WEBHOOK_MAX_ATTEMPTS", "5"))
+WEBHOOK_RETRY_BASE_SECONDS = float(os.environ.get("LEADFLOW_WEBHOOK_RETRY_BASE_SECONDS", "5"))
+WEBHOOK_RETRY_MAX_SECONDS = float(os.environ.get("LEADFLOW_WEBHOOK_RETRY_MAX_SECONDS", "600"))
+# Processed rows are kept this long; it is also the window for idempotency
+WEBHOOK_RETENTION_DAYS = int(os.environ.get("LEADFLOW_WEBHOOK_RETENTION_DAYS", "30"))
+
+DEFAULT_EVENT_TYPE = "scheduled"
+# Events that move an appointment, and may arrive many times for one
+RESCHEDULE_EVENT_TYPES = ("rescheduled", "changed")
+
+
+class DeadLetter(Exception):
+    """A delivery that can never be applied; it is parked with this reason"""
+
+
+def parse_webhook_body(body: bytes) -> dict:
+    """Acuity posts form-encoded notifications; JSON bodies are accepted too"""
+    text = body.decode('utf-8')
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = {key: values[-1] for key, values in parse_qs(text).items()}
+    if not isinstance(data, dict) or not data:
+        raise DeadLetter("Unparseable payload")
+    return data
+
+
+def webhook_key(body: bytes) -> Tuple[Optional[str], str, Optional[str]]:
+    """Idempotency key (appointment id, event type, event key); id is None if unreadable
+
+    The event key tells two reschedules of one appointment apart: the new
+    appointment time, or a digest of the payload when it has none.
+    """
+    try:
+        data = parse_webhook_body(body)
+    except (DeadLetter, UnicodeDecodeError):
+        return None, DEFAULT_EVENT_TYPE, None
+    external_id = data.get('id')
+    event_type = str(data.get('action') or DEFAULT_EVENT_TYPE)
+    event_key = None
+    if event_type in RESCHEDULE_EVENT_TYPES:
+        event_key = str(data.get('datetime') or hashlib.blake2b(body, digest_size=16).hexdigest())
+    return (str(external_id) if external_id is not None else None), event_type, event_key
+
+
+def enqueue_webhook(source: str, body: bytes, conn=None) -> Optional[int]:
+    """Append a delivery to the inbox; returns its id, or None for a duplicate
+
+    A reschedule is a duplicate only when the appointment's latest
+    reschedule carried the same event key, so moving it back to an
+    earlier time still gets through.
+    """
+    external_id, event_type, event_key = webhook_key(body)
+    payload = body.decode('utf-8', errors='replace')
+    if event_key is None:
+        cursor = conn.execute("""
+            INSERT INTO webhook_inbox (source, external_id, event_type, payload)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT DO NOTHING
+        """, (source, external_id, event_type, payload))
+    else:
+        cursor = conn.execute(f"""
+            INSERT INTO webhook_inbox (source, external_id, event_type, event_key, payload)
+            SELECT ?, ?, ?, ?, ?
+            WHERE NOT EXISTS (
+                SELECT 1 FROM (
+                    SELECT event_key FROM webhook_inbox
+                    WHERE source = ? AND external_id = ? AND event_type IN {RESCHEDULE_EVENT_TYPES}
+                    ORDER BY id DESC LIMIT 1
+                ) WHERE event_key = ?
+            )
+        """, (source, external_id, event_type, event_key, payload, source, external_id, event_key))
+    conn.commit()
+    return cursor.lastrowid if cursor.rowcount else None
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before the next try of a delivery that has failed attempts times"""
+    return min(WEBHOOK_RETRY_BASE_SECONDS * 2 ** (attempts - 1), WEBHOOK_RETRY_MAX_SECONDS)
+
+
+def _apply_acuity_event(event_type: str, data: dict, conn) -> int:
+    """Apply one Acuity notification; returns the owning agent_id"""
+    appointment_id = data.get('id')
+    appointment_type_id = data.get('appointmentTypeID')
+    if not appointment_type_id:
+        raise DeadLetter("No appointment type ID")
+
+    property_data = property_index.route(appointment_type_id)
+    if not property_data:
+        raise DeadLetter(f"No property found with Acuity ID: {appointment_type_id}")
+
+    if event_type == "canceled":
+        conn.execute(
+            "UPDATE email_automation_tracking SET tour_scheduled = FALSE WHERE acuity_appointment_id = ? AND property_id = ?",
+            (appointment_id, property_data.property_id)
+        )
+    elif event_type in RESCHEDULE_EVENT_TYPES:
+        conn.execute(
+            "UPDATE email_automation_tracking SET tour_date = COALESCE(?, tour_date), tour_scheduled = TRUE "
+            "WHERE acuity_appointment_id = ? AND property_id = ?",
+            (data.get('datetime'), appointment_id, property_data.property_id)
+        )
+    elif not conn.execute(
+        "SELECT 1 FROM email_automation_tracking WHERE acuity_appointment_id = ? AND property_id = ?",
+        (appointment_id, property_data.property_id)
+    ).fetchone():
+        # Bookings logged before the inbox existed are not in webhook_inbox
+        client_name = f"{data.get('firstName', '')} {data.get('lastName', '')}".strip()
+        conn.execute("""
+            INSERT INTO email_automation_tracking
+            (property_id, prospect_email, prospect_name, acuity_appointment_id,
+             tour_scheduled, tour_date, appointment_type_id)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        """, (
+            property_data.property_id,
+            data.get('email'),
+            client_name,
+            appointment_id,
+            True,
+            data.get('datetime'),
+            appointment_type_id
+        ))
+        logger.info(f"Tour scheduled: appointment {appointment_id} for {property_data.address}")
+    return property_data.agent_id
+
+
+def process_inbox_batch(batch_size: int = WEBHOOK_BATCH_SIZE, conn=None) -> dict:
+    """Apply up to batch_size due pending deliveries in one write transaction"""
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        property_index.ensure_current(conn)
+        rows = conn.execute(
+            "SELECT id, event_type, payload, attempts FROM webhook_inbox "
+            "WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, batch_size)
+        ).fetchall()
+        result = {"processed": 0, "dead": 0, "retried": 0, "agents": set()}
+        for row in rows:
+            # A savepoint per delivery keeps one bad row from undoing the batch
+            conn.execute("SAVEPOINT delivery")
+            try:
+                data = parse_webhook_body(row['payload'].encode('utf-8'))
+                result["agents"].add(_apply_acuity_event(row['event_type'], data, conn))
+                conn.execute("RELEASE delivery")
+                conn.execute(
+                    "UPDATE webhook_inbox SET status = 'done', attempts = attempts + 1, processed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (row['id'],)
+                )
+                result["processed"] += 1
+            except Exception as e:
+                conn.execute("ROLLBACK TO delivery")
+                conn.execute("RELEASE delivery")
+                dead = isinstance(e, DeadLetter) or row['attempts'] + 1 >= WEBHOOK_MAX_ATTEMPTS
+                conn.execute("""
+                    UPDATE webhook_inbox
+                    SET status = ?, attempts = attempts + 1, last_error = ?, next_attempt_at = ?,
+                        processed_at = CASE WHEN ? = 'dead' THEN CURRENT_TIMESTAMP END
+                    WHERE id = ?
+                """, (
+                    "dead" if dead else "pending", str(e), now + retry_delay(row['attempts'] + 1),
+                    "dead" if dead else "pending", row['id']
+                ))
+                if dead:
+                    result["dead"] += 1
+                    logger.warning(f"Webhook {row['id']} dead-lettered: {str(e)}")
+                else:
+                    result["retried"] += 1
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def prune_inbox(retention_days: int = WEBHOOK_RETENTION_DAYS, conn=None) -> int:
+    """Drop processed deliveries past the retention window (dead letters are kept)"""
+    cursor = conn.execute(
+        "DELETE FROM webhook_inbox WHERE status = 'done' AND processed_at < datetime('now', ?)",
+        (f"-{retention_days} days",)
+    )
+    conn.commit()
+    return cursor.rowcount
+
+
+def requeue_dead(inbox_id: Optional[int] = None, conn=None) -> int:
+    """Move dead letters (all, or one) back to pending, e.g. after adding the missing property"""
+    sql = ("UPDATE webhook_inbox SET status = 'pending', attempts = 0, last_error = NULL, processed_at = NULL, "
+           "next_attempt_at = 0 WHERE status = 'dead'")
+    params = ()
+    if inbox_id is not None:
+        sql += " AND id = ?"
+        params = (inbox_id,)
+    cursor = conn.execute(sql, params)
+    conn.commit()
+    return cursor.rowcount
+
+
+def inbox_depth(conn=None) -> dict:
+    """Row counts per status and the age of the oldest pending delivery"""
+    counts = {row[0]: row[1] for row in conn.execute(
+        "SELECT status, COUNT(*) FROM webhook_inbox GROUP BY status"
+    ).fetchall()}
+    oldest = conn.execute(
+        "SELECT (julianday('now') - julianday(MIN(received_at))) * 86400 FROM webhook_inbox WHERE status = 'pending'"
+    ).fetchone()[0]
+    return {
+        "pending": counts.get("pending", 0),
+        "done": counts.get("done", 0),
+        "dead": counts.get("dead", 0),
+        "lag_seconds": round(oldest, 3) if oldest is not None else 0.0,
+    }
+
+
+class InboxWorker:
+    """Background drain loop; notify() wakes it as soon as a delivery lands"""
+
+    def __init__(self, batch_size: int = WEBHOOK_BATCH_SIZE, poll_seconds: float = WEBHOOK_POLL_SECONDS):
+        self.batch_size = batch_size
+        self.poll_seconds = poll_seconds
+        self.on_applied = None
+        self._wakeup = None
+        self.batches = 0
+        self.processed = 0
+        self.dead = 0
+        self.last_batch_ms = 0.0
+        self._last_prune = 0.0
+
+    def notify(self):
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def drain(self) -> int:
+        """Process batches until the inbox has no pending rows; returns rows applied"""
+        executor = get_executor()
+        total = 0
+        while True:
+            started = time.perf_counter()
+            result = await executor.run_with_connection(process_inbox_batch, self.batch_size)
+            handled = result["processed"] + result["dead"] + result["retried"]
+            if handled:
+                self.batches += 1
+                self.processed += result["processed"]
+                self.dead += result["dead"]
+                self.last_batch_ms = round((time.perf_counter() - started) * 1000, 2)
+                if self.on_applied is not None:
+                    for agent_id in result["agents"]:
+                        self.on_applied(agent_id)
+            total += result["processed"]
+            if handled < self.batch_size or result["retried"] == handled:
+                return total
+
+    async def run_forever(self):
+        self._wakeup = asyncio.Event()
+        while True:
+            try:
+                await self.drain()
+                if time.monotonic() - self._last_prune > 3600:
+                    self._last_prune = time.monotonic()
+                    await get_executor().run_with_connection(prune_inbox)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Webhook inbox worker failed: {str(e)}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "processed": self.processed,
+            "dead": self.dead,
+            "last_batch_ms": self.last_batch_ms,
+            "batch_size": self.batch_size,
+        }
@@ -0,0 +1,50 @@
+import time
+from datetime import datetime, timedelta
+
+import jwt
+
+from app.token_cache import TokenCache
+
+# Micro-benchmark of the per-request auth dependency overhead
+SECRET_KEY = "benchmark-secret-key-for-hs256-tokens"
+ALGORITHM = "HS256"
+ITERATIONS = 50000
+
+def decode_uncached(token):
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    return payload.get("sub")
+
+def decode_cached(token, cache):
+    # Same steps as verify_token in app/main.py
+    agent_id = cache.get(token)
+    if agent_id is not None:
+        return agent_id
+    payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    agent_id = payload.get("sub")
+    cache.put(token, agent_id, payload["exp"])
+    return agent_id
+
+def timed(label, fn):
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        fn()
+    elapsed = time.perf_counter() - started
+    per_call = elapsed / ITERATIONS * 1_000_000
+    print(f"{label:<28} {per_call:8.2f} µs/call  {ITERATIONS / elapsed:12,.0f} calls/s")
+    return per_call
+
+def bench_auth():
+    token = jwt.encode(
+        {"sub": "42", "exp": datetime.utcnow() + timedelta(hours=1)},
+        SECRET_KEY, algorithm=ALGORITHM
+    )
+    cache = TokenCache()
+
+    print(f"Auth dependency overhead over {ITERATIONS:,} calls")
+    uncached = timed("jwt.decode every request", lambda: decode_uncached(token))
+    cached = timed("decoded-token cache", lambda: decode_cached(token, cache))
+    print(f"Speedup: {uncached / cached:.1f}x")
+    print(f"Cache stats: {cache.stats()}")
+
+if __name__ == "__main__":
+    bench_auth()
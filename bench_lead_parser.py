@@ -0,0 +1,93 @@
+import sys
+import time
+import random
+import asyncio
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from app.lead_parser import PARSE_WORKERS, parse_messages, parse_messages_async, shutdown_parse_executor
+
+# Lead-email parsing throughput over a synthetic corpus of listing-site
+# notifications and direct emails, inline and across the process pool.
+#
+#   python bench_lead_parser.py [messages]
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+# Sustained rate the batch endpoint must reach, per pool worker (the pool
+# scales with LEADFLOW_PARSE_WORKERS, capped at the CPU count)
+TARGET_PER_WORKER = 2_500
+TARGET_MESSAGES_PER_SECOND = TARGET_PER_WORKER * PARSE_WORKERS
+
+FIRST = ["Sarah", "Mike", "Jennifer", "Wei", "Aisha", "Carlos", "Olga", "Priya", "Noah", "Fatima"]
+LAST = ["Johnson", "Chen", "Lopez", "Okafor", "Rossi", "Novak", "Kim", "Patel", "Silva", "Haddad"]
+STREETS = ["Broadway", "Columbus Ave", "Elm Street", "W 86th St", "Bedford Avenue", "Atlantic Ave", "Park Place"]
+FILLER = ("I have excellent credit and can provide references from my current landlord. "
+          "Is parking available, and are pets allowed in the building? ") * 3
+
+def listing(rng):
+    return f"{rng.randint(1, 999)} {rng.choice(STREETS)}", f"{rng.randint(1, 12)}{rng.choice('ABCDEF')}"
+
+def streeteasy(rng, first, last, email, phone, address, unit):
+    return ("StreetEasy <noreply@streeteasy.com>", f"StreetEasy Inquiry: {address} #{unit} - $4,200/month",
+            f"From: {first} {last} <{email}>\nProperty: {address} #{unit}\nRent: $4,200/month\n\n"
+            f"Hi there,\n\nI'm looking for a place starting December 1st and my budget is up to $4,500 per month. {FILLER}\n\n"
+            f"You can reach me at {phone}.\n\nBest regards,\n{first} {last}")
+
+def zillow(rng, first, last, email, phone, address, unit):
+    return ("Zillow Rentals <rentals@mail.zillow.com>", f"{first} {last} is requesting information about {address} #{unit}",
+            f"New Contact: {first} {last}\nEmail: {email}\nPhone: {phone}\nMove-in date: March 1\n\n"
+            f"Message:\nIs this unit still available? Can I schedule a tour this weekend?\n\n{FILLER}\n\nZillow Group, Seattle WA")
+
+def apartments(rng, first, last, email, phone, address, unit):
+    return ("Apartments.com <leads@apartments.com>", f"New lead for {address}",
+            f"Name: {first} {last}\nEmail: {email}\nPhone: {phone}\nMove Date: 04/15/2027\nProperty: {address}, Unit {unit}\n\n"
+            f"Comments:\nInterested in a viewing, budget around $3,800.\n\n{FILLER}")
+
+def direct(rng, first, last, email, phone, address, unit):
+    return (f"{first} {last} <{email}>", f"Inquiry about your rental at {address}",
+            f"Hello,\n\nThis is {first} {last}. I saw your listing for {address}, Apt {unit} and need to move ASAP. "
+            f"My budget is $5,000-5,500/month. {FILLER}\n\nPlease call me at {phone}.\n\nThanks,\n{first}")
+
+def corpus(count, seed=11):
+    rng = random.Random(seed)
+    makers = [streeteasy, zillow, apartments, direct]
+    messages = []
+    for i in range(count):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        email = f"{first.lower()}.{last.lower()}{i}@example.com"
+        phone = f"({rng.randint(201, 989)}) 555-{rng.randint(1000, 9999)}"
+        sender, subject, body = rng.choice(makers)(rng, first, last, email, phone, *listing(rng))
+        message = EmailMessage()
+        message["From"] = sender
+        message["To"] = "agent@leadflow.example"
+        message["Subject"] = subject
+        message["Date"] = formatdate(localtime=False)
+        message["Message-ID"] = make_msgid(domain="bench.example")
+        message.set_content(body)
+        messages.append(message.as_string())
+    return messages
+
+def timed(label, fn, count):
+    started = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - started
+    rate = count / elapsed
+    print(f"{label:<30} {elapsed * 1000:9.1f} ms  {rate:10,.0f} msgs/s")
+    return rate, results
+
+def bench_lead_parser():
+    messages = corpus(MESSAGES)
+    print(f"Parsing {MESSAGES:,} messages ({sum(map(len, messages)) / MESSAGES:,.0f} bytes avg)")
+    timed("inline, one process", lambda: parse_messages(messages), MESSAGES)
+    # Warm the pool so process start-up is not billed to the batch
+    asyncio.run(parse_messages_async(messages[:PARSE_WORKERS * 256]))
+    rate, results = timed(f"process pool ({PARSE_WORKERS} workers)", lambda: asyncio.run(parse_messages_async(messages)), MESSAGES)
+    shutdown_parse_executor()
+
+    failed = sum(1 for lead in results if "error" in lead)
+    matched = sum(1 for lead in results if lead.get("property_address") and lead.get("property_unit") and lead.get("prospect_phone"))
+    print(f"Failed: {failed}  with address, unit and phone: {matched / MESSAGES:.1%}")
+    print(f"{'✅' if rate >= TARGET_MESSAGES_PER_SECOND else '❌'} target {TARGET_MESSAGES_PER_SECOND:,} msgs/s")
+    return rate >= TARGET_MESSAGES_PER_SECOND
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bench_lead_parser() else 1)
@@ -0,0 +1,95 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import tempfile
+
+from fastapi.encoders import jsonable_encoder
+
+from app.migrations import run_migrations
+from app.serialization import fetch_dicts, dumps, compress, orjson, brotli
+
+# Row fetch + serialization cost of GET /api/inquiries for one large agent:
+# the old sqlite3.Row / per-row dict / jsonable_encoder / json.dumps path
+# against fetch_dicts + orjson, plus what compression adds on top.
+#
+#   python bench_list_serialization.py [inquiries]
+INQUIRIES = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+ROUNDS = 5
+
+QUERY = """
+    SELECT i.id, i.prospect_name, i.prospect_email, i.prospect_phone, i.message,
+           i.source, i.status, i.created_at,
+           p.address AS property_address, p.unit AS property_unit
+    FROM agent_inquiries i
+    LEFT JOIN agent_properties p ON i.property_id = p.id
+    WHERE i.agent_id = ?
+    ORDER BY i.created_at DESC, i.id DESC
+"""
+
+def old_path(conn):
+    # What get_inquiries did before: Row objects, a dict per row built by
+    # name, then FastAPI's encoder walk and JSONResponse's json.dumps
+    conn.row_factory = sqlite3.Row
+    rows = conn.execute("""
+        SELECT i.*, p.address, p.unit
+        FROM agent_inquiries i
+        LEFT JOIN agent_properties p ON i.property_id = p.id
+        WHERE i.agent_id = ?
+        ORDER BY i.created_at DESC, i.id DESC
+    """, (1,)).fetchall()
+    inquiries = []
+    for row in rows:
+        inquiries.append({
+            "id": row["id"],
+            "prospect_name": row["prospect_name"],
+            "prospect_email": row["prospect_email"],
+            "prospect_phone": row["prospect_phone"],
+            "message": row["message"],
+            "source": row["source"],
+            "status": row["status"],
+            "created_at": row["created_at"],
+            "property_address": row["address"],
+            "property_unit": row["unit"]
+        })
+    content = jsonable_encoder({"success": True, "inquiries": inquiries})
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+def new_path(conn):
+    return dumps({"success": True, "inquiries": fetch_dicts(QUERY, (1,), conn=conn)})
+
+def timed(label, fn):
+    best = float("inf")
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34} {best * 1000:9.1f} ms  {INQUIRIES / best:12,.0f} rows/s  {len(body) / 1e6:7.2f} MB")
+    return best, body
+
+def bench_list_serialization():
+    conn = sqlite3.connect(os.path.join(tempfile.mkdtemp(), "serialization.db"))
+    run_migrations(conn)
+    conn.execute("INSERT INTO agent_properties (agent_id, address, unit) VALUES (1, '100 Harbor Way', '4B')")
+    conn.executemany(
+        "INSERT INTO agent_inquiries (agent_id, property_id, prospect_name, prospect_email, prospect_phone, message, source, status) VALUES (1, 1, ?, ?, ?, ?, 'email', 'new')",
+        [(f"Prospect {i}", f"prospect{i}@example.com", f"555-{i % 1000:03d}-{i % 10000:04d}",
+          "Is the unit still available? I would like to schedule a tour this weekend.") for i in range(INQUIRIES)]
+    )
+    conn.commit()
+
+    print(f"GET /api/inquiries body for {INQUIRIES:,} rows (best of {ROUNDS}), orjson={'yes' if orjson else 'no'}")
+    old, _ = timed("Row + dict + jsonable_encoder", lambda: old_path(conn))
+    new, body = timed("tuples + fetch_dicts + dumps", lambda: new_path(conn))
+    print(f"Speedup: {old / new:.1f}x")
+
+    for encoding in ("gzip", "br") if brotli else ("gzip",):
+        started = time.perf_counter()
+        compressed = compress(body, encoding)
+        elapsed = time.perf_counter() - started
+        print(f"{'+ ' + encoding:<34} {elapsed * 1000:9.1f} ms  {len(compressed) / 1e6:27.2f} MB")
+    conn.close()
+
+if __name__ == "__main__":
+    bench_list_serialization()
@@ -0,0 +1,103 @@
+import os
+import sys
+import time
+import random
+import asyncio
+import tempfile
+
+# Module settings are read at import, so point them at scratch space first
+WORKDIR = tempfile.mkdtemp()
+os.environ["LEADFLOW_DATABASE_PATH"] = os.path.join(WORKDIR, "scan.db")
+os.environ["LEADFLOW_MAILBOX_ROOT"] = WORKDIR
+
+from app.db import get_executor, get_pool, close_pool
+from app.migrations import ensure_schema
+from app.mailbox import save_mailbox, scan_mailbox
+from app.lead_parser import shutdown_parse_executor
+from bench_lead_parser import FIRST, LAST, listing, streeteasy, zillow, apartments, direct
+
+# Incremental mailbox scans over a local mbox and Maildir.
+#
+#   python bench_mailbox_scan.py [messages]
+#
+# The first scan ingests the whole mailbox; rescanning it unchanged must
+# finish within RESCAN_TARGET_MS; after new mail arrives, only the new
+# messages are read.
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+NEW_MESSAGES = 100
+RESCAN_TARGET_MS = 50
+
+def raw_messages(start, count, seed):
+    rng = random.Random(seed)
+    makers = [streeteasy, zillow, apartments, direct]
+    for i in range(start, start + count):
+        first, last = rng.choice(FIRST), rng.choice(LAST)
+        email = f"{first.lower()}.{last.lower()}{i}@example.com"
+        phone = f"({rng.randint(201, 989)}) 555-{rng.randint(1000, 9999)}"
+        sender, subject, body = rng.choice(makers)(rng, first, last, email, phone, *listing(rng))
+        yield (f"From: {sender}\nTo: agent@leadflow.example\nSubject: {subject}\n"
+               f"Message-ID: <{i}.{seed}@bench.example>\nContent-Type: text/plain; charset=utf-8\n\n{body}\n")
+
+def append_mbox(path, start, count):
+    with open(path, "a", encoding="utf-8") as f:
+        for raw in raw_messages(start, count, seed=1):
+            f.write(f"From bench@example.com Mon Jan  4 09:00:00 2027\n{raw}\n")
+
+def deliver_maildir(path, start, count):
+    for sub in ("tmp", "new", "cur"):
+        os.makedirs(os.path.join(path, sub), exist_ok=True)
+    for i, raw in enumerate(raw_messages(start, count, seed=2), start):
+        with open(os.path.join(path, "new", f"{i}.bench.example"), "w", encoding="utf-8") as f:
+            f.write(raw)
+
+async def timed_scan(label, agent_id):
+    started = time.perf_counter()
+    result = await scan_mailbox(agent_id, max_messages=MESSAGES * 2)
+    elapsed = (time.perf_counter() - started) * 1000
+    rate = f"{result['scanned'] / elapsed * 1000:10,.0f} msgs/s" if result["scanned"] else ""
+    print(f"{label:<34} {elapsed:10.1f} ms  scanned {result['scanned']:>7,}  created {result['created']:>7,}  "
+          f"linked {result['linked']:>6,}  {rate}")
+    return elapsed, result
+
+async def bench_source(kind, agent_id, deliver):
+    path = os.path.join(WORKDIR, kind)
+    deliver(path, 0, MESSAGES)
+    await get_executor().run_with_connection(save_mailbox, agent_id, {
+        "kind": kind, "location": kind, "username": None, "password": None, "folder": None
+    })
+    _, first = await timed_scan(f"{kind}: first scan", agent_id)
+    if kind == "maildir":
+        # A Maildir folder only counts as settled a second after its last delivery
+        await asyncio.sleep(1.1)
+        await timed_scan(f"{kind}: settle", agent_id)
+    rescan_ms, rescan = await timed_scan(f"{kind}: rescan, unchanged", agent_id)
+    deliver(path, MESSAGES, NEW_MESSAGES)
+    _, incremental = await timed_scan(f"{kind}: rescan, {NEW_MESSAGES} new", agent_id)
+
+    # Repeat prospects (the generator reuses names and phone numbers) are stored as linked
+    ok = first["created"] + first["linked"] == MESSAGES and rescan["scanned"] == 0
+    ok = ok and incremental["created"] + incremental["linked"] == NEW_MESSAGES
+    ok = ok and rescan_ms <= RESCAN_TARGET_MS
+    print(f"{'✅' if ok else '❌'} {kind}: unchanged rescan {rescan_ms:.1f} ms (target {RESCAN_TARGET_MS} ms), "
+          f"{incremental['scanned']} read after new mail")
+    return ok
+
+def bench_mailbox_scan():
+    with get_pool().connection() as conn:
+        ensure_schema(conn)
+        for agent_id in (1, 2):
+            conn.execute(
+                "INSERT INTO agents (id, email, first_name, last_name, company, password_hash) VALUES (?, ?, 'Bench', 'Agent', 'Bench', 'x')",
+                (agent_id, f"agent{agent_id}@bench.example")
+            )
+        conn.commit()
+
+    print(f"Scanning {MESSAGES:,} messages per mailbox")
+    ok = asyncio.run(bench_source("mbox", 1, lambda path, start, count: append_mbox(path, start, count)))
+    ok = asyncio.run(bench_source("maildir", 2, deliver_maildir)) and ok
+    shutdown_parse_executor()
+    close_pool()
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bench_mailbox_scan() else 1)
@@ -0,0 +1,181 @@
+import os
+import sys
+import time
+import socket
+import asyncio
+import tempfile
+import threading
+
+# Module settings are read at import, so point them at the sink first
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+SINK_PORT = free_port()
+os.environ.update({
+    "LEADFLOW_DATABASE_PATH": os.path.join(tempfile.mkdtemp(), "outbound.db"),
+    "LEADFLOW_SMTP_HOST": "127.0.0.1",
+    "LEADFLOW_SMTP_PORT": str(SINK_PORT),
+    "LEADFLOW_SMTP_SECURITY": "none",
+    "LEADFLOW_MAIL_FROM": "replies@leadflow.example",
+    "LEADFLOW_MAIL_POLL_SECONDS": "0.05",
+    "LEADFLOW_MAIL_RETRY_BASE_SECONDS": "0.05",
+})
+
+from app.db import get_pool, close_pool
+from app.migrations import ensure_schema
+from app.dispatcher import MailDispatcher, enqueue_replies, outbound_depth
+
+# Outbound mail dispatch against a local SMTP sink.
+#
+#   python bench_outbound_mail.py [messages]
+#
+# The sink speaks just enough SMTP (with PIPELINING) to accept mail. It
+# refuses "bounce" recipients for good (550) and turns away each "flaky"
+# recipient once (451), so the dead-letter and retry paths run too.
+MESSAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000
+BOUNCES = 5
+FLAKY = 20
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "proton.me", "aol.com", "hey.com", "fastmail.com"]
+TARGET_MESSAGES_PER_SECOND = 500
+
+
+class SmtpSink:
+    def __init__(self):
+        self.connections = 0
+        self.delivered = []
+        self._flaky_seen = set()
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        writer.write(b"220 sink ESMTP\r\n")
+        recipient = None
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            command = line.decode("ascii", errors="replace").strip()
+            verb = command[:4].upper()
+            if verb in ("EHLO", "HELO"):
+                writer.write(b"250-sink\r\n250-PIPELINING\r\n250 8BITMIME\r\n")
+            elif verb == "MAIL":
+                recipient = None
+                writer.write(b"250 OK\r\n")
+            elif verb == "RCPT":
+                address = command.split("<", 1)[1].rstrip(">")
+                if address.startswith("bounce"):
+                    writer.write(b"550 No such user\r\n")
+                elif address.startswith("flaky") and address not in self._flaky_seen:
+                    self._flaky_seen.add(address)
+                    writer.write(b"451 Try again later\r\n")
+                else:
+                    recipient = address
+                    writer.write(b"250 OK\r\n")
+            elif verb == "DATA":
+                if recipient is None:
+                    writer.write(b"554 No valid recipients\r\n")
+                    continue
+                writer.write(b"354 Go ahead\r\n")
+                await writer.drain()
+                size = 0
+                while True:
+                    data = await reader.readline()
+                    if data in (b".\r\n", b""):
+                        break
+                    size += len(data)
+                self.delivered.append((recipient, size))
+                writer.write(b"250 Queued\r\n")
+            elif verb == "QUIT":
+                writer.write(b"221 Bye\r\n")
+                await writer.drain()
+                break
+            else:
+                # RSET, NOOP
+                writer.write(b"250 OK\r\n")
+            await writer.drain()
+        writer.close()
+
+    def start(self):
+        ready = threading.Event()
+
+        def serve():
+            loop = asyncio.new_event_loop()
+            loop.run_until_complete(asyncio.start_server(self.handle, "127.0.0.1", SINK_PORT))
+            ready.set()
+            loop.run_forever()
+
+        threading.Thread(target=serve, daemon=True).start()
+        ready.wait()
+
+
+def seed(conn):
+    ensure_schema(conn)
+    conn.execute("INSERT INTO agents (id, email, first_name, last_name, company, password_hash) VALUES (1, 'agent@bench.example', 'Bench', 'Agent', 'Bench', 'x')")
+    conn.execute("INSERT INTO agent_properties (id, agent_id, address, unit) VALUES (1, 1, '1 Bench St', '1A')")
+    rows = []
+    for i in range(MESSAGES):
+        local = "bounce" if i < BOUNCES else "flaky" if i < BOUNCES + FLAKY else "prospect"
+        rows.append((i + 1, f"Prospect {i}", f"{local}{i}@{DOMAINS[i % len(DOMAINS)]}"))
+    conn.executemany(
+        "INSERT INTO agent_inquiries (id, agent_id, property_id, prospect_name, prospect_email, status) VALUES (?, 1, 1, ?, ?, 'new')",
+        rows
+    )
+    conn.commit()
+
+
+async def dispatch(dispatcher):
+    task = asyncio.create_task(dispatcher.run_forever())
+    started = time.perf_counter()
+    while True:
+        await asyncio.sleep(0.05)
+        with get_pool().connection() as conn:
+            depth = outbound_depth(conn=conn)
+        if depth["pending"] == 0 and depth["sending"] == 0:
+            break
+    elapsed = time.perf_counter() - started
+    task.cancel()
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    return elapsed, depth
+
+
+def bench_outbound_mail():
+    sink = SmtpSink()
+    sink.start()
+    with get_pool().connection() as conn:
+        seed(conn)
+        items = [{"id": i + 1, "subject": "1 Bench St #1A", "finalContent": f"Hi Prospect {i},\n\nThanks for reaching out.\n"} for i in range(MESSAGES)]
+        started = time.perf_counter()
+        results = enqueue_replies(1, items, conn=conn)
+        enqueue_ms = (time.perf_counter() - started) * 1000
+    queued = sum(1 for result in results if result["status"] == "queued")
+    print(f"Queued {queued:,} replies in {enqueue_ms:.1f} ms (what POST /api/automation/send waits for)")
+
+    dispatcher = MailDispatcher()
+    elapsed, depth = asyncio.run(dispatch(dispatcher))
+    stats = dispatcher.stats()
+    with get_pool().connection() as conn:
+        tracked = conn.execute("SELECT COUNT(*) FROM email_automation_tracking").fetchone()[0]
+        contacted = conn.execute("SELECT COUNT(*) FROM agent_inquiries WHERE status = 'contacted'").fetchone()[0]
+    close_pool()
+
+    rate = stats["sent"] / elapsed
+    latency = stats["queue_latency_ms"]
+    print(f"Sent {stats['sent']:,} in {elapsed * 1000:.1f} ms  {rate:,.0f} msgs/s over {sink.connections} SMTP connections "
+          f"({stats['workers']} workers, {stats['domain_concurrency']} per domain)")
+    print(f"Queue latency (last 1,000 sends) p50 {latency['p50']} ms  p95 {latency['p95']} ms  max {latency['max']:.1f} ms")
+    print(f"Retried {stats['retried']}  dead {depth['dead']}  tracking rows {tracked:,}  inquiries contacted {contacted:,}")
+
+    expected = MESSAGES - BOUNCES
+    ok = len(sink.delivered) == expected and tracked == expected and contacted == expected
+    ok = ok and depth["dead"] == BOUNCES and stats["retried"] == FLAKY
+    if not ok:
+        print(f"❌ expected {expected} delivered and tracked, {BOUNCES} dead, {FLAKY} retried; sink got {len(sink.delivered)}")
+    print(f"{'✅' if rate >= TARGET_MESSAGES_PER_SECOND else '❌'} target {TARGET_MESSAGES_PER_SECOND:,} msgs/s")
+    return ok and rate >= TARGET_MESSAGES_PER_SECOND
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bench_outbound_mail() else 1)
@@ -0,0 +1,145 @@
+import sys
+import time
+import random
+import sqlite3
+
+from app.migrations import run_migrations
+from app.leads import ingest_leads
+from app.prospects import backfill_prospects
+from app.stats import compute_agent_stats
+
+# Prospect de-duplication on inquiry ingest, and the history backfill.
+#
+#   python bench_prospect_dedup.py [leads] [prospects]
+#
+# Each prospect writes in several times, from different portals and with
+# the email / phone spelled differently (case, plus-tags, gmail dots,
+# phone formats). Ingest must keep up with TARGET_LEADS_PER_SECOND and
+# stay flat as the history grows: the last batches may cost at most
+# MAX_SLOWDOWN times the first ones.
+LEADS = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+PROSPECTS = int(sys.argv[2]) if len(sys.argv) > 2 else 15_000
+BATCH = 500
+TARGET_LEADS_PER_SECOND = 5_000
+MAX_SLOWDOWN = 1.5
+
+FIRST = ["Sarah", "Mike", "Jennifer", "Wei", "Aisha", "Carlos", "Olga", "Priya", "Noah", "Fatima"]
+LAST = ["Johnson", "Chen", "Lopez", "Okafor", "Rossi", "Novak", "Kim", "Patel", "Silva", "Haddad"]
+SOURCES = ["streeteasy", "zillow", "apartments", "direct"]
+
+def prospect(i, rng):
+    first, last = rng.choice(FIRST), rng.choice(LAST)
+    domain = "gmail.com" if i % 2 else "example.com"
+    return first, last, f"{first.lower()}.{last.lower()}{i}", domain, f"{rng.randint(201, 989)}{i % 10_000_000:07d}"
+
+def spelled(person, rng):
+    """The same prospect as one of the portals might report them"""
+    first, last, local, domain, digits = person
+    email = local
+    if domain == "gmail.com" and rng.random() < 0.5:
+        email = email.replace(".", "")
+    if rng.random() < 0.3:
+        email += f"+{rng.choice(SOURCES)}"
+    email = f"{email}@{domain}"
+    if rng.random() < 0.3:
+        email = email.upper() if rng.random() < 0.5 else email.title()
+    phone = rng.choice([f"({digits[:3]}) {digits[3:6]}-{digits[6:]}", f"+1 {digits[:3]} {digits[3:6]} {digits[6:]}",
+                        f"1-{digits[:3]}-{digits[3:6]}-{digits[6:]}", digits])
+    lead = {"prospect_name": f"{first} {last}", "source": rng.choice(SOURCES), "message": "Is this still available?",
+            "property_address": f"{rng.randint(1, 50)} Broadway", "property_unit": "1A"}
+    # Some portals pass only one of the two along
+    roll = rng.random()
+    if roll < 0.8:
+        lead.update(prospect_email=email, prospect_phone=phone)
+    elif roll < 0.9:
+        lead["prospect_email"] = email
+    else:
+        lead["prospect_phone"] = phone
+    return lead
+
+def workload(rng):
+    people = [prospect(i, rng) for i in range(PROSPECTS)]
+    # Everyone writes at least once, in the first pass; the rest are repeats
+    order = list(range(PROSPECTS)) + [rng.randrange(PROSPECTS) for _ in range(LEADS - PROSPECTS)]
+    rng.shuffle(order)
+    leads = [spelled(people[i], rng) for i in order]
+    # Expected outcome from who actually wrote each lead: a lead links once
+    # an earlier one from the same person shared its email or its phone
+    seen = set()
+    expected_created = 0
+    for i, lead in zip(order, leads):
+        keys = {(i, kind) for kind in ("prospect_email", "prospect_phone") if kind in lead}
+        expected_created += not (keys & seen)
+        seen |= keys
+    return leads, expected_created
+
+def seed(conn):
+    run_migrations(conn)
+    for agent_id in (1, 2):
+        conn.execute(
+            "INSERT INTO agents (id, email, first_name, last_name, company, password_hash) VALUES (?, ?, 'Bench', 'Agent', 'Bench', 'x')",
+            (agent_id, f"agent{agent_id}@bench.example")
+        )
+    conn.executemany(
+        "INSERT INTO agent_properties (agent_id, address, unit) VALUES (1, ?, '1A')",
+        [(f"{i} Broadway",) for i in range(1, 51)]
+    )
+    conn.commit()
+
+def bench_ingest(conn, leads, expected):
+    timings = []
+    results = []
+    started = time.perf_counter()
+    for start in range(0, len(leads), BATCH):
+        batch_started = time.perf_counter()
+        results.extend(ingest_leads(1, leads[start:start + BATCH], conn=conn))
+        timings.append(time.perf_counter() - batch_started)
+    elapsed = time.perf_counter() - started
+    created = sum(1 for r in results if r["status"] == "created")
+    linked = sum(1 for r in results if r["status"] == "linked")
+    rate = len(leads) / elapsed
+    edge = max(len(timings) // 10, 1)
+    slowdown = (sum(timings[-edge:]) / edge) / (sum(timings[:edge]) / edge)
+    print(f"ingest {len(leads):,} leads                {elapsed * 1000:9.1f} ms  {rate:10,.0f} leads/s")
+    print(f"  created {created:,}  linked {linked:,}  last/first batch cost {slowdown:.2f}x")
+    stats = compute_agent_stats(1, conn=conn)
+    ok = created == expected and linked == LEADS - expected and stats["total_inquiries"] == expected
+    if not ok:
+        print(f"❌ expected {expected:,} created and {LEADS - expected:,} linked; total_inquiries {stats['total_inquiries']:,}")
+    return ok, rate, slowdown
+
+def bench_backfill(conn, leads, expected):
+    # The same traffic as history from before de-duplication, spread over ten days
+    conn.executemany("""
+        INSERT INTO agent_inquiries (agent_id, prospect_name, prospect_email, prospect_phone, source, status, created_at)
+        VALUES (2, ?, ?, ?, ?, 'new', datetime('2026-01-01', ?))
+    """, [(lead["prospect_name"], lead.get("prospect_email"), lead.get("prospect_phone"), lead["source"],
+           f"+{i * 864 // len(leads)} seconds") for i, lead in enumerate(leads)])
+    conn.commit()
+    started = time.perf_counter()
+    totals = {}
+    for totals in backfill_prospects(2, conn=conn):
+        pass
+    elapsed = time.perf_counter() - started
+    print(f"backfill {totals['scanned']:,} inquiries            {elapsed * 1000:9.1f} ms  {totals['scanned'] / elapsed:10,.0f} rows/s")
+    print(f"  primary {totals['primary']:,}  duplicates {totals['duplicates']:,}")
+    again = list(backfill_prospects(2, conn=conn))
+    ok = totals["primary"] == expected and totals["duplicates"] == LEADS - expected and not again
+    if not ok:
+        print(f"❌ expected {expected:,} primary and {LEADS - expected:,} duplicates, and nothing left for a rerun")
+    return ok
+
+def bench_prospect_dedup():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    seed(conn)
+    leads, expected = workload(random.Random(5))
+    print(f"{LEADS:,} leads from {PROSPECTS:,} prospects ({expected:,} distinct as far as their contact details show)")
+    ok, rate, slowdown = bench_ingest(conn, leads, expected)
+    ok = bench_backfill(conn, leads, expected) and ok
+    ok = ok and rate >= TARGET_LEADS_PER_SECOND and slowdown <= MAX_SLOWDOWN
+    print(f"{'✅' if ok else '❌'} target {TARGET_LEADS_PER_SECOND:,} leads/s, at most {MAX_SLOWDOWN}x slower as history grows")
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bench_prospect_dedup() else 1)
@@ -0,0 +1,81 @@
+import sys
+import time
+import random
+import sqlite3
+
+from app.migrations import run_migrations
+from app.replies import DEFAULT_TEMPLATE, render_replies, save_template, template_cache
+
+# Batch auto-reply rendering for a campaign.
+#
+#   python bench_reply_render.py [recipients] [properties]
+#
+# Recipients are inquiries spread over the agent's properties; a quarter of
+# the properties have their own template, the rest use the agent default.
+# The baseline compiles the template for every reply, which is what
+# rendering without the cache costs.
+RECIPIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+PROPERTIES = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+TARGET_RENDERS_PER_SECOND = 20_000
+
+STREETS = ["Broadway", "Columbus Ave", "Elm Street", "W 86th St", "Bedford Avenue", "Atlantic Ave", "Park Place"]
+FIRST = ["Sarah", "Mike", "Jennifer", "Wei", "Aisha", "Carlos", "Olga", "Priya", "Noah", "Fatima"]
+
+def seed(conn, rng):
+    run_migrations(conn)
+    conn.execute("INSERT INTO agents (id, email, first_name, last_name, company, password_hash) VALUES (1, 'agent@bench.example', 'Nicholas', 'Pagano', 'Besen Partners', 'x')")
+    conn.executemany("""
+        INSERT INTO agent_properties (id, agent_id, address, unit, rent, bedrooms, bathrooms, availability_date, acuity_id)
+        VALUES (?, 1, ?, ?, ?, ?, 1, ?, ?)
+    """, [
+        (i, f"{rng.randint(1, 999)} {rng.choice(STREETS)}", f"{rng.randint(1, 12)}{rng.choice('ABCD')}",
+         rng.randint(20, 90) * 100, rng.randint(0, 4), f"2027-{rng.randint(1, 12):02d}-01",
+         str(81000000 + i) if rng.random() < 0.8 else None)
+        for i in range(1, PROPERTIES + 1)
+    ])
+    conn.executemany(
+        "INSERT INTO agent_inquiries (id, agent_id, property_id, prospect_name, prospect_email) VALUES (?, 1, ?, ?, ?)",
+        [(i, rng.randint(1, PROPERTIES), f"{rng.choice(FIRST)} Tenant", f"tenant{i}@example.com") for i in range(1, RECIPIENTS + 1)]
+    )
+    conn.commit()
+    save_template(1, None, "Re: {{ property.label }}", DEFAULT_TEMPLATE["body"], conn=conn)
+    for property_id in range(1, PROPERTIES + 1, 4):
+        save_template(1, property_id, "{{ property.label }} - tour times",
+                      "Hi {{ prospect.first_name or 'there' }}, {{ property.label }} rents for {{ property.rent }}.\n"
+                      "{% if property.booking_url %}Book: {{ property.booking_url }}{% endif %}\n{{ agent.name }}", conn=conn)
+
+def timed(label, fn):
+    started = time.perf_counter()
+    results = fn()
+    elapsed = time.perf_counter() - started
+    rate = RECIPIENTS / elapsed
+    print(f"{label:<36} {elapsed * 1000:9.1f} ms  {rate:10,.0f} renders/s")
+    return rate, results
+
+def uncached(conn, recipients):
+    # Same renders with every reply compiling its template afresh
+    real_get = template_cache.get
+    template_cache.get = lambda key, subject, body: template_cache.compile(subject, body)
+    try:
+        return render_replies(1, recipients, conn=conn)
+    finally:
+        template_cache.get = real_get
+
+def bench_reply_render():
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    seed(conn, random.Random(7))
+    recipients = [{"inquiry_id": i} for i in range(1, RECIPIENTS + 1)]
+    print(f"Rendering {RECIPIENTS:,} replies over {PROPERTIES:,} properties")
+
+    timed("compile per reply (no cache)", lambda: uncached(conn, recipients))
+    timed("first batch (compiles once each)", lambda: render_replies(1, recipients, conn=conn))
+    rate, results = timed("warm cache", lambda: render_replies(1, recipients, conn=conn))
+
+    failed = sum(1 for result in results if "error" in result)
+    print(f"Failed: {failed}  cache: {template_cache.stats()}")
+    print(f"{'✅' if rate >= TARGET_RENDERS_PER_SECOND and not failed else '❌'} target {TARGET_RENDERS_PER_SECOND:,} renders/s")
+    return rate >= TARGET_RENDERS_PER_SECOND and not failed
+
+if __name__ == "__main__":
+    raise SystemExit(0 if bench_reply_render() else 1)
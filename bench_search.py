@@ -0,0 +1,108 @@
+import os
+import sys
+import time
+import random
+import sqlite3
+import tempfile
+
+from app.migrations import run_migrations
+from app.search import SEARCH_SCAN_MAX_ROWS, search_inquiries, rebuild_search_index
+
+# search_inquiries vs LIKE scans over a synthetic inquiry table.
+#
+#   python bench_search.py [inquiries] [agents]      (e.g. 1000000 1000 at full scale)
+#
+# Agent 1 is a large brokerage holding LARGE_AGENT_SHARE of all inquiries
+# and is served by FTS5; the rest are spread evenly, small enough to be
+# scanned (SEARCH_SCAN_MAX_ROWS), so both search paths show up.
+INQUIRIES = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+AGENTS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+LARGE_AGENT_SHARE = 0.1
+QUERIES = 100
+
+FIRST_NAMES = ["john", "maria", "wei", "aisha", "carlos", "olga", "liam", "priya", "noah", "fatima", "kenji", "sofia"]
+LAST_NAMES = ["smith", "garcia", "chen", "okafor", "rossi", "novak", "kim", "patel", "muller", "silva", "haddad", "brown"]
+DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "icloud.com", "proton.me"]
+WORDS = ("is the unit still available can i schedule a tour this weekend does it allow pets "
+         "what is the parking situation laundry in building utilities included move in date "
+         "looking for a two bedroom near transit with a balcony and dishwasher").split()
+
+def inquiry(i, rng):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    return (
+        1 if rng.random() < LARGE_AGENT_SHARE else rng.randint(2, AGENTS),
+        f"{first.title()} {last.title()}",
+        f"{first}.{last}{i}@{rng.choice(DOMAINS)}",
+        f"555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        " ".join(rng.choice(WORDS) for _ in range(rng.randint(8, 30))),
+    )
+
+def timed_queries(fn, cases):
+    started = time.perf_counter()
+    for agent_id, q in cases:
+        fn(agent_id, q)
+    return (time.perf_counter() - started) / len(cases) * 1000
+
+def like_search(conn, agent_id, q):
+    # What an agent-scoped search looks like without the FTS index. Ranking
+    # needs every match, so there is no LIMIT to stop the scan early.
+    clauses = []
+    params = [agent_id]
+    for term in q.split():
+        clauses.append("(prospect_name LIKE ? OR prospect_email LIKE ? OR prospect_phone LIKE ? OR message LIKE ?)")
+        params.extend([f"%{term}%"] * 4)
+    return conn.execute(
+        f"SELECT id FROM agent_inquiries WHERE agent_id = ? AND {' AND '.join(clauses)}", params
+    ).fetchall()
+
+def bench_search():
+    db_path = os.path.join(tempfile.mkdtemp(), "search.db")
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    run_migrations(conn)
+    rng = random.Random(7)
+
+    print(f"Loading {INQUIRIES:,} inquiries for {AGENTS:,} agents (FTS triggers active)")
+    started = time.perf_counter()
+    batch = 50_000
+    for start in range(0, INQUIRIES, batch):
+        conn.executemany(
+            "INSERT INTO agent_inquiries (agent_id, prospect_name, prospect_email, prospect_phone, message) VALUES (?, ?, ?, ?, ?)",
+            [inquiry(i, rng) for i in range(start, min(start + batch, INQUIRIES))]
+        )
+        conn.commit()
+    load = time.perf_counter() - started
+    print(f"{'insert with trigger upkeep':<34} {load:9.1f} s  ({INQUIRIES / load:,.0f} rows/s)")
+
+    started = time.perf_counter()
+    rebuild_search_index(conn=conn)
+    print(f"{'full rebuild + optimize':<34} {time.perf_counter() - started:9.1f} s")
+    print(f"{'database size':<34} {os.path.getsize(db_path) / 1e6:9.0f} MB")
+
+    query_shapes = {
+        "name": lambda: rng.choice(FIRST_NAMES),
+        "name + surname prefix": lambda: f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)[:3]}",
+        "email fragment": lambda: f"{rng.choice(LAST_NAMES)} {rng.choice(DOMAINS).split('.')[0]}",
+        "phone prefix": lambda: f"555-{rng.randint(100, 999)}",
+        "two message words": lambda: f"{rng.choice(WORDS)} {rng.choice(WORDS)}",
+    }
+    tenants = {"large agent": lambda: 1, "typical agent": lambda: rng.randint(2, AGENTS)}
+
+    total = conn.execute("SELECT COUNT(*) FROM agent_inquiries").fetchone()[0]
+    large = conn.execute("SELECT COUNT(*) FROM agent_inquiries WHERE agent_id = 1").fetchone()[0]
+    typical = (total - large) / max(AGENTS - 1, 1)
+    print(f"\nBenchmarking {total:,} inquiries: large agent {large:,} rows, typical agent {typical:,.0f} rows"
+          f" (scanned up to {SEARCH_SCAN_MAX_ROWS:,}, FTS5 above)")
+    print(f"\n{'query':<24}{'tenant':<16}{'search ms':>10}{'LIKE ms':>10}{'speedup':>9}")
+    for shape, make_query in query_shapes.items():
+        for tenant, make_agent in tenants.items():
+            cases = [(make_agent(), make_query()) for _ in range(QUERIES)]
+            fts = timed_queries(lambda a, q: search_inquiries(a, q, 50, conn=conn), cases)
+            like = timed_queries(lambda a, q: like_search(conn, a, q), cases)
+            print(f"{shape:<24}{tenant:<16}{fts:10.2f}{like:10.2f}{like / fts:8.1f}x")
+    conn.close()
+
+if __name__ == "__main__":
+    bench_search()
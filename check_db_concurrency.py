@@ -0,0 +1,66 @@
+import asyncio
+import os
+import tempfile
+import time
+
+from app.db import ConnectionPool, DatabaseExecutor
+
+# Check that one slow query no longer delays unrelated requests
+def slow_writer(seconds, conn=None):
+    # Hold the write lock the way a long acuity_webhook transaction would
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("INSERT INTO agents (email) VALUES ('slow@example.com')")
+    time.sleep(seconds)
+    conn.rollback()
+
+async def fast_request(executor):
+    started = time.perf_counter()
+    async with executor.connection() as db:
+        await db.fetchone("SELECT COUNT(*) FROM agents")
+    return time.perf_counter() - started
+
+async def event_loop_lag(duration):
+    worst = 0.0
+    deadline = time.perf_counter() + duration
+    while time.perf_counter() < deadline:
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - started - 0.01)
+    return worst
+
+async def check_concurrency():
+    db_path = os.path.join(tempfile.mkdtemp(), "concurrency.db")
+    pool = ConnectionPool(db_path, size=4)
+    with pool.connection() as conn:
+        conn.execute("CREATE TABLE agents (id INTEGER PRIMARY KEY, email TEXT)")
+        conn.commit()
+    executor = DatabaseExecutor(pool)
+    slow_seconds = 1.0
+
+    slow = asyncio.create_task(executor.run_with_connection(slow_writer, slow_seconds))
+    await asyncio.sleep(0.05)
+
+    lag_task = asyncio.create_task(event_loop_lag(slow_seconds / 2))
+    latencies = []
+    for _ in range(20):
+        latencies.append(await fast_request(executor))
+    lag = await lag_task
+    await slow
+
+    worst = max(latencies)
+    print(f"Slow query held the write lock for {slow_seconds:.1f}s")
+    print(f"Fast requests: {len(latencies)}, worst latency {worst * 1000:.1f} ms")
+    print(f"Worst event loop lag: {lag * 1000:.1f} ms")
+
+    ok = worst < slow_seconds / 10 and lag < 0.05
+    if ok:
+        print("✅ Unrelated requests were not delayed by the slow query")
+    else:
+        print("❌ Unrelated requests waited on the slow query")
+
+    executor.shutdown()
+    pool.close()
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if asyncio.run(check_concurrency()) else 1)
@@ -0,0 +1,149 @@
+import os
+import sqlite3
+import tempfile
+
+from app.migrations import run_migrations
+
+# Every hot query in app/main.py must be served by an index (no full scans)
+HOT_QUERIES = {
+    "list properties": (
+        "SELECT id, address, unit, rent FROM agent_properties WHERE agent_id = ? ORDER BY created_at DESC",
+        (1,)
+    ),
+    "count properties": ("SELECT COUNT(*) FROM agent_properties WHERE agent_id = ?", (1,)),
+    "count active properties": (
+        "SELECT COUNT(*) FROM agent_properties WHERE agent_id = ? AND is_active = TRUE",
+        (1,)
+    ),
+    "property ownership": ("SELECT id FROM agent_properties WHERE id = ? AND agent_id = ?", (1, 1)),
+    "acuity routing": (
+        "SELECT id, address, unit, agent_id FROM agent_properties WHERE acuity_id = ?",
+        ("123",)
+    ),
+    "list inquiries": ("""
+        SELECT i.*, p.address, p.unit
+        FROM agent_inquiries i
+        LEFT JOIN agent_properties p ON i.property_id = p.id
+        WHERE i.agent_id = ?
+        ORDER BY i.created_at DESC
+    """, (1,)),
+    "properties page": (
+        "SELECT id, address FROM agent_properties WHERE agent_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT 51",
+        (1, "2026-01-01 00:00:00", 100)
+    ),
+    "inquiries page": ("""
+        SELECT i.*, p.address, p.unit
+        FROM agent_inquiries i
+        LEFT JOIN agent_properties p ON i.property_id = p.id
+        WHERE i.agent_id = ? AND (i.created_at, i.id) < (?, ?)
+        ORDER BY i.created_at DESC, i.id DESC
+        LIMIT 51
+    """, (1, "2026-01-01 00:00:00", 100)),
+    "count inquiries": ("SELECT COUNT(*) FROM agent_inquiries WHERE agent_id = ?", (1,)),
+    "emails sent": (
+        "SELECT COUNT(*) FROM email_automation_tracking WHERE property_id IN (SELECT id FROM agent_properties WHERE agent_id = ?)",
+        (1,)
+    ),
+    "tours scheduled": (
+        "SELECT COUNT(*) FROM email_automation_tracking WHERE tour_scheduled = TRUE AND property_id IN (SELECT id FROM agent_properties WHERE agent_id = ?)",
+        (1,)
+    ),
+    "export inquiries": (
+        "SELECT id, prospect_email FROM agent_inquiries WHERE agent_id = ? AND created_at >= ? AND created_at < ? ORDER BY created_at, id",
+        (1, "2026-01-01 00:00:00", "2026-02-01 00:00:00")
+    ),
+    "export tracking": ("""
+        SELECT t.id, t.prospect_email
+        FROM agent_properties p
+        JOIN email_automation_tracking t ON t.property_id = p.id
+        WHERE p.agent_id = ? AND t.created_at >= ?
+    """, (1, "2026-01-01 00:00:00")),
+    "automation stats": ("SELECT * FROM automation_stats WHERE agent_id = ?", (1,)),
+    "agent stats": ("""
+        SELECT p.total_properties, p.active_properties, i.total_inquiries, i.answered_inquiries, s.emails_sent
+        FROM (
+            SELECT COUNT(*) AS total_properties, SUM(is_active = TRUE) AS active_properties
+            FROM agent_properties WHERE agent_id = ?
+        ) p, (
+            SELECT SUM(status IS NOT ?) AS total_inquiries, SUM(status != ? AND status != ?) AS answered_inquiries
+            FROM agent_inquiries WHERE agent_id = ?
+        ) i
+        LEFT JOIN automation_stats s ON s.agent_id = ?
+    """, (1, "duplicate", "new", "duplicate", 1, 1)),
+    "prospect match": ("""
+        SELECT k.key_hash, p.id, p.primary_inquiry_id, p.primary_at
+        FROM prospect_keys k JOIN prospects p ON p.id = k.prospect_id
+        WHERE k.agent_id = ? AND k.key_hash IN (?, ?)
+    """, (1, -42, 42)),
+    "search tenant size": (
+        "SELECT 1 FROM agent_inquiries WHERE agent_id = ? LIMIT 1 OFFSET ?",
+        (1, 2000)
+    ),
+    "search scan": (
+        "SELECT id, message FROM agent_inquiries WHERE agent_id = ? AND (prospect_name LIKE ? OR message LIKE ?)",
+        (1, "%jo%", "%jo%")
+    ),
+    "prospect duplicates": (
+        "SELECT id FROM agent_inquiries WHERE prospect_id = ? AND duplicate_of = ?",
+        (1, 5)
+    ),
+    "webhook inbox batch": (
+        "SELECT id, event_type, payload, attempts FROM webhook_inbox WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+        (0, 100)
+    ),
+    "latest reschedule": ("""
+        SELECT event_key FROM webhook_inbox
+        WHERE source = ? AND external_id = ? AND event_type IN ('rescheduled', 'changed')
+        ORDER BY id DESC LIMIT 1
+    """, ("acuity", "5")),
+    "tracking by appointment": (
+        "SELECT 1 FROM email_automation_tracking WHERE acuity_appointment_id = ? AND property_id = ?",
+        (5, 1)
+    ),
+    "bulk status ownership": (
+        "SELECT id FROM agent_properties WHERE agent_id = ? AND id IN (SELECT value FROM json_each(?))",
+        (1, "[1, 2, 3]")
+    ),
+    "property activity inquiries": (
+        "SELECT id, status FROM agent_inquiries WHERE property_id = ? AND (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC LIMIT ?",
+        (1, "2026-01-01 00:00:00", 10, 51)
+    ),
+    "property activity tracking": (
+        "SELECT id, tour_scheduled FROM email_automation_tracking WHERE property_id = ? AND created_at <= ? ORDER BY created_at DESC, id DESC LIMIT ?",
+        (1, "2026-01-01 00:00:00", 51)
+    ),
+    "agent by email": ("SELECT * FROM agents WHERE email = ? AND is_active = TRUE", ("a@example.com",)),
+}
+
+def is_scan(detail, materialized=()):
+    # "SCAN t" is a full table scan; "SCAN t USING ... INDEX" still reads every entry.
+    # Scanning a materialized aggregate subquery only reads its result rows,
+    # and scanning json_each only walks the id list passed in.
+    if detail.startswith("SCAN json_each"):
+        return False
+    if detail.startswith("SCAN") and detail.split()[1] in materialized:
+        return False
+    return detail.startswith("SCAN") or "TEMP B-TREE" in detail
+
+def check_query_plans():
+    db_path = os.path.join(tempfile.mkdtemp(), "plans.db")
+    conn = sqlite3.connect(db_path)
+    run_migrations(conn)
+
+    failures = 0
+    for name, (sql, params) in HOT_QUERIES.items():
+        plan = [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        materialized = {detail.split()[1] for detail in plan if detail.startswith("MATERIALIZE")}
+        scans = [detail for detail in plan if is_scan(detail, materialized)]
+        if scans:
+            failures += 1
+            print(f"❌ {name}: {'; '.join(scans)}")
+        else:
+            print(f"✅ {name}: {'; '.join(plan)}")
+
+    conn.close()
+    print(f"\n{len(HOT_QUERIES) - failures}/{len(HOT_QUERIES)} hot queries use an index")
+    return failures == 0
+
+if __name__ == "__main__":
+    raise SystemExit(0 if check_query_plans() else 1)
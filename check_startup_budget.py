@@ -0,0 +1,48 @@
+import os
+import sys
+import json
+import tempfile
+import subprocess
+
+from app.startup import STARTUP_BUDGET_MS
+
+# Cold start must fit the startup budget (LEADFLOW_STARTUP_BUDGET_MS).
+#
+# Each boot is a fresh interpreter that imports app.main and runs the
+# startup hook, like a newly scheduled instance. The first boot creates the
+# database; the second finds the schema fingerprint current and must skip
+# every migration.
+BOOT = """
+import json
+from fastapi.testclient import TestClient
+from app.main import app, startup_timer
+with TestClient(app):
+    pass
+print(json.dumps(startup_timer.report()))
+"""
+
+def boot(db_path):
+    env = dict(os.environ, LEADFLOW_DATABASE_PATH=db_path)
+    result = subprocess.run([sys.executable, "-c", BOOT], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        print(result.stderr)
+        raise SystemExit(1)
+    migrations = [line for line in result.stderr.splitlines() if "Applied migration" in line]
+    return json.loads(result.stdout.strip().splitlines()[-1]), migrations
+
+def check_startup_budget():
+    db_path = os.path.join(tempfile.mkdtemp(), "startup.db")
+    ok = True
+    for label in ("first boot (new database)", "warm boot (schema current)"):
+        report, migrations = boot(db_path)
+        phases = ", ".join(f"{name} {ms:.1f}" for name, ms in report["phases_ms"].items())
+        mark = "✅" if report["within_budget"] else "❌"
+        print(f"{mark} {label}: {report['total_ms']:.1f} ms of {STARTUP_BUDGET_MS:.0f} ms ({phases}; {len(migrations)} migrations)")
+        ok = ok and report["within_budget"]
+    if migrations:
+        print("❌ warm boot re-ran migrations despite a current schema fingerprint")
+        ok = False
+    return ok
+
+if __name__ == "__main__":
+    raise SystemExit(0 if check_startup_budget() else 1)
@@ -1,28 +1,56 @@
-import sqlite3
+import json
+import os
+import sys
+import urllib.request
+
+from app.db import get_pool
+from app.rate_limit import SQLiteBackend
+
+# Reset rate limits without restarting the server.
+#
+#   python clear_rate_limit.py                      # everyone, every route
+#   python clear_rate_limit.py login                # every client on /api/auth/login
+#   python clear_rate_limit.py login 203.0.113.7    # one client on one route
+#
+# With LEADFLOW_RATE_LIMIT_BACKEND=sqlite the shared counters are cleared
+# directly in the database. With the default in-memory backend the running
+# server is asked to clear them through DELETE /api/admin/rate-limits,
+# using LEADFLOW_API_URL and LEADFLOW_ADMIN_TOKEN.
+def clear_rate_limit(policy=None, identifier=None):
+    backend = os.environ.get("LEADFLOW_RATE_LIMIT_BACKEND", "memory")
+    target = f"{policy or 'all routes'}" + (f" / {identifier}" if identifier else "")
 
-def clear_rate_limit():
-    # The rate limiting is stored in memory, so restarting the server will clear it
-    # But let's also make sure there are no database locks
-    
-    print("Rate limiting will be cleared when you restart the server.")
-    print("Also, let's verify your account is ready:")
-    
     try:
-        conn = sqlite3.connect("app/leadflow.db")
-        conn.row_factory = sqlite3.Row
-        
-        cursor = conn.execute("SELECT email, first_name, last_name FROM agents WHERE email = ?", ("npagano@besenpartners.com",))
-        agent = cursor.fetchone()
-        
-        if agent:
-            print(f"✅ Account ready: {agent['email']} ({agent['first_name']} {agent['last_name']})")
+        if backend == "sqlite":
+            sqlite_backend = SQLiteBackend()
+            with get_pool().connection() as conn:
+                if policy is None:
+                    cleared = sqlite_backend.clear(conn=conn)
+                elif identifier is None:
+                    cleared = sqlite_backend.clear(prefix=f"{policy}:", conn=conn)
+                else:
+                    cleared = sqlite_backend.clear(key=f"{policy}:{identifier}", conn=conn)
         else:
-            print("❌ Account not found")
-        
-        conn.close()
-        
+            api_url = os.environ.get("LEADFLOW_API_URL", "http://localhost:8000")
+            admin_token = os.environ.get("LEADFLOW_ADMIN_TOKEN")
+            if not admin_token:
+                print("❌ Set LEADFLOW_ADMIN_TOKEN to clear in-memory rate limits on a running server")
+                return
+
+            params = []
+            if policy:
+                params.append(f"policy={policy}")
+            if identifier:
+                params.append(f"identifier={identifier}")
+            url = f"{api_url}/api/admin/rate-limits" + (f"?{'&'.join(params)}" if params else "")
+            request = urllib.request.Request(url, method="DELETE", headers={"X-Admin-Token": admin_token})
+            with urllib.request.urlopen(request) as response:
+                cleared = json.loads(response.read())["cleared"]
+
+        print(f"✅ Cleared {cleared} rate limit counters for {target}")
+
     except Exception as e:
         print(f"Error: {e}")
 
 if __name__ == "__main__":
-    clear_rate_limit()
\ No newline at end of file
+    clear_rate_limit(*sys.argv[1:3])
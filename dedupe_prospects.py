@@ -0,0 +1,27 @@
+import sys
+import time
+
+from app.db import get_pool
+from app.prospects import PROSPECT_BACKFILL_BATCH_SIZE, backfill_prospects
+
+# Link existing inquiries to prospects and mark repeats within the de-dup
+# window as duplicates (see app/prospects.py). New inquiries are linked as
+# they are ingested; run this once after upgrading, or after importing
+# inquiries by other means. Safe to interrupt and run again.
+#
+#   python dedupe_prospects.py [agent_id] [batch_size]
+def dedupe(agent_id=None, batch_size=PROSPECT_BACKFILL_BATCH_SIZE):
+    started = time.perf_counter()
+    totals = {"scanned": 0, "primary": 0, "duplicates": 0, "skipped": 0}
+    with get_pool().connection() as conn:
+        for totals in backfill_prospects(agent_id, batch_size, conn=conn):
+            print(f"  {totals['scanned']:,} inquiries read, {totals['duplicates']:,} duplicates so far", end="\r")
+    elapsed = time.perf_counter() - started
+    print(f"✅ {totals['scanned']:,} inquiries: {totals['primary']:,} primary, {totals['duplicates']:,} duplicates, "
+          f"{totals['skipped']:,} without email or phone ({elapsed:.1f}s)")
+
+if __name__ == "__main__":
+    dedupe(
+        int(sys.argv[1]) if len(sys.argv) > 1 else None,
+        int(sys.argv[2]) if len(sys.argv) > 2 else PROSPECT_BACKFILL_BATCH_SIZE
+    )
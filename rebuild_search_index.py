@@ -0,0 +1,20 @@
+import time
+
+from app.db import get_pool
+from app.search import rebuild_search_index
+
+# Rebuild the FTS5 search indexes (inquiries_fts, properties_fts) from scratch.
+# The triggers keep them in sync; run this after bulk edits made with the
+# triggers bypassed, or if a search is missing rows it should find. The
+# running server can do the same through POST /api/admin/search/rebuild.
+def rebuild():
+    started = time.perf_counter()
+    with get_pool().connection() as conn:
+        indexed = rebuild_search_index(conn=conn)
+    elapsed = time.perf_counter() - started
+    for table, rows in indexed.items():
+        print(f"✅ {table}: {rows:,} rows indexed")
+    print(f"Rebuilt in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    rebuild()